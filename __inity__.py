@@ -8,14 +8,21 @@ Questo package contiene tutti gli agenti AI per l'analisi marketing:
 - SocialAgent: Analisi social media
 - CompanyAgent: Raccolta dati aziendali ufficiali
 - ReportAgent: Generazione report finale
+
+Gli agenti vengono importati al primo accesso (PEP 562): una run che usa solo
+Serper non carica le dipendenze degli altri agenti.
 """
 
-from .base_agent import BaseAgent
-from .semrush_agent import SEMRushAgent
-from .serper_agent import SerperAgent
-from .social_agent import SocialAgent
-from .company_agent import CompanyAgent
-from .report_agent import ReportAgent
+import importlib
+
+_LAZY_IMPORTS = {
+    'BaseAgent': 'agents.base_agent',
+    'SEMRushAgent': 'agents.semrush_agent',
+    'SerperAgent': 'agents.serper_agent',
+    'SocialAgent': 'agents.social_agent',
+    'CompanyAgent': 'agents.company_agent',
+    'ReportAgent': 'agents.report_agent'
+}
 
 __all__ = [
     'BaseAgent',
@@ -28,17 +35,52 @@ __all__ = [
 
 __version__ = '1.0.0'
 
+
+def __getattr__(name):
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # Gli accessi successivi non passano da __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 # utils/__init__.py
 """
 Marketing Analyzer - Utils Package
 
 Utilities per validazione, processamento dati e web scraping.
+I moduli vengono importati al primo accesso (PEP 562).
 """
 
-from .validators import InputValidator
-from .data_processor import DataProcessor
+import importlib
+
+_LAZY_IMPORTS = {
+    'InputValidator': 'utils.validator',
+    'DataProcessor': 'utils.data_processor',
+    'ContextBuilder': 'utils.context_builder',
+    'count_tokens': 'utils.context_builder'
+}
 
 __all__ = [
     'InputValidator',
-    'DataProcessor'
-]
\ No newline at end of file
+    'DataProcessor',
+    'ContextBuilder',
+    'count_tokens'
+]
+
+
+def __getattr__(name):
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # Gli accessi successivi non passano da __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
\ No newline at end of file
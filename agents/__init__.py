@@ -1 +1,48 @@
+"""
+Marketing Analyzer - Agents Package
 
+Questo package contiene tutti gli agenti AI per l'analisi marketing:
+- SEMRushAgent: Analisi SEO e competitor tramite SEMRush
+- SerperAgent: Ricerca online tramite Serper.dev
+- SocialAgent: Analisi social media
+- CompanyAgent: Raccolta dati aziendali ufficiali
+- ReportAgent: Generazione report finale
+
+Gli agenti vengono importati al primo accesso (PEP 562): una run che usa solo
+Serper non carica le dipendenze degli altri agenti.
+"""
+
+import importlib
+
+_LAZY_IMPORTS = {
+    'BaseAgent': 'agents.base_agent',
+    'SEMRushAgent': 'agents.semrush_agent',
+    'SerperAgent': 'agents.serper_agent',
+    'SocialAgent': 'agents.social_agent',
+    'CompanyAgent': 'agents.company_agent',
+    'ReportAgent': 'agents.report_agent'
+}
+
+__all__ = [
+    'BaseAgent',
+    'SEMRushAgent', 
+    'SerperAgent',
+    'SocialAgent',
+    'CompanyAgent',
+    'ReportAgent'
+]
+
+__version__ = '1.0.0'
+
+
+def __getattr__(name):
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # Gli accessi successivi non passano da __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
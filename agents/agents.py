@@ -1,10 +1,61 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Awaitable, Callable, Iterator, TYPE_CHECKING
+import asyncio
+import contextvars
 import logging
-import time
+import threading
 import requests
-from openai import OpenAI
-from config import APIConfig, AppConfig
+from config import (APIConfig, AppConfig, SERPER_BASE_URL,
+                    OPENAI_MODEL, OPENAI_TEMPERATURE, OPENAI_MAX_TOKENS)
+from utils.http_client import get_transport, get_openai_client, get_async_openai_client
+from utils.cache import get_serper_cache, get_completion_cache, SerperCache
+from utils.competitor_kb import get_competitor_kb
+from utils.entities import known_interpretation, remember_interpretation, resolve_company_input
+from utils.rate_limit import get_rate_limiter
+from utils import structured_output
+from utils.retry import RetryPolicy, call_with_retry
+from utils.deadline import check_deadline, deadline_timeout
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+COMPANY_INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **structured_output.text_fields("company_name", "website", "vat_number"),
+        "input_type": {"type": "string"}
+    },
+    "required": ["company_name", "input_type"]
+}
+
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """Esegue una coroutine da codice sincrono, anche se un event loop è già attivo.
+    
+    Il contesto (es. la scadenza dell'analisi corrente) passa alla coroutine.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    
+    # Un loop è già in esecuzione in questo thread: usa un thread dedicato
+    result = {}
+    
+    def runner():
+        try:
+            result["value"] = asyncio.run(coro)
+        except BaseException as e:
+            result["error"] = e
+    
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(runner,))
+    thread.start()
+    thread.join()
+    
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
 
 class BaseAgent(ABC):
     """Classe base per tutti gli agenti AI"""
@@ -12,36 +63,147 @@ class BaseAgent(ABC):
     def __init__(self, api_config: APIConfig, app_config: AppConfig):
         self.api_config = api_config
         self.app_config = app_config
-        self.client = OpenAI(api_key=api_config.openai_api_key)
+        # Trasporto HTTP e client OpenAI sono condivisi a livello di processo
+        self.transport = get_transport(app_config)
+        self.client = get_openai_client(api_config.openai_api_key)
+        self.rate_limiter = get_rate_limiter(app_config)
+        self.retry_policy = RetryPolicy(app_config.max_retries, app_config.retry_base_delay,
+                                        app_config.retry_max_delay)
         self.logger = logging.getLogger(self.__class__.__name__)
+        self._semaphore = None
+        self._semaphore_loop = None
         
-    @abstractmethod
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """Client OpenAI asincrono condiviso nell'event loop corrente"""
+        return get_async_openai_client(self.api_config.openai_api_key)
+    
     def analyze(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Wrapper sincrono di analyze_async"""
+        return run_sync(self.analyze_async(company_data))
+    
+    @abstractmethod
+    async def analyze_async(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
         """Metodo principale per l'analisi - deve essere implementato da ogni agente"""
         pass
     
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Restituisce il semaforo che limita le chiamate contemporanee nel loop corrente"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(max(1, self.app_config.max_concurrency))
+            self._semaphore_loop = loop
+        return self._semaphore
+    
     def make_request(self, url: str, headers: Optional[Dict] = None, 
-                    params: Optional[Dict] = None, timeout: int = None) -> requests.Response:
-        """Effettua una richiesta HTTP con retry logic"""
+                    params: Optional[Dict] = None, timeout: int = None,
+                    method: str = "GET", json: Optional[Dict] = None,
+                    coalesce: Optional[bool] = None, provider: Optional[str] = None,
+                    endpoint: str = "", hedge: bool = False) -> requests.Response:
+        """Effettua una richiesta HTTP con retry logic.
+        
+        Vengono ritentati solo timeout, errori di connessione, 408, 429 e 5xx
+        (rispettando Retry-After); gli altri errori vengono sollevati subito.
+        Le GET identiche vengono unite (single-flight) a meno di coalesce=False.
+        Con provider (serper, semrush) ogni tentativo rispetta il rate limit della API key.
+        hedge=True (solo richieste idempotenti) consente al trasporto di duplicare
+        le richieste lente; il duplicato consuma un token del rate limit del provider.
+        """
         if timeout is None:
             timeout = self.app_config.timeout
             
         if headers is None:
             headers = {"User-Agent": self.app_config.user_agents[0]}
         
-        for attempt in range(self.app_config.max_retries):
-            try:
-                response = requests.get(url, headers=headers, params=params, timeout=timeout)
-                response.raise_for_status()
-                return response
-            except requests.exceptions.RequestException as e:
-                self.logger.warning(f"Attempt {attempt + 1} failed: {e}")
-                if attempt == self.app_config.max_retries - 1:
-                    raise
-                time.sleep(2 ** attempt)  # Exponential backoff
-    
-    def query_openai(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """Effettua una query a OpenAI"""
+        if coalesce is None:
+            coalesce = method.upper() == "GET"
+        
+        def acquire():
+            self.rate_limiter.acquire(provider, self._provider_key(provider), endpoint)
+        
+        def hedge_budget() -> bool:
+            return self.rate_limiter.try_acquire(provider, self._provider_key(provider), endpoint) <= 0
+        
+        hedge_key = f"{provider}:{endpoint}" if hedge and provider else None
+        
+        return call_with_retry(
+            lambda: self.transport.request(method, url, coalesce=coalesce, hedge=hedge_key,
+                                           hedge_budget=hedge_budget, headers=headers,
+                                           params=params, json=json, timeout=timeout),
+            self.retry_policy, acquire if provider else None, self.logger
+        )
+    
+    async def make_request_async(self, url: str, headers: Optional[Dict] = None,
+                                 params: Optional[Dict] = None, timeout: int = None,
+                                 method: str = "GET", json: Optional[Dict] = None,
+                                 coalesce: Optional[bool] = None, provider: Optional[str] = None,
+                                 endpoint: str = "", hedge: bool = False) -> requests.Response:
+        """Versione awaitable di make_request, limitata da max_concurrency"""
+        async with self._get_semaphore():
+            return await asyncio.to_thread(
+                self.make_request, url, headers, params, timeout, method, json, coalesce,
+                provider, endpoint, hedge
+            )
+    
+    async def competitor_read_through(self, facet: str, fetch: Callable[[], Awaitable[Any]],
+                                      domain: str = "", name: str = "") -> Any:
+        """Dato di un competitor dalla knowledge base condivisa; fetch() parte solo se manca o è scaduto"""
+        kb = get_competitor_kb(self.app_config)
+        if kb is None:
+            return await fetch()
+        return await kb.read_through_async(facet, fetch, domain, name)
+    
+    def _provider_key(self, provider: str) -> str:
+        """API key usata per il provider, che identifica il suo bucket di rate limit"""
+        return getattr(self.api_config, f"{provider}_api_key", "")
+    
+    def serper_search(self, payload: Dict[str, Any], endpoint: str = "search",
+                      timeout: int = None) -> Dict[str, Any]:
+        """Richiesta a Serper passando dalla cache persistente delle risposte.
+        
+        Query equivalenti (stessa query normalizzata e stessi parametri) in corso
+        nello stesso momento condividono un'unica chiamata e lo stesso risultato.
+        """
+        cache = get_serper_cache(self.app_config)
+        
+        def fetch():
+            if cache:
+                cached = cache.get(payload, endpoint)
+                if cached is not None:
+                    return cached
+            
+            headers = {
+                "X-API-KEY": self.api_config.serper_api_key,
+                "Content-Type": "application/json"
+            }
+            
+            response = self.make_request(
+                f"{SERPER_BASE_URL}{endpoint}", headers=headers, timeout=timeout,
+                method="POST", json=payload, coalesce=False, provider="serper", endpoint=endpoint,
+                hedge=True
+            )
+            data = response.json()
+            
+            if cache:
+                cache.set(payload, data, endpoint)
+            return data
+        
+        flight_key = ("serper", self.api_config.serper_api_key,
+                      SerperCache.request_key(payload, endpoint))
+        return self.transport.single_flight.do(flight_key, fetch)
+    
+    async def serper_search_async(self, payload: Dict[str, Any], endpoint: str = "search",
+                                  timeout: int = None) -> Dict[str, Any]:
+        """Versione awaitable di serper_search, limitata da max_concurrency"""
+        async with self._get_semaphore():
+            return await asyncio.to_thread(self.serper_search, payload, endpoint, timeout)
+    
+    def _completion_params(self, prompt: str, system_prompt: Optional[str] = None,
+                           deterministic: bool = False, json_mode: bool = False) -> Dict[str, Any]:
+        """Parametri della chat completion; deterministic usa temperature 0 (prompt di estrazione).
+        
+        json_mode richiede la modalità JSON, se il modello configurato la supporta.
+        """
         messages = []
         
         if system_prompt:
@@ -49,20 +211,191 @@ class BaseAgent(ABC):
         
         messages.append({"role": "user", "content": prompt})
         
+        params = {
+            "model": OPENAI_MODEL,
+            "messages": messages,
+            "temperature": 0 if deterministic else OPENAI_TEMPERATURE,
+            "max_tokens": OPENAI_MAX_TOKENS
+        }
+        if json_mode and structured_output.supports_json_mode(OPENAI_MODEL):
+            params["response_format"] = {"type": "json_object"}
+        return params
+    
+    def stream_openai(self, prompt: str, system_prompt: Optional[str] = None,
+                      deterministic: bool = False) -> Iterator[str]:
+        """Genera la risposta OpenAI pezzo per pezzo (un solo pezzo se la risposta è in cache)"""
+        params = self._completion_params(prompt, system_prompt, deterministic)
+        cache = get_completion_cache(self.app_config)
+        cache_key = cache.key(**params) if cache else None
+        
+        if cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        self.rate_limiter.acquire("openai", self.api_config.openai_api_key, OPENAI_MODEL)
+        parts = []
+        
+        stream = self.client.chat.completions.create(
+            **params, stream=True, timeout=deadline_timeout(self.app_config.openai_timeout)
+        )
+        for chunk in stream:
+            check_deadline()
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        if cache:
+            cache.set(cache_key, "".join(parts))
+    
+    def query_openai(self, prompt: str, system_prompt: Optional[str] = None,
+                     deterministic: bool = False,
+                     on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Effettua una query a OpenAI, riusando le risposte in cache per prompt identici.
+        
+        Con on_token la risposta arriva in streaming e on_token riceve ogni pezzo
+        di testo (per i prompt JSON si può usare utils.json_stream.partial_json_callback).
+        """
+        if on_token is not None:
+            parts = []
+            try:
+                for delta in self.stream_openai(prompt, system_prompt, deterministic):
+                    parts.append(delta)
+                    on_token(delta)
+            except Exception as e:
+                self.logger.error(f"OpenAI API error: {e}")
+                return f"Errore nell'analisi AI: {str(e)}"
+            return "".join(parts)
+        
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=2000
+            return self._complete(self._completion_params(prompt, system_prompt, deterministic))
+        except Exception as e:
+            self.logger.error(f"OpenAI API error: {e}")
+            return f"Errore nell'analisi AI: {str(e)}"
+    
+    async def query_openai_async(self, prompt: str, system_prompt: Optional[str] = None,
+                                 deterministic: bool = False,
+                                 on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Versione awaitable di query_openai tramite il client OpenAI asincrono"""
+        try:
+            return await self._complete_async(
+                self._completion_params(prompt, system_prompt, deterministic), on_token
             )
-            return response.choices[0].message.content
         except Exception as e:
             self.logger.error(f"OpenAI API error: {e}")
             return f"Errore nell'analisi AI: {str(e)}"
     
+    def _complete(self, params: Dict[str, Any]) -> str:
+        """Chat completion con cache e rate limit; gli errori dell'API vengono propagati"""
+        cache = get_completion_cache(self.app_config)
+        cache_key = cache.key(**params) if cache else None
+        
+        if cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        self.rate_limiter.acquire("openai", self.api_config.openai_api_key, OPENAI_MODEL)
+        response = self.client.chat.completions.create(
+            **params, timeout=deadline_timeout(self.app_config.openai_timeout)
+        )
+        content = response.choices[0].message.content
+        
+        if cache:
+            cache.set(cache_key, content)
+        return content
+    
+    async def _complete_async(self, params: Dict[str, Any],
+                              on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Versione awaitable di _complete; con on_token la risposta arriva in streaming"""
+        cache = get_completion_cache(self.app_config)
+        cache_key = cache.key(**params) if cache else None
+        
+        # La cache è su SQLite: letture e scritture fuori dall'event loop
+        if cache:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+        
+        await self.rate_limiter.acquire_async("openai", self.api_config.openai_api_key, OPENAI_MODEL)
+        async with self._get_semaphore():
+            if on_token is None:
+                response = await self.async_client.chat.completions.create(
+                    **params, timeout=deadline_timeout(self.app_config.openai_timeout)
+                )
+                content = response.choices[0].message.content
+            else:
+                content = await self._stream_completion_async(params, on_token)
+        
+        if cache:
+            await asyncio.to_thread(cache.set, cache_key, content)
+        return content
+    
+    def query_structured(self, prompt: str, system_prompt: Optional[str],
+                         schema: Dict[str, Any], deterministic: bool = True) -> Any:
+        """Query OpenAI con risposta JSON validata sullo schema.
+        
+        Solleva structured_output.StructuredOutputError se la risposta resta non conforme
+        dopo la riparazione locale e la richiesta di correzione.
+        """
+        def complete(prompt: str, system_prompt: str) -> str:
+            return self._complete(self._completion_params(prompt, system_prompt, deterministic, json_mode=True))
+        
+        return structured_output.query_structured(complete, prompt, system_prompt, schema,
+                                                  self.app_config.structured_output_retries)
+    
+    async def query_structured_async(self, prompt: str, system_prompt: Optional[str],
+                                     schema: Dict[str, Any], deterministic: bool = True) -> Any:
+        """Versione awaitable di query_structured"""
+        async def complete(prompt: str, system_prompt: str) -> str:
+            return await self._complete_async(
+                self._completion_params(prompt, system_prompt, deterministic, json_mode=True)
+            )
+        
+        return await structured_output.query_structured_async(complete, prompt, system_prompt, schema,
+                                                              self.app_config.structured_output_retries)
+    
+    async def _stream_completion_async(self, params: Dict[str, Any],
+                                       on_token: Callable[[str], None]) -> str:
+        """Completion asincrona in streaming: on_token riceve ogni pezzo, restituisce il testo completo"""
+        parts = []
+        stream = await self.async_client.chat.completions.create(
+            **params, stream=True, timeout=deadline_timeout(self.app_config.openai_timeout)
+        )
+        
+        async for chunk in stream:
+            check_deadline()
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+        
+        return "".join(parts)
+    
     def extract_company_info(self, input_data: str) -> Dict[str, Any]:
-        """Estrae informazioni dell'azienda da input (nome, URL, P.IVA)"""
+        """Estrae informazioni dell'azienda da input (nome, URL, P.IVA).
+        
+        L'input viene risolto sulle aziende note e interpretato in modo
+        deterministico; il modello serve solo se l'azienda resta sconosciuta
+        (es. P.IVA mai vista) e la sua risposta viene ricordata per l'input.
+        """
+        is_valid, input_type, company_data = resolve_company_input(input_data, self.app_config)
+        if is_valid and not company_data["company_name"].startswith("Azienda P.IVA"):
+            return {
+                "company_name": company_data["company_name"],
+                "website": company_data.get("website"),
+                "vat_number": company_data.get("vat_number"),
+                "input_type": input_type
+            }
+        
+        known = known_interpretation(input_data, self.app_config)
+        if known:
+            return known
+        
         system_prompt = """Sei un esperto nell'identificazione di aziende. 
         Dato un input che può essere un nome azienda, URL del sito web, o partita IVA, 
         estrai le seguenti informazioni in formato JSON:
@@ -77,12 +410,12 @@ class BaseAgent(ABC):
         
         prompt = f"Analizza questo input aziendale: {input_data}"
         
-        result = self.query_openai(prompt, system_prompt)
-        
         try:
-            import json
-            return json.loads(result)
-        except json.JSONDecodeError:
+            interpretation = self.query_structured(prompt, system_prompt, COMPANY_INPUT_SCHEMA)
+            remember_interpretation(input_data, interpretation, self.app_config)
+            return interpretation
+        except structured_output.StructuredOutputError as e:
+            self.logger.warning(f"Estrazione input non riuscita: {e}")
             return {
                 "company_name": input_data,
                 "website": None,
@@ -0,0 +1,4 @@
+# Gli agenti importano la classe base da agents.base_agent; l'implementazione è in agents.agents
+from agents.agents import BaseAgent, run_sync
+
+__all__ = ['BaseAgent', 'run_sync']
@@ -1,11 +1,48 @@
 from typing import Dict, Any, List
+import asyncio
 import requests
-import json
 import re
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 from agents.base_agent import BaseAgent
 from config import COMPANY_VERIFICATION_URLS
+from utils.deadline import DeadlineExceeded
+from utils.entities import domain_to_company_name, is_valid_vat, normalize_vat, register_company
+from utils.structured_output import StructuredOutputError, text_fields
+
+# Fonti ufficiali interrogate via Serper: chiave nei risultati -> dominio
+REGISTRY_SOURCES = {
+    "registro_imprese": "registroimprese.it",
+    "ufficio_camerale": "ufficiocamerale.it",
+    "reportaziende": "reportaziende.it"
+}
+
+# Campi estratti per ogni fonte e nel record consolidato
+COMPANY_FIELDS = [
+    "company_name", "vat_number", "fiscal_code", "legal_form", "share_capital",
+    "revenue", "employees", "headquarters", "sector", "founding_date",
+    "legal_representative", "pec_email", "phone", "website"
+]
+
+COMPANY_RECORD_SCHEMA = {"type": "object", "properties": text_fields(*COMPANY_FIELDS)}
+
+BATCHED_EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sources": {
+            "type": "object",
+            "properties": {source: COMPANY_RECORD_SCHEMA for source in [*REGISTRY_SOURCES, "additional_sources"]}
+        },
+        "consolidated": {
+            "type": "object",
+            "properties": {
+                **text_fields(*COMPANY_FIELDS),
+                "contact_info": {"type": ["object", "null"]},
+                "financial_data": {"type": ["object", "null"]}
+            }
+        }
+    },
+    "required": ["sources", "consolidated"]
+}
 
 class CompanyAgent(BaseAgent):
     """Agente per raccogliere dati aziendali da fonti ufficiali"""
@@ -14,7 +51,7 @@ class CompanyAgent(BaseAgent):
         super().__init__(api_config, app_config)
         self.verification_sources = COMPANY_VERIFICATION_URLS
         
-    def analyze(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_async(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
         """Analizza i dati aziendali da fonti ufficiali"""
         company_name = company_data.get("company_name", "")
         vat_number = company_data.get("vat_number", "")
@@ -26,35 +63,33 @@ class CompanyAgent(BaseAgent):
         
         results = {}
         
-        # 1. Cerca dati nel Registro Imprese
-        registro_data = self._search_registro_imprese(company_name, vat_number)
+        # 1-4. Registro Imprese, Ufficio Camerale, ReportAziende e fonti aggiuntive
+        # sono ricerche indipendenti
+        registro_data, camerale_data, report_data, additional_data = await asyncio.gather(
+            self._search_registro_imprese(company_name, vat_number),
+            self._search_ufficio_camerale(company_name, vat_number),
+            self._search_reportaziende(company_name, vat_number),
+            self._search_additional_company_data(company_name, vat_number)
+        )
         results["registro_imprese"] = registro_data
-        
-        # 2. Cerca dati in Ufficio Camerale
-        camerale_data = self._search_ufficio_camerale(company_name, vat_number)
         results["ufficio_camerale"] = camerale_data
-        
-        # 3. Cerca dati in ReportAziende
-        report_data = self._search_reportaziende(company_name, vat_number)
         results["reportaziende"] = report_data
-        
-        # 4. Cerca altri dati aziendali tramite Serper
-        additional_data = self._search_additional_company_data(company_name, vat_number)
         results["additional_sources"] = additional_data
         
-        # 5. Consolida tutti i dati
-        consolidated_data = self._consolidate_company_data(results)
+        # 5. Estrae e consolida tutti i dati con un'unica richiesta AI
+        consolidated_data = await self._consolidate_company_data(results, company_name, vat_number)
         results["consolidated"] = consolidated_data
+        self._link_entity(company_data, consolidated_data)
         
         # 6. Analizza competitor aziendali
-        competitor_analysis = self._analyze_competitor_companies(
+        competitor_analysis = await self._analyze_competitor_companies(
             consolidated_data, company_data.get("competitors", [])
         )
         results["competitor_analysis"] = competitor_analysis
         
         return results
     
-    def _search_registro_imprese(self, company_name: str, vat_number: str) -> Dict[str, Any]:
+    async def _search_registro_imprese(self, company_name: str, vat_number: str) -> Dict[str, Any]:
         """Cerca dati nel Registro Imprese"""
         self.log_progress("Cercando dati nel Registro Imprese...")
         
@@ -67,27 +102,24 @@ class CompanyAgent(BaseAgent):
         if vat_number:
             search_terms.append(vat_number)
         
-        for term in search_terms:
-            try:
-                # Cerca tramite Serper se disponibile
-                if self.api_config.serper_api_key:
-                    serper_results = self._search_with_serper(
-                        f"site:registroimprese.it {term}"
-                    )
-                    if serper_results:
-                        search_results["serper_results"] = serper_results
-                
-                # Cerca informazioni specifiche
-                company_info = self._extract_company_info_from_search(term, "registroimprese.it")
-                if company_info:
-                    search_results["company_info"] = company_info
-                
-            except Exception as e:
-                self.log_progress(f"Errore ricerca Registro Imprese: {str(e)}", "error")
+        term_results = await asyncio.gather(*[
+            self._search_registry_term(term, "registroimprese.it") for term in search_terms
+        ], return_exceptions=True)
+        
+        # I risultati vengono uniti nell'ordine dei termini di ricerca
+        found = []
+        for outcome in term_results:
+            if isinstance(outcome, Exception):
+                self.log_progress(f"Errore ricerca Registro Imprese: {str(outcome)}", "error")
+            elif outcome:
+                found.append(outcome)
+        
+        if found:
+            search_results["serper_results"] = self._merge_serper_results(found)
         
         return search_results
     
-    def _search_ufficio_camerale(self, company_name: str, vat_number: str) -> Dict[str, Any]:
+    async def _search_ufficio_camerale(self, company_name: str, vat_number: str) -> Dict[str, Any]:
         """Cerca dati in Ufficio Camerale"""
         self.log_progress("Cercando dati in Ufficio Camerale...")
         
@@ -99,27 +131,24 @@ class CompanyAgent(BaseAgent):
         if vat_number:
             search_terms.append(vat_number)
         
-        for term in search_terms:
-            try:
-                # Cerca tramite Serper se disponibile
-                if self.api_config.serper_api_key:
-                    serper_results = self._search_with_serper(
-                        f"site:ufficiocamerale.it {term}"
-                    )
-                    if serper_results:
-                        search_results["serper_results"] = serper_results
-                
-                # Cerca informazioni specifiche
-                company_info = self._extract_company_info_from_search(term, "ufficiocamerale.it")
-                if company_info:
-                    search_results["company_info"] = company_info
-                
-            except Exception as e:
-                self.log_progress(f"Errore ricerca Ufficio Camerale: {str(e)}", "error")
+        term_results = await asyncio.gather(*[
+            self._search_registry_term(term, "ufficiocamerale.it") for term in search_terms
+        ], return_exceptions=True)
+        
+        # I risultati vengono uniti nell'ordine dei termini di ricerca
+        found = []
+        for outcome in term_results:
+            if isinstance(outcome, Exception):
+                self.log_progress(f"Errore ricerca Ufficio Camerale: {str(outcome)}", "error")
+            elif outcome:
+                found.append(outcome)
+        
+        if found:
+            search_results["serper_results"] = self._merge_serper_results(found)
         
         return search_results
     
-    def _search_reportaziende(self, company_name: str, vat_number: str) -> Dict[str, Any]:
+    async def _search_reportaziende(self, company_name: str, vat_number: str) -> Dict[str, Any]:
         """Cerca dati in ReportAziende"""
         self.log_progress("Cercando dati in ReportAziende...")
         
@@ -131,27 +160,44 @@ class CompanyAgent(BaseAgent):
         if vat_number:
             search_terms.append(vat_number)
         
-        for term in search_terms:
-            try:
-                # Cerca tramite Serper se disponibile
-                if self.api_config.serper_api_key:
-                    serper_results = self._search_with_serper(
-                        f"site:reportaziende.it {term}"
-                    )
-                    if serper_results:
-                        search_results["serper_results"] = serper_results
-                
-                # Cerca informazioni specifiche
-                company_info = self._extract_company_info_from_search(term, "reportaziende.it")
-                if company_info:
-                    search_results["company_info"] = company_info
-                
-            except Exception as e:
-                self.log_progress(f"Errore ricerca ReportAziende: {str(e)}", "error")
+        term_results = await asyncio.gather(*[
+            self._search_registry_term(term, "reportaziende.it") for term in search_terms
+        ], return_exceptions=True)
+        
+        # I risultati vengono uniti nell'ordine dei termini di ricerca
+        found = []
+        for outcome in term_results:
+            if isinstance(outcome, Exception):
+                self.log_progress(f"Errore ricerca ReportAziende: {str(outcome)}", "error")
+            elif outcome:
+                found.append(outcome)
+        
+        if found:
+            search_results["serper_results"] = self._merge_serper_results(found)
         
         return search_results
     
-    def _search_additional_company_data(self, company_name: str, vat_number: str) -> Dict[str, Any]:
+    async def _search_registry_term(self, term: str, source: str) -> Dict[str, Any]:
+        """Ricerca Serper per un termine su una fonte ufficiale"""
+        # L'estrazione AI avviene una sola volta, su tutte le evidenze raccolte
+        return await self._search_with_serper(f"site:{source} {term}")
+    
+    @staticmethod
+    def _merge_serper_results(results_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Unisce i risultati Serper di più termini, senza link duplicati"""
+        merged = dict(results_list[0])
+        organic, seen = [], set()
+        for results in results_list:
+            for item in results.get("organic", []):
+                link = item.get("link", "")
+                if link and link in seen:
+                    continue
+                seen.add(link)
+                organic.append(item)
+        merged["organic"] = organic
+        return merged
+    
+    async def _search_additional_company_data(self, company_name: str, vat_number: str) -> Dict[str, Any]:
         """Cerca dati aziendali aggiuntivi"""
         self.log_progress("Cercando dati aziendali aggiuntivi...")
         
@@ -168,27 +214,26 @@ class CompanyAgent(BaseAgent):
         if vat_number:
             queries.append(f"partita iva {vat_number} azienda")
         
-        for query in queries:
-            try:
-                if self.api_config.serper_api_key:
-                    results = self._search_with_serper(query)
-                    if results:
-                        additional_data[query] = results
-            except Exception as e:
-                self.log_progress(f"Errore ricerca aggiuntiva: {str(e)}", "error")
+        if not self.api_config.serper_api_key:
+            return additional_data
+        
+        responses = await asyncio.gather(*[
+            self._search_with_serper(query) for query in queries
+        ], return_exceptions=True)
+        
+        for query, results in zip(queries, responses):
+            if isinstance(results, Exception):
+                self.log_progress(f"Errore ricerca aggiuntiva: {str(results)}", "error")
+            elif results:
+                additional_data[query] = results
         
         return additional_data
     
-    def _search_with_serper(self, query: str) -> Dict[str, Any]:
+    async def _search_with_serper(self, query: str) -> Dict[str, Any]:
         """Effettua ricerca tramite Serper"""
         if not self.api_config.serper_api_key:
             return {}
         
-        headers = {
-            "X-API-KEY": self.api_config.serper_api_key,
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "q": query,
             "gl": "it",
@@ -197,54 +242,15 @@ class CompanyAgent(BaseAgent):
         }
         
         try:
-            response = requests.post(
-                "https://google.serper.dev/search",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return await self.serper_search_async(payload, timeout=30)
+        except DeadlineExceeded:
+            raise  # Scadenza o annullamento: lo stage resta incompiuto
         except Exception as e:
             self.log_progress(f"Errore Serper: {str(e)}", "error")
             return {}
     
-    def _extract_company_info_from_search(self, search_term: str, source: str) -> Dict[str, Any]:
-        """Estrae informazioni aziendali dai risultati di ricerca"""
-        
-        # Cerca informazioni tramite AI
-        system_prompt = f"""
-        Stai analizzando risultati di ricerca per raccogliere informazioni aziendali da {source}.
-        Estrai le seguenti informazioni se disponibili:
-        
-        - company_name: nome della società
-        - vat_number: partita IVA
-        - fiscal_code: codice fiscale
-        - legal_form: forma giuridica (SRL, SPA, etc.)
-        - share_capital: capitale sociale
-        - revenue: fatturato
-        - employees: numero dipendenti
-        - headquarters: sede legale
-        - sector: settore di attività
-        - founding_date: data costituzione
-        - legal_representative: rappresentante legale
-        - pec_email: email PEC
-        - phone: telefono
-        - website: sito web
-        
-        Rispondi in formato JSON.
-        """
-        
-        prompt = f"Analizza questi dati per l'azienda cercata '{search_term}' da {source}"
-        
-        result = self.query_openai(prompt, system_prompt)
-        
-        try:
-            return json.loads(result)
-        except json.JSONDecodeError:
-            return {"raw_analysis": result}
-    
-    def _consolidate_company_data(self, all_results: Dict[str, Any]) -> Dict[str, Any]:
+    async def _consolidate_company_data(self, all_results: Dict[str, Any],
+                                        company_name: str = "", vat_number: str = "") -> Dict[str, Any]:
         """Consolida tutti i dati aziendali raccolti"""
         self.log_progress("Consolidando dati aziendali...")
         
@@ -266,35 +272,128 @@ class CompanyAgent(BaseAgent):
             "confidence_score": 0
         }
         
-        # Raccoglie dati da tutte le fonti
-        sources_data = []
+        evidence = self._build_evidence(all_results)
+        if not evidence:
+            return consolidated
+        
+        # Una sola richiesta: record per fonte e record consolidato
+        extraction = await self._batched_extraction(company_name, vat_number, evidence)
         
-        for source_name, source_data in all_results.items():
-            if source_name == "consolidated":
+        sources_data = []
+        for source_name, record in extraction.get("sources", {}).items():
+            if source_name not in REGISTRY_SOURCES or not isinstance(record, dict):
                 continue
-                
-            if isinstance(source_data, dict):
-                if "company_info" in source_data:
-                    sources_data.append(source_data["company_info"])
-                    consolidated["data_sources"].append(source_name)
-                
-                # Estrae dati da risultati Serper
-                if "serper_results" in source_data:
-                    serper_info = self._extract_from_serper_results(source_data["serper_results"])
-                    if serper_info:
-                        sources_data.append(serper_info)
+            record = {k: v for k, v in record.items() if v not in (None, "", [], {})}
+            if record:
+                all_results.setdefault(source_name, {})["company_info"] = record
+                consolidated["data_sources"].append(source_name)
+                sources_data.append(record)
         
-        # Consolida i dati usando AI
-        if sources_data:
-            ai_consolidation = self._ai_consolidate_data(sources_data)
-            consolidated.update(ai_consolidation)
+        if isinstance(extraction.get("consolidated"), dict):
+            consolidated.update(extraction["consolidated"])
+        elif "raw_analysis" in extraction:
+            consolidated["consolidation_error"] = extraction["raw_analysis"]
         
         # Calcola confidence score
         consolidated["confidence_score"] = self._calculate_confidence_score(sources_data)
         
         return consolidated
     
-    def _extract_from_serper_results(self, serper_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _link_entity(self, company_data: Dict[str, Any], consolidated: Dict[str, Any]):
+        """Collega nell'archivio entità l'input a ragione sociale, P.IVA e sito ufficiali"""
+        vat = normalize_vat(consolidated.get("vat_number"))
+        if (consolidated.get("confidence_score", 0) < self.app_config.entity_link_min_confidence
+                or not is_valid_vat(vat)):
+            return
+        
+        website = (consolidated.get("website") or (consolidated.get("contact_info") or {}).get("website")
+                   or company_data.get("website", ""))
+        searched_name = company_data.get("company_name", "")
+        # Il nome ricavato dal dominio è una supposizione: diventa alias solo se digitato dall'utente
+        if company_data.get("domain") and searched_name == domain_to_company_name(company_data["domain"]):
+            searched_name = ""
+        register_company(
+            {"company_name": consolidated.get("company_name") or searched_name,
+             "vat_number": vat, "website": website},
+            self.app_config, authoritative=True, alias_names=(searched_name,) if searched_name else ()
+        )
+    
+    def _build_evidence(self, all_results: Dict[str, Any], per_source: int = 5,
+                        per_query: int = 3) -> Dict[str, str]:
+        """Raccoglie titoli e snippet Serper di ogni fonte come testo da analizzare"""
+        evidence = {}
+        
+        for source_name in REGISTRY_SOURCES:
+            serper_data = all_results.get(source_name, {}).get("serper_results", {})
+            text = self._format_organic(serper_data.get("organic", [])[:per_source])
+            if text:
+                evidence[source_name] = text
+        
+        additional = []
+        for query, serper_data in all_results.get("additional_sources", {}).items():
+            text = self._format_organic(serper_data.get("organic", [])[:per_query])
+            if text:
+                additional.append(f"Ricerca: {query}\n{text}")
+        if additional:
+            evidence["additional_sources"] = "\n".join(additional)
+        
+        return evidence
+    
+    @staticmethod
+    def _format_organic(organic: List[Dict[str, Any]]) -> str:
+        text_content = ""
+        for result in organic:
+            text_content += f"Titolo: {result.get('title', '')}\n"
+            text_content += f"Descrizione: {result.get('snippet', '')}\n"
+            text_content += f"URL: {result.get('link', '')}\n\n"
+        return text_content
+    
+    async def _batched_extraction(self, company_name: str, vat_number: str,
+                                  evidence: Dict[str, str]) -> Dict[str, Any]:
+        """Estrae i record per fonte e il record consolidato con un'unica richiesta AI"""
+        system_prompt = f"""
+        Stai analizzando risultati di ricerca per raccogliere informazioni aziendali da fonti ufficiali.
+        Le evidenze sono divise per fonte. Per ogni fonte estrai solo le informazioni
+        presenti esplicitamente nel testo di quella fonte, usando queste chiavi:
+        {", ".join(COMPANY_FIELDS)}
+        
+        Poi consolida le fonti in un unico record accurato:
+        1. Se una informazione è presente in più fonti con lo stesso valore, usa quel valore
+        2. Se una informazione ha valori diversi, scegli il più dettagliato/preciso
+        3. Se una informazione è presente solo in una fonte, includila se sembra affidabile
+        4. Normalizza i formati (es. partita IVA con 11 cifre)
+        5. Rimuovi duplicati e informazioni palesemente errate
+        
+        Il record consolidato ha le chiavi:
+        - company_name
+        - vat_number (formato italiano IT + 11 cifre)
+        - fiscal_code
+        - legal_form
+        - share_capital (con valuta)
+        - revenue (con valuta e anno se disponibile)
+        - employees (numero)
+        - headquarters (indirizzo completo)
+        - sector
+        - founding_date
+        - legal_representative
+        - contact_info (telefono, email, pec, sito web)
+        - financial_data (altri dati finanziari)
+        
+        Rispondi in formato JSON:
+        {{"sources": {{"<nome fonte>": {{...}}}}, "consolidated": {{...}}}}
+        """
+        
+        target = " / ".join(part for part in (company_name, vat_number) if part)
+        prompt = f"Azienda cercata: {target}\n\n"
+        for source_name, text in evidence.items():
+            prompt += f"=== Fonte: {source_name} ===\n{text}\n"
+        
+        try:
+            return await self.query_structured_async(prompt, system_prompt, BATCHED_EXTRACTION_SCHEMA)
+        except StructuredOutputError as e:
+            return {"raw_analysis": e.raw or str(e)}
+    
+    async def _extract_from_serper_results(self, serper_data: Dict[str, Any]) -> Dict[str, Any]:
         """Estrae informazioni dai risultati Serper"""
         extracted_info = {}
         
@@ -324,58 +423,15 @@ class CompanyAgent(BaseAgent):
                 Formato JSON.
                 """
                 
-                result = self.query_openai(text_content, system_prompt)
-                
                 try:
-                    extracted_info = json.loads(result)
-                except json.JSONDecodeError:
-                    extracted_info = {"raw_text": result}
+                    extracted_info = await self.query_structured_async(
+                        text_content, system_prompt, COMPANY_RECORD_SCHEMA
+                    )
+                except StructuredOutputError as e:
+                    extracted_info = {"raw_text": e.raw or str(e)}
         
         return extracted_info
     
-    def _ai_consolidate_data(self, sources_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Usa AI per consolidare dati da multiple fonti"""
-        
-        # Prepara il testo con tutti i dati
-        all_data_text = ""
-        for i, source in enumerate(sources_data):
-            all_data_text += f"Fonte {i+1}:\n"
-            all_data_text += json.dumps(source, indent=2, ensure_ascii=False)
-            all_data_text += "\n\n"
-        
-        system_prompt = """
-        Hai ricevuto dati aziendali da multiple fonti. Consolidali in un unico record accurato.
-        
-        Regole per il consolidamento:
-        1. Se una informazione è presente in più fonti con lo stesso valore, usa quel valore
-        2. Se una informazione ha valori diversi, scegli il più dettagliato/preciso
-        3. Se una informazione è presente solo in una fonte, includila se sembra affidabile
-        4. Normalizza i formati (es. partita IVA con 11 cifre)
-        5. Rimuovi duplicati e informazioni palesemente errate
-        
-        Restituisci un JSON con le seguenti chiavi:
-        - company_name
-        - vat_number (formato italiano IT + 11 cifre)
-        - fiscal_code
-        - legal_form
-        - share_capital (con valuta)
-        - revenue (con valuta e anno se disponibile)
-        - employees (numero)
-        - headquarters (indirizzo completo)
-        - sector
-        - founding_date
-        - legal_representative
-        - contact_info (telefono, email, pec, sito web)
-        - financial_data (altri dati finanziari)
-        """
-        
-        result = self.query_openai(all_data_text, system_prompt)
-        
-        try:
-            return json.loads(result)
-        except json.JSONDecodeError:
-            return {"consolidation_error": result}
-    
     def _calculate_confidence_score(self, sources_data: List[Dict[str, Any]]) -> float:
         """Calcola un punteggio di affidabilità dei dati"""
         if not sources_data:
@@ -456,7 +512,7 @@ class CompanyAgent(BaseAgent):
         
         return 0.0
     
-    def _analyze_competitor_companies(self, company_data: Dict[str, Any], 
+    async def _analyze_competitor_companies(self, company_data: Dict[str, Any], 
                                    competitors: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Analizza i dati aziendali dei competitor"""
         self.log_progress("Analizzando dati aziendali dei competitor...")
@@ -468,15 +524,23 @@ class CompanyAgent(BaseAgent):
             "competitive_insights": []
         }
         
-        # Analizza ogni competitor
-        for competitor in competitors[:3]:  # Primi 3 competitor
-            comp_name = competitor.get("name", "")
-            if comp_name:
-                comp_data = self._quick_company_lookup(comp_name)
-                analysis["competitor_profiles"].append({
-                    "name": comp_name,
-                    "data": comp_data
-                })
+        # Analizza ogni competitor (primi 3) in parallelo; quelli già noti vengono
+        # letti dalla knowledge base condivisa
+        top_competitors = [c for c in competitors[:3] if c.get("name", "")]
+        comp_names = [c["name"] for c in top_competitors]
+        lookups = await asyncio.gather(*[
+            self.competitor_read_through(
+                "lookup", lambda c=c: self._quick_company_lookup(c["name"]),
+                domain=c.get("domain", ""), name=c["name"]
+            )
+            for c in top_competitors
+        ])
+        
+        for comp_name, comp_data in zip(comp_names, lookups):
+            analysis["competitor_profiles"].append({
+                "name": comp_name,
+                "data": comp_data
+            })
         
         # Genera confronto di mercato
         if analysis["competitor_profiles"]:
@@ -493,19 +557,21 @@ class CompanyAgent(BaseAgent):
         
         return analysis
     
-    def _quick_company_lookup(self, company_name: str) -> Dict[str, Any]:
+    async def _quick_company_lookup(self, company_name: str) -> Dict[str, Any]:
         """Ricerca rapida di dati aziendali per un competitor"""
         try:
             # Ricerca veloce con query mirata
             query = f"{company_name} partita iva sede fatturato dipendenti"
             
             if self.api_config.serper_api_key:
-                serper_results = self._search_with_serper(query)
+                serper_results = await self._search_with_serper(query)
                 if serper_results:
-                    return self._extract_from_serper_results(serper_results)
+                    return await self._extract_from_serper_results(serper_results)
             
             return {"company_name": company_name, "data_found": False}
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.log_progress(f"Errore lookup {company_name}: {str(e)}", "error")
             return {"company_name": company_name, "error": str(e)}
@@ -1,7 +1,22 @@
 from typing import Dict, Any, List
-import json
+import asyncio
 import datetime
 from agents.base_agent import BaseAgent
+from utils.context_builder import ContextBuilder
+from utils.structured_output import StructuredOutputError, text_fields
+
+_TEXT_LIST = {"type": "array", "items": {"type": "string"}}
+
+MARKET_POSITION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **text_fields("market_category", "competitive_position", "market_share_estimate", "growth_potential"),
+        "market_trends": _TEXT_LIST,
+        "positioning_strengths": _TEXT_LIST,
+        "positioning_challenges": _TEXT_LIST
+    },
+    "required": ["market_category", "competitive_position"]
+}
 
 class ReportAgent(BaseAgent):
     """Agente per generare report completi di analisi marketing"""
@@ -9,7 +24,7 @@ class ReportAgent(BaseAgent):
     def __init__(self, api_config, app_config):
         super().__init__(api_config, app_config)
         
-    def analyze(self, all_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_async(self, all_data: Dict[str, Any]) -> Dict[str, Any]:
         """Genera il report finale consolidando tutti i dati"""
         self.log_progress("Generando report completo...")
         
@@ -20,14 +35,20 @@ class ReportAgent(BaseAgent):
         social_data = all_data.get("social_analysis", {})
         company_details = all_data.get("company_analysis", {})
         
+        # Le sezioni generate con AI sono indipendenti: le richiediamo in parallelo
+        executive_summary, market_position = await asyncio.gather(
+            self._generate_executive_summary(all_data),
+            self._generate_market_position(all_data)
+        )
+        
         # Genera le sezioni del report
         report = {
             "metadata": self._generate_metadata(company_data),
-            "executive_summary": self._generate_executive_summary(all_data),
+            "executive_summary": executive_summary,
             "company_profile": self._generate_company_profile(company_data, company_details),
             "digital_presence": self._generate_digital_presence_analysis(semrush_data, social_data),
             "competitor_analysis": self._generate_competitor_analysis(serper_data, semrush_data, social_data),
-            "market_position": self._generate_market_position(all_data),
+            "market_position": market_position,
             "opportunities": self._generate_opportunities(all_data),
             "recommendations": self._generate_recommendations(all_data),
             "action_plan": self._generate_action_plan(all_data),
@@ -60,16 +81,27 @@ class ReportAgent(BaseAgent):
             ]
         }
     
-    def _generate_executive_summary(self, all_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_context(self, all_data: Dict[str, Any], sections: List[tuple]) -> str:
+        """Dati compatti per il prompt: le sezioni sono in ordine di priorità (etichetta, chiave)"""
+        builder = ContextBuilder(self.app_config.context_token_budget)
+        for priority, (label, key) in enumerate(sections):
+            builder.add(label, all_data.get(key, {}), priority)
+        return builder.build()
+    
+    async def _generate_executive_summary(self, all_data: Dict[str, Any]) -> Dict[str, Any]:
         """Genera executive summary"""
         
         # Usa AI per creare un summary intelligente
+        context = self._build_context(all_data, [
+            ("Dati azienda", "company_info"),
+            ("Dati SEMRush", "semrush_analysis"),
+            ("Dati Social", "social_analysis")
+        ])
+        
         summary_prompt = f"""
         Crea un executive summary per un'analisi di marketing digitale basata sui seguenti dati:
         
-        Dati azienda: {json.dumps(all_data.get('company_info', {}), ensure_ascii=False)}
-        Dati SEMRush: {json.dumps(all_data.get('semrush_analysis', {}), ensure_ascii=False)}
-        Dati Social: {json.dumps(all_data.get('social_analysis', {}), ensure_ascii=False)}
+        {context}
         
         L'executive summary deve includere:
         1. Situazione attuale dell'azienda nel digitale
@@ -86,7 +118,7 @@ class ReportAgent(BaseAgent):
         raccomandazioni implementabili.
         """
         
-        ai_summary = self.query_openai(summary_prompt, system_prompt)
+        ai_summary = await self.query_openai_async(summary_prompt, system_prompt)
         
         # Estrae metriche chiave
         key_metrics = self._extract_key_metrics(all_data)
@@ -245,7 +277,7 @@ class ReportAgent(BaseAgent):
         
         return analysis
     
-    def _generate_market_position(self, all_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _generate_market_position(self, all_data: Dict[str, Any]) -> Dict[str, Any]:
         """Analizza la posizione di mercato dell'azienda"""
         
         position = {
@@ -259,12 +291,16 @@ class ReportAgent(BaseAgent):
         }
         
         # Usa AI per analizzare la posizione di mercato
+        context = self._build_context(all_data, [
+            ("Dati azienda", "company_analysis"),
+            ("Competitor", "serper_analysis"),
+            ("Performance SEO", "semrush_analysis")
+        ])
+        
         market_analysis_prompt = f"""
         Analizza la posizione di mercato di questa azienda basandoti sui seguenti dati:
         
-        Dati azienda: {json.dumps(all_data.get('company_analysis', {}), ensure_ascii=False)}
-        Competitor: {json.dumps(all_data.get('serper_analysis', {}), ensure_ascii=False)}
-        Performance SEO: {json.dumps(all_data.get('semrush_analysis', {}), ensure_ascii=False)}
+        {context}
         
         Determina:
         1. Categoria di mercato (leader, challenger, follower, niche player)
@@ -283,13 +319,12 @@ class ReportAgent(BaseAgent):
         basandoti su dati digitali e aziendali. Fornisci valutazioni realistiche e insights actionable.
         """
         
-        ai_analysis = self.query_openai(market_analysis_prompt, system_prompt)
-        
         try:
-            ai_result = json.loads(ai_analysis)
-            position.update(ai_result)
-        except json.JSONDecodeError:
-            position["ai_analysis_raw"] = ai_analysis
+            position.update(await self.query_structured_async(
+                market_analysis_prompt, system_prompt, MARKET_POSITION_SCHEMA, deterministic=False
+            ))
+        except StructuredOutputError as e:
+            position["ai_analysis_raw"] = e.raw or str(e)
         
         return position
     
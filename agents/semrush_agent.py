@@ -1,8 +1,11 @@
 from typing import Dict, Any, List
+import asyncio
 import requests
 import os
 import sys
 from agents.base_agent import BaseAgent
+from utils.cache import get_semrush_cache
+from utils.competitor_kb import get_competitor_kb
 
 
 # Aggiungi il path per gli import
@@ -21,6 +24,9 @@ except ImportError:
     except ImportError:
         SEMRUSH_BASE_URL = "https://api.semrush.com/"
 
+# Righe domain_organic necessarie: top 10 per il traffico organico, 20 per le keyword
+ORGANIC_DISPLAY_LIMIT = 20
+
 class SEMRushAgent(BaseAgent):
     """Agente per l'analisi dei dati SEMRush"""
     
@@ -28,7 +34,7 @@ class SEMRushAgent(BaseAgent):
         super().__init__(api_config, app_config)
         self.base_url = SEMRUSH_BASE_URL
         
-    def analyze(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_async(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
         """Analizza i dati SEMRush per l'azienda"""
         if not self.api_config.semrush_api_key:
             return {"error": "SEMRush API key non configurata"}
@@ -39,29 +45,25 @@ class SEMRushAgent(BaseAgent):
         
         self.log_progress(f"Analizzando {domain} con SEMRush...")
         
-        results = {}
-        
-        # 1. Dati sul traffico organico
-        organic_data = self._get_organic_data(domain)
-        results["organic_traffic"] = organic_data
-        
-        # 2. Dati sui backlink
-        backlink_data = self._get_backlink_data(domain)
-        results["backlinks"] = backlink_data
-        
-        # 3. Keyword ranking
-        keyword_data = self._get_keyword_data(domain)
-        results["keywords"] = keyword_data
-        
-        # 4. Competitor analysis
-        competitors = self._get_competitors(domain)
-        results["competitors"] = competitors
-        
-        # 5. Paid advertising data
-        paid_data = self._get_paid_data(domain)
-        results["paid_advertising"] = paid_data
-        
-        return results
+        # I report SEMRush sono indipendenti: li richiediamo in parallelo
+        organic_dataset, backlink_data, competitors, paid_data = await asyncio.gather(
+            self._get_organic_dataset(domain),  # domain_organic, una sola volta
+            self._get_backlink_data(domain),    # 2. Dati sui backlink
+            self._get_competitors(domain),      # 4. Competitor analysis
+            self._get_paid_data(domain)         # 5. Paid advertising data
+        )
+        
+        # 1. Traffico organico e 3. keyword ranking derivano dallo stesso dataset
+        organic_data = self._get_organic_data(organic_dataset)
+        keyword_data = self._get_keyword_data(organic_dataset)
+        
+        return {
+            "organic_traffic": organic_data,
+            "backlinks": backlink_data,
+            "keywords": keyword_data,
+            "competitors": competitors,
+            "paid_advertising": paid_data
+        }
     
     def _extract_domain(self, url: str) -> str:
         """Estrae il dominio dall'URL"""
@@ -77,17 +79,33 @@ class SEMRushAgent(BaseAgent):
         
         return domain
     
-    def _make_semrush_request(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def _make_semrush_request(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Effettua una richiesta all'API SEMRush"""
         params["key"] = self.api_config.semrush_api_key
         params["export_format"] = "json"
+        url = f"{self.base_url}{endpoint}"
+        
+        # Cache dei report: un report stale viene servito subito e aggiornato in background.
+        # Lettura e scrittura toccano il disco, quindi girano fuori dall'event loop
+        cache = get_semrush_cache(self.app_config)
+        if cache:
+            cached, state = await asyncio.to_thread(cache.lookup, params)
+            if state == "stale":
+                cache.revalidate(params, lambda: self.make_request(
+                    url, params=params, provider="semrush", endpoint=params["type"]
+                ).json())
+            if state != "miss":
+                return cached
         
         try:
-            url = f"{self.base_url}{endpoint}"
-            response = self.make_request(url, params=params)
+            response = await self.make_request_async(url, params=params, provider="semrush",
+                                                     endpoint=params["type"], hedge=True)
             
             if response.status_code == 200:
-                return response.json()
+                data = response.json()
+                if cache:
+                    await asyncio.to_thread(cache.store, params, data)
+                return data
             else:
                 self.log_progress(f"SEMRush API error: {response.status_code}", "error")
                 return {"error": f"API error: {response.status_code}"}
@@ -96,16 +114,19 @@ class SEMRushAgent(BaseAgent):
             self.log_progress(f"SEMRush request failed: {str(e)}", "error")
             return {"error": str(e)}
     
-    def _get_organic_data(self, domain: str) -> Dict[str, Any]:
-        """Ottiene i dati del traffico organico"""
+    async def _get_organic_dataset(self, domain: str) -> Any:
+        """Scarica le keyword organiche del dominio, da cui derivano tutte le viste organiche"""
         params = {
             "type": "domain_organic",
             "domain": domain,
-            "database": "it"  # Database italiano
+            "database": "it",  # Database italiano
+            "display_limit": ORGANIC_DISPLAY_LIMIT
         }
         
-        data = self._make_semrush_request("", params)
-        
+        return await self._make_semrush_request("", params)
+    
+    def _get_organic_data(self, data: Any) -> Dict[str, Any]:
+        """Dati del traffico organico (prime 10 keyword) dal dataset domain_organic"""
         if "error" in data:
             return data
         
@@ -129,7 +150,7 @@ class SEMRushAgent(BaseAgent):
         
         return processed_data
     
-    def _get_backlink_data(self, domain: str) -> Dict[str, Any]:
+    async def _get_backlink_data(self, domain: str) -> Dict[str, Any]:
         """Ottiene i dati dei backlink"""
         params = {
             "type": "backlinks_overview",
@@ -137,7 +158,7 @@ class SEMRushAgent(BaseAgent):
             "target_type": "root_domain"
         }
         
-        data = self._make_semrush_request("", params)
+        data = await self._make_semrush_request("", params)
         
         if "error" in data:
             return data
@@ -157,17 +178,8 @@ class SEMRushAgent(BaseAgent):
         
         return processed_data
     
-    def _get_keyword_data(self, domain: str) -> Dict[str, Any]:
-        """Ottiene i dati delle keyword"""
-        params = {
-            "type": "domain_organic",
-            "domain": domain,
-            "database": "it",
-            "display_limit": 20
-        }
-        
-        data = self._make_semrush_request("", params)
-        
+    def _get_keyword_data(self, data: Any) -> Dict[str, Any]:
+        """Dati delle keyword (distribuzione posizioni e lista) dal dataset domain_organic"""
         if "error" in data:
             return data
         
@@ -201,8 +213,13 @@ class SEMRushAgent(BaseAgent):
         
         return processed_data
     
-    def _get_competitors(self, domain: str) -> List[Dict[str, Any]]:
-        """Ottiene i competitor del dominio"""
+    async def _get_competitors(self, domain: str) -> List[Dict[str, Any]]:
+        """Ottiene i competitor del dominio (dalla knowledge base condivisa, se già noti)"""
+        kb = get_competitor_kb(self.app_config)
+        known = await asyncio.to_thread(kb.get, "seo_competitors", domain=domain) if kb else None
+        if known is not None:
+            return known
+        
         params = {
             "type": "domain_organic_organic",
             "domain": domain,
@@ -210,7 +227,7 @@ class SEMRushAgent(BaseAgent):
             "display_limit": 10
         }
         
-        data = self._make_semrush_request("", params)
+        data = await self._make_semrush_request("", params)
         
         if "error" in data:
             return [data]
@@ -228,9 +245,21 @@ class SEMRushAgent(BaseAgent):
                         "competition_level": item.get("Cl", 0)
                     })
         
+        # Competitor del dominio e panoramica SEO di ciascuno nella knowledge base condivisa
+        if kb:
+            await asyncio.to_thread(self._remember_competitors, kb, domain, competitors)
+        
         return competitors
     
-    def _get_paid_data(self, domain: str) -> Dict[str, Any]:
+    @staticmethod
+    def _remember_competitors(kb, domain: str, competitors: List[Dict[str, Any]]):
+        """Salva i competitor del dominio e la panoramica SEO di ciascuno"""
+        kb.put("seo_competitors", competitors, domain=domain)
+        for competitor in competitors:
+            kb.put("seo", {key: competitor[key] for key in ("se_keywords", "se_traffic")},
+                   domain=competitor["domain"])
+    
+    async def _get_paid_data(self, domain: str) -> Dict[str, Any]:
         """Ottiene i dati della pubblicità a pagamento"""
         params = {
             "type": "domain_adwords",
@@ -238,7 +267,7 @@ class SEMRushAgent(BaseAgent):
             "database": "it"
         }
         
-        data = self._make_semrush_request("", params)
+        data = await self._make_semrush_request("", params)
         
         if "error" in data:
             return data
@@ -1,8 +1,20 @@
 from typing import Dict, Any, List
+import asyncio
 import requests
-import json
 from agents.base_agent import BaseAgent
 from config import SERPER_BASE_URL
+from utils.deadline import DeadlineExceeded
+from utils.structured_output import StructuredOutputError, text_fields
+
+COMPETITOR_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "services": {"type": "array", "items": {"type": "string"}},
+        "products": {"type": "array", "items": {"type": "string"}},
+        **text_fields("sector", "vat_number", "fiscal_code", "headquarters", "revenue", "employees")
+    },
+    "required": ["services", "products", "sector"]
+}
 
 class SerperAgent(BaseAgent):
     """Agente per la ricerca di informazioni online tramite Serper.dev"""
@@ -11,7 +23,7 @@ class SerperAgent(BaseAgent):
         super().__init__(api_config, app_config)
         self.base_url = SERPER_BASE_URL
         
-    def analyze(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_async(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
         """Analizza e cerca informazioni sui competitor online"""
         if not self.api_config.serper_api_key:
             return {"error": "Serper API key non configurata"}
@@ -24,37 +36,32 @@ class SerperAgent(BaseAgent):
         
         results = {}
         
-        # 1. Ricerca generale sull'azienda
-        company_info = self._search_company_info(company_name)
+        # 1. Ricerca generale sull'azienda, 2. ricerca competitor e 4. presenza social
+        # sono indipendenti e partono insieme
+        company_info, competitors, social_presence = await asyncio.gather(
+            self._search_company_info(company_name),
+            self._search_competitors(company_name),
+            self._search_social_presence(company_name)
+        )
         results["company_info"] = company_info
-        
-        # 2. Ricerca competitor
-        competitors = self._search_competitors(company_name)
         results["competitors"] = competitors
         
-        # 3. Ricerca informazioni dettagliate sui competitor
-        competitor_details = []
-        for competitor in competitors.get("competitors", [])[:5]:  # Primi 5 competitor
-            details = self._get_competitor_details(competitor.get("name", ""))
-            competitor_details.append(details)
+        # 3. Ricerca informazioni dettagliate sui competitor (primi 5), al massimo
+        # competitor_workers alla volta; i risultati seguono l'ordine dei competitor
+        workers = asyncio.Semaphore(max(1, self.app_config.competitor_workers))
+        competitor_details = await asyncio.gather(*[
+            self._get_competitor_details_bounded(competitor.get("name", ""), workers,
+                                                 competitor.get("domain", ""))
+            for competitor in competitors.get("competitors", [])[:5]
+        ])
         
-        results["competitor_details"] = competitor_details
-        
-        # 4. Ricerca presenza social
-        social_presence = self._search_social_presence(company_name)
+        results["competitor_details"] = list(competitor_details)
         results["social_presence"] = social_presence
         
         return results
     
-    def _make_serper_request(self, endpoint: str, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    async def _make_serper_request(self, endpoint: str, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """Effettua una richiesta all'API Serper"""
-        url = f"{self.base_url}{endpoint}"
-        
-        headers = {
-            "X-API-KEY": self.api_config.serper_api_key,
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "q": query,
             "gl": "it",  # Geolocalizzazione Italia
@@ -66,18 +73,18 @@ class SerperAgent(BaseAgent):
             payload.update(params)
         
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            return response.json()
+            return await self.serper_search_async(payload, endpoint)
+        except DeadlineExceeded:
+            raise  # Scadenza o annullamento: lo stage resta incompiuto
         except Exception as e:
             self.log_progress(f"Serper request failed: {str(e)}", "error")
             return {"error": str(e)}
     
-    def _search_company_info(self, company_name: str) -> Dict[str, Any]:
+    async def _search_company_info(self, company_name: str) -> Dict[str, Any]:
         """Ricerca informazioni generali sull'azienda"""
         query = f"{company_name} azienda Italia informazioni"
         
-        data = self._make_serper_request("search", query)
+        data = await self._make_serper_request("search", query)
         
         if "error" in data:
             return data
@@ -116,7 +123,7 @@ class SerperAgent(BaseAgent):
         
         return processed_data
     
-    def _search_competitors(self, company_name: str) -> Dict[str, Any]:
+    async def _search_competitors(self, company_name: str) -> Dict[str, Any]:
         """Ricerca competitor dell'azienda"""
         queries = [
             f"{company_name} competitor concorrenti",
@@ -127,9 +134,11 @@ class SerperAgent(BaseAgent):
         all_competitors = []
         competitor_domains = set()
         
-        for query in queries:
-            data = self._make_serper_request("search", query)
-            
+        responses = await asyncio.gather(*[
+            self._make_serper_request("search", query) for query in queries
+        ])
+        
+        for data in responses:
             if "error" not in data and "organic" in data:
                 for result in data["organic"][:5]:
                     # Estrae dominio
@@ -150,7 +159,25 @@ class SerperAgent(BaseAgent):
             "competitors": all_competitors[:10]  # Primi 10 competitor
         }
     
-    def _get_competitor_details(self, competitor_name: str) -> Dict[str, Any]:
+    async def _get_competitor_details_bounded(self, competitor_name: str, workers: asyncio.Semaphore,
+                                              domain: str = "") -> Dict[str, Any]:
+        """Dettagli di un competitor entro il limite di worker; un errore resta confinato al competitor.
+        
+        I competitor già analizzati vengono letti dalla knowledge base condivisa.
+        """
+        async with workers:
+            try:
+                return await self.competitor_read_through(
+                    "profile", lambda: self._get_competitor_details(competitor_name),
+                    domain=domain, name=competitor_name
+                )
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                self.log_progress(f"Analisi competitor {competitor_name} fallita: {str(e)}", "error")
+                return {"name": competitor_name, "error": str(e)}
+    
+    async def _get_competitor_details(self, competitor_name: str) -> Dict[str, Any]:
         """Ottiene dettagli specifici su un competitor"""
         if not competitor_name:
             return {"error": "Nome competitor non fornito"}
@@ -169,9 +196,11 @@ class SerperAgent(BaseAgent):
             "search_results": []
         }
         
-        for query in queries:
-            data = self._make_serper_request("search", query)
-            
+        responses = await asyncio.gather(*[
+            self._make_serper_request("search", query) for query in queries
+        ])
+        
+        for query, data in zip(queries, responses):
             if "error" not in data and "organic" in data:
                 for result in data["organic"][:3]:
                     details["search_results"].append({
@@ -183,21 +212,23 @@ class SerperAgent(BaseAgent):
         
         # Usa AI per estrarre informazioni strutturate
         if details["search_results"]:
-            ai_analysis = self._analyze_competitor_with_ai(competitor_name, details["search_results"])
+            ai_analysis = await self._analyze_competitor_with_ai(competitor_name, details["search_results"])
             details.update(ai_analysis)
         
         return details
     
-    def _search_social_presence(self, company_name: str) -> Dict[str, Any]:
+    async def _search_social_presence(self, company_name: str) -> Dict[str, Any]:
         """Ricerca presenza social dell'azienda"""
         social_platforms = ["facebook", "instagram", "linkedin", "twitter", "youtube", "tiktok"]
         
         social_results = {}
         
-        for platform in social_platforms:
-            query = f"{company_name} {platform}"
-            data = self._make_serper_request("search", query)
-            
+        responses = await asyncio.gather(*[
+            self._make_serper_request("search", f"{company_name} {platform}")
+            for platform in social_platforms
+        ])
+        
+        for platform, data in zip(social_platforms, responses):
             if "error" not in data and "organic" in data:
                 for result in data["organic"][:3]:
                     link = result.get("link", "")
@@ -211,7 +242,7 @@ class SerperAgent(BaseAgent):
         
         return social_results
     
-    def _analyze_competitor_with_ai(self, competitor_name: str, search_results: List[Dict]) -> Dict[str, Any]:
+    async def _analyze_competitor_with_ai(self, competitor_name: str, search_results: List[Dict]) -> Dict[str, Any]:
         """Analizza i risultati di ricerca con AI per estrarre informazioni strutturate"""
         
         # Prepara il testo per l'analisi
@@ -241,16 +272,14 @@ class SerperAgent(BaseAgent):
         
         prompt = f"Analizza questi dati aziendali:\n\n{text_to_analyze}"
         
-        result = self.query_openai(prompt, system_prompt)
-        
         try:
-            return json.loads(result)
-        except json.JSONDecodeError:
+            return await self.query_structured_async(prompt, system_prompt, COMPETITOR_SCHEMA)
+        except StructuredOutputError as e:
             return {
                 "services": [],
                 "products": [],
                 "sector": "Non identificato",
-                "analysis_raw": result
+                "analysis_raw": e.raw or str(e)
             }
     
     def _extract_domain(self, url: str) -> str:
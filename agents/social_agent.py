@@ -1,9 +1,13 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, TYPE_CHECKING
+import asyncio
 import requests
 import json
 import re
-from bs4 import BeautifulSoup
 from agents.base_agent import BaseAgent
+from utils.deadline import DeadlineExceeded
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 
 class SocialAgent(BaseAgent):
@@ -20,7 +24,7 @@ class SocialAgent(BaseAgent):
             "tiktok": "tiktok.com"
         }
         
-    def analyze(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_async(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
         """Analizza la presenza social dell'azienda e dei competitor"""
         company_name = company_data.get("company_name", "")
         if not company_name:
@@ -31,27 +35,36 @@ class SocialAgent(BaseAgent):
         results = {}
         
         # 1. Trova profili social dell'azienda principale
-        company_social = self._find_company_social_profiles(company_name)
+        # 1. e 3. Profili dell'azienda e dei competitor (primi 3) in parallelo
+        # I profili dei competitor già noti vengono letti dalla knowledge base condivisa
+        competitors = [c for c in company_data.get("competitors", [])[:3] if c.get("name", "")]
+        comp_names = [c["name"] for c in competitors]
+        
+        company_social, *competitors_profiles = await asyncio.gather(
+            self._find_company_social_profiles(company_name),
+            *[self.competitor_read_through(
+                "social", lambda c=c: self._find_company_social_profiles(c["name"]),
+                domain=c.get("domain", ""), name=c["name"]
+            ) for c in competitors]
+        )
         results["company_social"] = company_social
         
         # 2. Analizza ogni profilo social trovato
-        social_analytics = {}
-        for platform, profile_data in company_social.items():
-            if profile_data.get("url"):
-                analytics = self._analyze_social_profile(platform, profile_data["url"])
-                social_analytics[platform] = analytics
+        platforms_to_analyze = [
+            (platform, profile_data["url"])
+            for platform, profile_data in company_social.items()
+            if profile_data.get("url")
+        ]
+        analytics = await asyncio.gather(*[
+            self._analyze_social_profile(platform, url) for platform, url in platforms_to_analyze
+        ])
+        social_analytics = {
+            platform: data for (platform, _), data in zip(platforms_to_analyze, analytics)
+        }
         
         results["social_analytics"] = social_analytics
         
-        # 3. Analizza competitor social (se disponibili)
-        competitors = company_data.get("competitors", [])
-        competitor_social = {}
-        
-        for competitor in competitors[:3]:  # Primi 3 competitor
-            comp_name = competitor.get("name", "")
-            if comp_name:
-                comp_social = self._find_company_social_profiles(comp_name)
-                competitor_social[comp_name] = comp_social
+        competitor_social = dict(zip(comp_names, competitors_profiles))
         
         results["competitor_social"] = competitor_social
         
@@ -64,36 +77,33 @@ class SocialAgent(BaseAgent):
         
         return results
     
-    def _find_company_social_profiles(self, company_name: str) -> Dict[str, Any]:
+    async def _find_company_social_profiles(self, company_name: str) -> Dict[str, Any]:
         """Trova i profili social dell'azienda"""
-        social_profiles = {}
-        
-        for platform, domain in self.social_platforms.items():
-            self.log_progress(f"Cercando profilo {platform} per {company_name}")
-            
-            # Cerca tramite Google usando Serper se disponibile
-            if hasattr(self, 'api_config') and self.api_config.serper_api_key:
-                profile = self._search_social_with_serper(company_name, platform)
-            else:
-                profile = self._search_social_direct(company_name, platform)
-            
-            if profile:
-                social_profiles[platform] = profile
+        platforms = list(self.social_platforms.keys())
+        profiles = await asyncio.gather(*[
+            self._find_platform_profile(company_name, platform) for platform in platforms
+        ])
         
-        return social_profiles
+        return {
+            platform: profile for platform, profile in zip(platforms, profiles) if profile
+        }
+    
+    async def _find_platform_profile(self, company_name: str, platform: str) -> Dict[str, Any]:
+        """Trova il profilo dell'azienda su una singola piattaforma"""
+        self.log_progress(f"Cercando profilo {platform} per {company_name}")
+        
+        # Cerca tramite Google usando Serper se disponibile
+        if hasattr(self, 'api_config') and self.api_config.serper_api_key:
+            return await self._search_social_with_serper(company_name, platform)
+        return await self._search_social_direct(company_name, platform)
     
-    def _search_social_with_serper(self, company_name: str, platform: str) -> Dict[str, Any]:
+    async def _search_social_with_serper(self, company_name: str, platform: str) -> Dict[str, Any]:
         """Cerca profilo social usando Serper"""
         if not self.api_config.serper_api_key:
             return {}
         
         query = f"site:{self.social_platforms[platform]} {company_name}"
         
-        headers = {
-            "X-API-KEY": self.api_config.serper_api_key,
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "q": query,
             "gl": "it",
@@ -102,13 +112,7 @@ class SocialAgent(BaseAgent):
         }
         
         try:
-            response = requests.post(
-                "https://google.serper.dev/search", 
-                headers=headers, 
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = await self.serper_search_async(payload)
             
             if "organic" in data and len(data["organic"]) > 0:
                 first_result = data["organic"][0]
@@ -118,12 +122,14 @@ class SocialAgent(BaseAgent):
                     "description": first_result.get("snippet", ""),
                     "found_via": "serper"
                 }
+        except DeadlineExceeded:
+            raise  # Scadenza o annullamento: lo stage resta incompiuto
         except Exception as e:
             self.log_progress(f"Errore ricerca {platform}: {str(e)}", "error")
         
         return {}
     
-    def _search_social_direct(self, company_name: str, platform: str) -> Dict[str, Any]:
+    async def _search_social_direct(self, company_name: str, platform: str) -> Dict[str, Any]:
         """Cerca profilo social direttamente (fallback)"""
         # Questa è una implementazione semplificata
         # In un ambiente reale, potresti usare le API specifiche delle piattaforme
@@ -136,7 +142,7 @@ class SocialAgent(BaseAgent):
         
         for url in possible_urls:
             try:
-                response = self.make_request(url, timeout=10)
+                response = await self.make_request_async(url, timeout=10)
                 if response.status_code == 200:
                     return {
                         "url": url,
@@ -144,12 +150,14 @@ class SocialAgent(BaseAgent):
                         "description": f"Profilo {platform} di {company_name}",
                         "found_via": "direct"
                     }
+            except DeadlineExceeded:
+                raise
             except:
                 continue
         
         return {}
     
-    def _analyze_social_profile(self, platform: str, url: str) -> Dict[str, Any]:
+    async def _analyze_social_profile(self, platform: str, url: str) -> Dict[str, Any]:
         """Analizza un profilo social specifico"""
         self.log_progress(f"Analizzando profilo {platform}: {url}")
         
@@ -163,8 +171,9 @@ class SocialAgent(BaseAgent):
                 "Connection": "keep-alive"
             }
             
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
+            response = await self.make_request_async(url, headers=headers, timeout=15)
+            
+            from bs4 import BeautifulSoup  # Caricato solo quando si analizza una pagina
             
             soup = BeautifulSoup(response.content, 'html.parser')
             
@@ -184,11 +193,13 @@ class SocialAgent(BaseAgent):
             else:
                 return self._analyze_generic_profile(soup, url)
                 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.log_progress(f"Errore analisi {platform}: {str(e)}", "error")
             return {"error": str(e), "platform": platform, "url": url}
     
-    def _analyze_facebook_profile(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    def _analyze_facebook_profile(self, soup: "BeautifulSoup", url: str) -> Dict[str, Any]:
         """Analizza profilo Facebook"""
         data = {
             "platform": "facebook",
@@ -226,7 +237,7 @@ class SocialAgent(BaseAgent):
         
         return data
     
-    def _analyze_instagram_profile(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    def _analyze_instagram_profile(self, soup: "BeautifulSoup", url: str) -> Dict[str, Any]:
         """Analizza profilo Instagram"""
         data = {
             "platform": "instagram",
@@ -267,7 +278,7 @@ class SocialAgent(BaseAgent):
         
         return data
     
-    def _analyze_linkedin_profile(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    def _analyze_linkedin_profile(self, soup: "BeautifulSoup", url: str) -> Dict[str, Any]:
         """Analizza profilo LinkedIn"""
         data = {
             "platform": "linkedin",
@@ -294,7 +305,7 @@ class SocialAgent(BaseAgent):
         
         return data
     
-    def _analyze_twitter_profile(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    def _analyze_twitter_profile(self, soup: "BeautifulSoup", url: str) -> Dict[str, Any]:
         """Analizza profilo Twitter"""
         data = {
             "platform": "twitter",
@@ -322,7 +333,7 @@ class SocialAgent(BaseAgent):
         
         return data
     
-    def _analyze_youtube_profile(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    def _analyze_youtube_profile(self, soup: "BeautifulSoup", url: str) -> Dict[str, Any]:
         """Analizza canale YouTube"""
         data = {
             "platform": "youtube",
@@ -357,7 +368,7 @@ class SocialAgent(BaseAgent):
         
         return data
     
-    def _analyze_tiktok_profile(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    def _analyze_tiktok_profile(self, soup: "BeautifulSoup", url: str) -> Dict[str, Any]:
         """Analizza profilo TikTok"""
         data = {
             "platform": "tiktok",
@@ -384,7 +395,7 @@ class SocialAgent(BaseAgent):
         
         return data
     
-    def _analyze_generic_profile(self, soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    def _analyze_generic_profile(self, soup: "BeautifulSoup", url: str) -> Dict[str, Any]:
         """Analizza profilo generico"""
         return {
             "platform": "generic",
@@ -22,6 +22,8 @@ try:
     # Import delle utilities
     from utils.validators import InputValidator
     from utils.data_processor import DataProcessor
+    from utils.pipeline import Stage, StageResult, StagePipeline
+    from utils.deadline import Deadline, use_deadline
     
     # Import delle configurazioni
     from config import APIConfig, AppConfig
@@ -111,86 +113,78 @@ class MarketingAnalyzer:
             "input_type": input_type
         }
         
+        # Grafo degli stage: SEMRush e Serper sono indipendenti, social e company
+        # usano i competitor trovati da Serper, il report raccoglie tutto
+        stage_specs = [
+            ("semrush", "semrush_analysis", "🔍 Analisi SEO con SEMRush", "✅ Analisi SEMRush completata", ()),
+            ("serper", "serper_analysis", "🌐 Ricerca competitor online", "✅ Ricerca competitor completata", ()),
+            ("social", "social_analysis", "📱 Analisi presenza social media", "✅ Analisi social completata", ("serper",)),
+            ("company", "company_analysis", "🏢 Raccolta dati aziendali ufficiali", "✅ Dati aziendali raccolti", ("serper",)),
+        ]
+        
+        stages = []
+        for name, result_key, label, _, depends_on in stage_specs:
+            if name in self.agents:
+                agent = self.agents[name]
+                stages.append(Stage(name, lambda _, agent=agent: agent.analyze(company_data),
+                                    depends_on=tuple(d for d in depends_on if d in self.agents),
+                                    label=label, allow_partial=True))
+        
+        if 'report' in self.agents:
+            stages.append(Stage("report", lambda _: self.agents['report'].analyze(results),
+                                depends_on=tuple(stage.name for stage in stages),
+                                label="📊 Generazione report completo", allow_partial=True))
+        
+        result_keys = {name: result_key for name, result_key, _, _, _ in stage_specs}
+        result_keys["report"] = "final_report"
+        success_messages = {name: message for name, _, _, message, _ in stage_specs}
+        success_messages["report"] = "✅ Report generato con successo!"
+        
         # Progress bar
         progress_bar = st.progress(0)
         status_text = st.empty()
-        
-        try:
-            # 1. Analisi SEMRush
-            status_text.text("🔍 Analizzando dati SEO con SEMRush...")
-            progress_bar.progress(10)
-            
-            if 'semrush' in self.agents:
-                semrush_results = self.agents['semrush'].analyze(company_data)
-                results["semrush_analysis"] = semrush_results
-                
-                if not semrush_results.get("error"):
-                    st.success("✅ Analisi SEMRush completata")
-                else:
-                    st.warning(f"⚠️ SEMRush: {semrush_results.get('error')}")
-            
-            progress_bar.progress(25)
-            
-            # 2. Ricerca competitor con Serper
-            status_text.text("🌐 Cercando competitor online...")
-            
-            if 'serper' in self.agents:
-                serper_results = self.agents['serper'].analyze(company_data)
-                results["serper_analysis"] = serper_results
-                
-                if not serper_results.get("error"):
-                    st.success("✅ Ricerca competitor completata")
-                    
-                    # Aggiorna company_data con competitor trovati
-                    competitors = serper_results.get("competitors", {}).get("competitors", [])
-                    company_data["competitors"] = competitors
-                else:
-                    st.warning(f"⚠️ Serper: {serper_results.get('error')}")
+        running = {}
+        completed = []
+        
+        def on_stage_start(stage: Stage):
+            running[stage.name] = stage.label
+            status_text.text("⏳ In corso: " + " · ".join(running.values()))
+        
+        def on_stage_done(stage: Stage, result: StageResult):
+            running.pop(stage.name, None)
+            completed.append(stage.name)
+            progress_bar.progress(int(len(completed) / len(stages) * 100))
+            if running:
+                status_text.text("⏳ In corso: " + " · ".join(running.values()))
             
-            progress_bar.progress(50)
+            if not result.ok:
+                st.warning(f"⚠️ {stage.name.capitalize()}: {result.error}")
+                return
             
-            # 3. Analisi social media
-            status_text.text("📱 Analizzando presenza social media...")
+            stage_results = result.value
+            results[result_keys[stage.name]] = stage_results
             
-            if 'social' in self.agents:
-                social_results = self.agents['social'].analyze(company_data)
-                results["social_analysis"] = social_results
-                
-                if not social_results.get("error"):
-                    st.success("✅ Analisi social completata")
-                else:
-                    st.warning(f"⚠️ Social: {social_results.get('error')}")
-            
-            progress_bar.progress(75)
-            
-            # 4. Dati aziendali ufficiali
-            status_text.text("🏢 Raccogliendo dati aziendali ufficiali...")
-            
-            if 'company' in self.agents:
-                company_results = self.agents['company'].analyze(company_data)
-                results["company_analysis"] = company_results
-                
-                if not company_results.get("error"):
-                    st.success("✅ Dati aziendali raccolti")
-                else:
-                    st.warning(f"⚠️ Company: {company_results.get('error')}")
+            if stage_results.get("error"):
+                st.warning(f"⚠️ {stage.name.capitalize()}: {stage_results.get('error')}")
+                return
             
-            progress_bar.progress(90)
+            st.success(f"{success_messages[stage.name]} ({result.duration:.1f}s)")
             
-            # 5. Generazione report
-            status_text.text("📊 Generando report completo...")
-            
-            if 'report' in self.agents:
-                report_results = self.agents['report'].analyze(results)
-                results["final_report"] = report_results
-                
-                if not report_results.get("error"):
-                    st.success("✅ Report generato con successo!")
-                else:
-                    st.warning(f"⚠️ Report: {report_results.get('error')}")
+            if stage.name == "serper":
+                # Aggiorna company_data con competitor trovati (prima che partano social e company)
+                competitors = stage_results.get("competitors", {}).get("competitors", [])
+                company_data["competitors"] = competitors
+        
+        # Esaurito il tempo a disposizione l'analisi si chiude con i risultati parziali
+        deadline = Deadline(self.app_config.analysis_deadline)
+        try:
+            with use_deadline(deadline):
+                pipeline_run = StagePipeline(stages).run(on_stage_start, on_stage_done, deadline,
+                                                         self.app_config.stage_budgets)
+            results["stage_timings"] = pipeline_run.timings()
             
             progress_bar.progress(100)
-            status_text.text("✅ Analisi completata!")
+            status_text.text(f"✅ Analisi completata in {pipeline_run.total_duration:.1f}s!")
             
             return results
             
@@ -0,0 +1,268 @@
+"""
+Analisi batch senza interfaccia: legge un CSV/JSONL di aziende (nome, URL o P.IVA),
+le analizza su un pool di processi e scrive i risultati in JSONL man mano che arrivano.
+
+Uso:
+    python batch.py prospects.csv -o risultati.jsonl --workers 4
+
+Ogni azienda completata viene salvata come checkpoint: rilanciando lo stesso comando
+dopo un'interruzione vengono analizzate solo le aziende mancanti, e vengono ritentate
+quelle concluse con errori o risultati parziali (nel JSONL vale l'ultimo record di un id).
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import APIConfig, AppConfig
+from utils.entities import resolve_company_input
+
+logger = logging.getLogger("batch")
+
+# Colonne/campi riconosciuti come input azienda, in ordine di preferenza
+INPUT_FIELDS = ["company", "input", "azienda", "name", "url", "website", "vat", "partita_iva"]
+
+_worker_state: Dict[str, Any] = {}
+
+
+def company_id(company_input: str) -> str:
+    """Identificativo stabile di un input, usato per checkpoint e resume"""
+    normalized = " ".join(company_input.strip().lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def read_inputs(path: str, column: Optional[str] = None) -> Iterator[str]:
+    """Legge gli input da un file CSV o JSONL"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    yield record
+                    continue
+                field = column or next((k for k in INPUT_FIELDS if record.get(k)), None)
+                if field and record.get(field):
+                    yield str(record[field])
+        else:
+            reader = csv.DictReader(f)
+            fields = reader.fieldnames or []
+            field = column or next((k for k in INPUT_FIELDS if k in fields), fields[0] if fields else None)
+            if field is None:
+                return
+            for row in reader:
+                value = (row.get(field) or "").strip()
+                if value:
+                    yield value
+
+
+def _init_worker(api_config: APIConfig, app_config: AppConfig):
+    """Crea il motore di analisi (lo stesso dell'app) una sola volta per processo"""
+    from core import AdvancedMarketingAnalyzer
+
+    analyzer = AdvancedMarketingAnalyzer()
+    analyzer.app_config = app_config
+    analyzer.setup_api_config(api_config.openai_api_key, api_config.semrush_api_key, api_config.serper_api_key)
+    _worker_state["analyzer"] = analyzer
+
+
+def _ignore_progress(event: Any):
+    """Nessuna interfaccia da aggiornare: gli eventi di avanzamento vengono scartati"""
+
+
+def _process_company(company_input: str, input_type: str) -> Dict[str, Any]:
+    """Analizza un'azienda nel processo worker; gli errori restano confinati al record"""
+    start = time.time()
+    record = {"id": company_id(company_input), "input": company_input, "input_type": input_type}
+
+    try:
+        # Ogni azienda ha il suo budget (app_config.analysis_deadline): se si esaurisce
+        # il record contiene i risultati parziali
+        results = _worker_state["analyzer"].run_comprehensive_analysis(company_input, on_progress=_ignore_progress)
+        record["results"] = results
+        if "error" in results:
+            record.update(status="error", error=results["error"])
+        else:
+            # Con stage falliti o tempo esaurito il record è parziale (e non entra nell'archivio)
+            record["status"] = "partial" if results.get("incomplete") else "ok"
+    except Exception as e:
+        record.update(status="error", error=str(e))
+
+    record["duration"] = round(time.time() - start, 2)
+    return record
+
+
+class CheckpointStore:
+    """Checkpoint per azienda: un file JSON per ogni analisi conclusa.
+
+    Gli esiti non riusciti (errori, risultati parziali) hanno un file a parte
+    e non contano come conclusi: al resume vengono ritentati.
+    """
+
+    FAILED_SUFFIX = ".failed.json"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, cid: str, ok: bool = True) -> str:
+        return os.path.join(self.directory, f"{cid}{'.json' if ok else self.FAILED_SUFFIX}")
+
+    def done_ids(self) -> set:
+        """Identificativi delle aziende analizzate con successo"""
+        return {name[:-5] for name in os.listdir(self.directory)
+                if name.endswith(".json") and not name.endswith(self.FAILED_SUFFIX)}
+
+    def failed_ids(self) -> set:
+        """Identificativi delle aziende con un tentativo non riuscito, da ritentare"""
+        return {name[:-len(self.FAILED_SUFFIX)] for name in os.listdir(self.directory)
+                if name.endswith(self.FAILED_SUFFIX)} - self.done_ids()
+
+    def load(self, cid: str) -> Dict[str, Any]:
+        with open(self._path(cid), encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, record: Dict[str, Any]):
+        """Scrittura atomica: un checkpoint esiste solo se completo"""
+        ok = record.get("status") == "ok"
+        path = self._path(record["id"], ok)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+        if ok and os.path.exists(self._path(record["id"], ok=False)):
+            os.remove(self._path(record["id"], ok=False))
+
+
+def _written_ids(output_path: str) -> set:
+    """Identificativi già presenti nel file di output"""
+    ids = set()
+    if not os.path.exists(output_path):
+        return ids
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                ids.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue  # Riga troncata da un'interruzione
+    return ids
+
+
+def run_batch(inputs: List[str], output_path: str, checkpoint_dir: str, workers: int,
+              api_config: APIConfig, app_config: AppConfig) -> Tuple[int, int]:
+    """Analizza gli input non ancora completati e restituisce (completati, errori)"""
+    checkpoints = CheckpointStore(checkpoint_dir)
+    done = checkpoints.done_ids()
+    retry = checkpoints.failed_ids()
+    written = _written_ids(output_path)
+
+    # Input unici, nell'ordine del file
+    pending, seen = [], set()
+    for company_input in inputs:
+        cid = company_id(company_input)
+        if cid not in seen and cid not in done:
+            pending.append(company_input)
+        seen.add(cid)
+
+    completed = errors = 0
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        def emit(record: Dict[str, Any]):
+            nonlocal completed, errors
+            # Le analisi complete sono già nell'archivio (e nello storico dell'app): le salva il motore
+            checkpoints.save(record)
+            output.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            output.flush()
+
+            completed += 1
+            if record["status"] != "ok":
+                errors += 1
+            logger.info(f"[{completed}/{len(pending)}] {record['input']}: {record['status']}")
+
+        # Checkpoint di un'esecuzione interrotta prima di scrivere l'output
+        for cid in sorted((done & seen) - written):
+            output.write(json.dumps(checkpoints.load(cid), ensure_ascii=False, default=str) + "\n")
+        output.flush()
+
+        logger.info(f"{len(seen)} aziende, {len(seen) - len(pending)} già analizzate, {len(pending)} da analizzare "
+                    f"({len(retry & seen)} da ritentare)")
+
+        # La validazione è immediata: solo gli input validi vanno ai worker
+        valid = []
+        for company_input in pending:
+            is_valid, input_type, _ = resolve_company_input(company_input, app_config)
+            if is_valid:
+                valid.append((company_input, input_type))
+            else:
+                emit({"id": company_id(company_input), "input": company_input, "input_type": input_type,
+                      "status": "error", "error": "Input non valido"})
+
+        if not valid:
+            return completed, errors
+
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(api_config, app_config))
+        try:
+            futures = {executor.submit(_process_company, *item): item[0] for item in valid}
+
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    company_input = futures[future]
+                    record = {"id": company_id(company_input), "input": company_input,
+                              "status": "error", "error": str(e)}
+                emit(record)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return completed, errors
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point da riga di comando"""
+    parser = argparse.ArgumentParser(description="Analisi marketing batch da CSV/JSONL")
+    parser.add_argument("input", help="File CSV o JSONL con nomi, URL o partite IVA")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="File JSONL dei risultati")
+    parser.add_argument("--column", help="Colonna/campo con l'input azienda (default: rilevato)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Processi worker")
+    parser.add_argument("--concurrency", type=int, help="Richieste contemporanee per agente in ogni processo")
+    parser.add_argument("--checkpoint-dir", help="Directory dei checkpoint (default: <output>.checkpoints)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    api_config = APIConfig.from_env()
+    if not api_config.openai_api_key:
+        logger.error("OPENAI_API_KEY non configurata")
+        return 2
+
+    app_config = AppConfig()
+    if args.concurrency:
+        app_config.max_concurrency = args.concurrency
+
+    inputs = list(read_inputs(args.input, args.column))
+    checkpoint_dir = args.checkpoint_dir or f"{args.output}.checkpoints"
+
+    try:
+        completed, errors = run_batch(inputs, args.output, checkpoint_dir, max(1, args.workers),
+                                      api_config, app_config)
+    except KeyboardInterrupt:
+        logger.warning("Interrotto: rilanciare lo stesso comando per riprendere")
+        return 130
+
+    logger.info(f"Completate {completed} analisi ({errors} con errori) -> {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
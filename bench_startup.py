@@ -0,0 +1,77 @@
+"""
+Misura il cold start dei worker headless: il tempo di import dei moduli del
+motore in un interprete nuovo, e i moduli pesanti che ciascun import carica.
+
+Uso:
+    python bench_startup.py [--runs 5] [--budget-scale 1.0]
+
+Esce con codice 1 se la mediana di un import supera il suo budget o se un
+import carica moduli che devono restare differiti fino al primo utilizzo.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# (nome, istruzione di import, budget in secondi, moduli che non deve caricare)
+TARGETS = [
+    ("core", "import core", 0.5, ["streamlit", "openai", "pandas"]),
+    ("agents", "import agents, utils", 0.05, ["openai", "bs4", "pandas", "requests"]),
+    ("serper_agent", "from agents import SerperAgent", 0.5, ["openai", "bs4", "pandas", "streamlit"]),
+    ("data_processor", "from utils import DataProcessor", 0.05, ["pandas"]),
+]
+
+HEAVY_MODULES = sorted({module for target in TARGETS for module in target[3]})
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+%s
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure_once(statement: str) -> dict:
+    """Esegue l'import in un processo Python nuovo e restituisce tempo e moduli caricati"""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE % (statement, HEAVY_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del cold start headless")
+    parser.add_argument("--runs", type=int, default=5, help="Numero di misure per import")
+    parser.add_argument("--budget-scale", type=float, default=float(os.getenv("STARTUP_BUDGET_SCALE", "1.0")),
+                        help="Moltiplicatore dei budget (macchine lente in CI)")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for name, statement, budget, forbidden in TARGETS:
+        samples = [measure_once(statement) for _ in range(max(1, args.runs))]
+        times = [sample["seconds"] for sample in samples]
+        loaded = sorted({module for sample in samples for module in sample["loaded"]} & set(forbidden))
+        median = statistics.median(times)
+        budget *= args.budget_scale
+
+        print(f"{name:<16} mediana {median * 1000:6.1f} ms  min {min(times) * 1000:6.1f} ms  "
+              f"max {max(times) * 1000:6.1f} ms  (budget {budget * 1000:.0f} ms)")
+
+        if loaded:
+            failures.append(f"{statement!r} carica {', '.join(loaded)}")
+        if median > budget:
+            failures.append(f"{statement!r} oltre il budget ({median * 1000:.0f} ms > {budget * 1000:.0f} ms)")
+
+    for failure in failures:
+        print(f"ERRORE: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
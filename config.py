@@ -22,10 +22,103 @@ class APIConfig:
 class AppConfig:
     """Configurazioni generali dell'applicazione"""
     max_retries: int = 3
+    analysis_deadline: float = 240  # Secondi a disposizione di un'intera analisi
+    stage_budgets: dict = None  # Sotto-budget in secondi per stage della pipeline ("default" per gli altri)
+    section_max_age: dict = None  # Secondi dopo cui una sezione dei risultati va ricalcolata in modalità refresh
+    openai_timeout: int = 60  # Timeout di una chat completion OpenAI
+    retry_base_delay: float = 0.5  # Secondi del primo backoff (con jitter, raddoppia a ogni tentativo)
+    retry_max_delay: float = 30.0  # Attesa massima tra due tentativi, anche con Retry-After
+    breaker_failure_threshold: int = 5  # Errori consecutivi lato server che aprono il circuito di un host
+    breaker_reset_timeout: int = 30  # Secondi prima di riprovare un host escluso
     timeout: int = 30
+    max_concurrency: int = 8  # Richieste HTTP/OpenAI contemporanee per agente
+    competitor_workers: int = 3  # Competitor analizzati in parallelo
+    http_pool_connections: int = 10  # Host con pool di connessioni keep-alive
+    http_pool_maxsize: int = 16  # Connessioni keep-alive per host
+    coalesce_window: int = 300  # Secondi in cui richieste identiche della stessa analisi condividono il risultato
+    hedge_enabled: bool = False  # Duplica le richieste Serper/SEMRush più lente (consuma quota extra)
+    hedge_percentile: float = 95  # Percentile di latenza dopo cui parte il duplicato
+    hedge_min_samples: int = 20  # Latenze osservate per endpoint prima di duplicare
+    hedge_min_delay: float = 0.3  # Attesa minima in secondi prima di un duplicato
+    hedge_max_ratio: float = 0.1  # Quota massima di richieste duplicate
+    cache_enabled: bool = True
+    cache_dir: str = os.getenv("MARKET_ANALYZER_CACHE_DIR", ".cache")
+    analysis_store_enabled: bool = True  # Salva ogni analisi conclusa nell'archivio locale
+    analysis_store_path: str = os.getenv("MARKET_ANALYZER_STORE", os.path.join(".data", "analyses.sqlite3"))
+    analysis_history_limit: int = 50  # Analisi mostrate nello storico
+    competitor_kb_enabled: bool = True  # Schede dei competitor condivise tra le analisi
+    competitor_kb_path: str = os.getenv("MARKET_ANALYZER_COMPETITOR_KB", os.path.join(".data", "competitors.sqlite3"))
+    competitor_kb_max_age: dict = None  # Secondi di validità per tipo di dato di un competitor
+    entity_resolution_enabled: bool = True  # Risolve gli input su aziende canoniche prima di ogni chiamata
+    entity_store_path: str = os.getenv("MARKET_ANALYZER_ENTITIES", os.path.join(".data", "entities.sqlite3"))
+    entity_link_min_confidence: float = 0.6  # Confidenza minima dei dati aziendali per collegare P.IVA e sito al nome
+    serper_cache_max_entries: int = 5000
+    serper_cache_ttls: dict = None  # Secondi di validità per famiglia di query Serper
+    semrush_cache_max_entries: int = 2000
+    semrush_cache_ttls: dict = None  # Secondi di freschezza per tipo di report SEMRush
+    semrush_stale_ttl: int = 30 * 24 * 3600  # Finestra in cui un report scaduto è servito mentre si aggiorna
+    openai_cache_max_entries: int = 5000
+    openai_cache_ttl: int = 14 * 24 * 3600
+    structured_output_retries: int = 1  # Richieste di correzione per risposte JSON non conformi
+    context_token_budget: int = 1500  # Token massimi dei dati di analisi inseriti nei prompt
+    rate_limits: dict = None  # Token bucket per provider o "provider:endpoint": richieste/s e burst
     user_agents: list = None
     
     def __post_init__(self):
+        if self.serper_cache_ttls is None:
+            self.serper_cache_ttls = {
+                "social": 7 * 24 * 3600,
+                "registry": 30 * 24 * 3600,
+                "financial": 30 * 24 * 3600,
+                "competitors": 7 * 24 * 3600,
+                "default": 3 * 24 * 3600
+            }
+        
+        if self.semrush_cache_ttls is None:
+            self.semrush_cache_ttls = {
+                "backlinks_overview": 30 * 24 * 3600,
+                "domain_organic": 7 * 24 * 3600,
+                "domain_organic_organic": 7 * 24 * 3600,
+                "domain_adwords": 7 * 24 * 3600,
+                "domain_overview": 7 * 24 * 3600,
+                "default": 7 * 24 * 3600
+            }
+        
+        if self.stage_budgets is None:
+            self.stage_budgets = {
+                "competitors": 60,
+                "seo_analysis": 60,
+                "semrush_analysis": 60,
+                "default": 120
+            }
+        
+        if self.section_max_age is None:
+            self.section_max_age = {
+                "company_research": 30 * 24 * 3600,
+                "competitors_analysis": 14 * 24 * 3600,
+                "seo_analysis": 7 * 24 * 3600,
+                "social_analysis": 24 * 3600,
+                "default": 7 * 24 * 3600
+            }
+        
+        if self.competitor_kb_max_age is None:
+            self.competitor_kb_max_age = {
+                "profile": 30 * 24 * 3600,
+                "research": 30 * 24 * 3600,
+                "lookup": 30 * 24 * 3600,
+                "social": 14 * 24 * 3600,
+                "seo": 14 * 24 * 3600,
+                "seo_competitors": 14 * 24 * 3600,
+                "default": 30 * 24 * 3600
+            }
+        
+        if self.rate_limits is None:
+            self.rate_limits = {
+                "serper": {"rate": 5, "burst": 10},
+                "semrush": {"rate": 10, "burst": 10},
+                "openai": {"rate": 8, "burst": 8}
+            }
+        
         if self.user_agents is None:
             self.user_agents = [
                 "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
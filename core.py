@@ -0,0 +1,1700 @@
+"""
+Motore di analisi di Marketing Analyzer Pro, senza dipendenze da Streamlit.
+
+Può essere importato da worker, script e benchmark; l'avanzamento dell'analisi
+viene comunicato tramite callback (vedi ProgressEvent), che l'app Streamlit
+traduce in widget.
+"""
+
+import requests
+import json
+import re
+from typing import Dict, Any, Tuple, List, Optional, Callable, Iterable, Iterator
+from urllib.parse import urlparse
+from datetime import datetime
+import logging
+import queue
+import time
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor
+from config import AppConfig
+from utils.http_client import get_transport, get_openai_client
+from utils.cache import get_serper_cache, get_semrush_cache, get_completion_cache, SerperCache, bypass_response_cache
+from utils.pipeline import Stage, StageResult, StagePipeline
+from utils.rate_limit import get_rate_limiter
+from utils.retry import RetryPolicy, call_with_retry
+from utils.deadline import Deadline, DeadlineExceeded, bind_deadline, check_deadline, deadline_timeout, use_deadline
+from utils.json_stream import partial_json_callback
+from utils.context_builder import build_analysis_context
+from utils.freshness import FRESHNESS_KEY, fingerprint, has_errors, reusable_sections, stamp
+from utils.analysis_store import get_analysis_store
+from utils.competitor_kb import get_competitor_kb
+from utils.entities import resolve_company_input
+from utils.structured_output import StructuredOutputError, query_structured, supports_json_mode, text_fields
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ReportSection:
+    """Sezione markdown del report, con la sua posizione nel documento"""
+    key: str
+    order: int
+    markdown: str
+    partial: bool = False  # Versione provvisoria, mentre la risposta AI è in streaming
+
+@dataclass
+class ProgressEvent:
+    """Evento di avanzamento dell'analisi, inoltrato alla UI tramite callback"""
+    kind: str  # "info", "success", "warning", "error", "status" (testo di stato) o "section"
+    message: str
+    progress: Optional[int] = None  # Percentuale completata, se cambiata
+    section: Optional[ReportSection] = None  # Sezione del report pronta (kind "section")
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+def log_progress(event: ProgressEvent):
+    """Callback di default: scrive gli eventi nel log"""
+    level = logging.WARNING if event.kind in ("warning", "error") else logging.INFO
+    logger.log(level, event.message)
+
+def _format_timestamp(value: str) -> str:
+    """Data e ora leggibili di un timestamp ISO"""
+    try:
+        return datetime.fromisoformat(value).strftime("%d/%m/%Y %H:%M")
+    except (TypeError, ValueError):
+        return str(value)
+
+def _without_response_cache(func: Callable[[Dict[str, Any]], Any]) -> Callable[[Dict[str, Any]], Any]:
+    """Stage che richiede dati aggiornati alle API invece di leggere le risposte in cache"""
+    def run(inputs: Dict[str, Any]) -> Any:
+        with bypass_response_cache():
+            return func(inputs)
+    return run
+
+@dataclass
+class APIConfig:
+    """Configurazione API Keys"""
+    openai_api_key: str = ""
+    semrush_api_key: str = ""
+    serper_api_key: str = ""
+
+class InputValidator:
+    """Validatore input avanzato"""
+    
+    @staticmethod
+    def validate_company_input(input_text: str) -> Tuple[bool, str, Dict[str, Any]]:
+        if not input_text or not input_text.strip():
+            return False, "empty", {}
+        
+        input_text = input_text.strip()
+        
+        if InputValidator.is_url(input_text):
+            domain = InputValidator.extract_domain(input_text)
+            company_name = InputValidator.domain_to_company_name(domain)
+            return True, "url", {
+                "website": input_text,
+                "domain": domain,
+                "company_name": company_name
+            }
+        
+        if InputValidator.is_italian_vat(input_text):
+            return True, "vat", {
+                "vat_number": input_text,
+                "company_name": f"Azienda P.IVA {input_text}"
+            }
+        
+        if len(input_text) >= 2:
+            return True, "name", {
+                "company_name": input_text
+            }
+        
+        return False, "invalid", {}
+    
+    @staticmethod
+    def is_url(text: str) -> bool:
+        try:
+            result = urlparse(text)
+            return all([result.scheme, result.netloc])
+        except:
+            return False
+    
+    @staticmethod
+    def is_italian_vat(text: str) -> bool:
+        clean_text = re.sub(r'[^\d]', '', text.upper().replace('IT', ''))
+        if len(clean_text) == 11 and clean_text.isdigit():
+            return InputValidator._validate_italian_vat_checksum(clean_text)
+        return False
+    
+    @staticmethod
+    def _validate_italian_vat_checksum(vat: str) -> bool:
+        if len(vat) != 11:
+            return False
+        
+        try:
+            odd_sum = sum(int(vat[i]) for i in range(0, 10, 2))
+            even_sum = 0
+            
+            for i in range(1, 10, 2):
+                double = int(vat[i]) * 2
+                even_sum += double if double < 10 else double - 9
+            
+            total = odd_sum + even_sum
+            check_digit = (10 - (total % 10)) % 10
+            
+            return int(vat[10]) == check_digit
+        except:
+            return False
+    
+    @staticmethod
+    def extract_domain(url: str) -> str:
+        try:
+            parsed = urlparse(url)
+            domain = parsed.netloc
+            if domain.startswith('www.'):
+                domain = domain[4:]
+            return domain
+        except:
+            return ""
+    
+    @staticmethod
+    def domain_to_company_name(domain: str) -> str:
+        if not domain:
+            return ""
+        
+        extensions = ['.com', '.it', '.org', '.net', '.eu', '.co.uk']
+        company_name = domain
+        
+        for ext in extensions:
+            if company_name.endswith(ext):
+                company_name = company_name[:-len(ext)]
+                break
+        
+        return company_name.capitalize()
+
+class SimpleSerperAgent:
+    """Agente Serper semplificato ma completo"""
+    
+    def __init__(self, api_key: str, retry_policy: Optional[RetryPolicy] = None):
+        self.api_key = api_key
+        self.base_url = "https://google.serper.dev/search"
+        self.retry_policy = retry_policy or RetryPolicy()
+    
+    def deep_company_research(self, company_name: str, domain: str = None) -> Dict[str, Any]:
+        """Ricerca approfondita dell'azienda"""
+        
+        all_results = {
+            "company_info": {},
+            "financial_data": {},
+            "business_info": {}
+        }
+        
+        # Query specifiche per diversi tipi di informazioni
+        queries = [
+            f"{company_name} azienda informazioni sede",
+            f"{company_name} fatturato dipendenti",
+            f"{company_name} prodotti servizi"
+        ]
+        
+        failures = 0
+        for i, query in enumerate(queries):
+            try:
+                results = self._search(query)
+                if "error" in results:
+                    failures += 1
+                
+                if i == 0:
+                    all_results["company_info"] = results
+                elif i == 1:
+                    all_results["financial_data"] = results
+                elif i == 2:
+                    all_results["business_info"] = results
+                
+            except DeadlineExceeded:
+                raise  # Scadenza o annullamento: lo stage resta incompiuto
+            except Exception as e:
+                failures += 1
+                logger.error(f"Errore ricerca '{query}': {e}")
+                continue
+        
+        # Nessuna ricerca riuscita: la sezione è in errore (analisi parziale, non riusabile)
+        if failures == len(queries):
+            all_results["error"] = "Ricerche Serper non riuscite"
+        
+        return all_results
+    
+    def research_competitors(self, company_name: str, sector: str = None) -> List[Dict[str, Any]]:
+        """Ricerca competitor"""
+        
+        competitor_queries = [
+            f"{company_name} competitor concorrenti",
+            f"{company_name} alternative simili"
+        ]
+        
+        all_competitors = []
+        seen_domains = set()
+        errors = []
+        
+        for query in competitor_queries:
+            try:
+                results = self._search(query)
+                if "error" in results:
+                    errors.append(results["error"])
+                
+                if "organic" in results:
+                    for result in results["organic"][:3]:
+                        domain = self._extract_domain(result.get("link", ""))
+                        
+                        if domain and domain not in seen_domains:
+                            seen_domains.add(domain)
+                            
+                            competitor = {
+                                "name": result.get("title", "").split(" - ")[0],
+                                "domain": domain,
+                                "url": result.get("link", ""),
+                                "description": result.get("snippet", "")
+                            }
+                            
+                            all_competitors.append(competitor)
+                
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                errors.append(str(e))
+                logger.error(f"Errore ricerca competitor: {e}")
+                continue
+        
+        # Senza nessuna ricerca riuscita "nessun competitor" non è un risultato: lo stage fallisce
+        if len(errors) == len(competitor_queries):
+            raise RuntimeError(f"Ricerca competitor non riuscita: {errors[-1]}")
+        
+        return all_competitors[:5]
+    
+    def analyze_competitor_details(self, competitor: Dict[str, Any]) -> Dict[str, Any]:
+        """Analizza dettagli di un competitor (letti dalla knowledge base se già noti)"""
+        
+        comp_name = competitor.get("name", "")
+        if not comp_name:
+            return {"basic_info": competitor, "detailed_research": {}}
+        
+        try:
+            kb = get_competitor_kb()
+            domain = competitor.get("domain", "")
+            research = kb.get("research", domain, comp_name) if kb else None
+            
+            if research is None:
+                query = f"{comp_name} azienda informazioni business"
+                results = self._search(query)
+                research = {
+                    "search_1": {
+                        "query": query,
+                        "results": results
+                    }
+                }
+                if kb and "error" not in results:
+                    kb.put("research", research, domain, comp_name)
+            
+            return {
+                "basic_info": competitor,
+                "detailed_research": research
+            }
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Errore analisi competitor: {e}")
+            return {"basic_info": competitor, "detailed_research": {}}
+    
+    def analyze_competitors_details(self, competitors: List[Dict[str, Any]],
+                                    max_workers: int = 3) -> List[Dict[str, Any]]:
+        """Analizza più competitor in parallelo mantenendo l'ordine di input"""
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            analyze = bind_deadline(self.analyze_competitor_details)
+            futures = [executor.submit(analyze, c) for c in competitors]
+        
+        detailed = []
+        for competitor, future in zip(competitors, futures):
+            try:
+                detailed.append(future.result())
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                logger.error(f"Errore analisi competitor: {e}")
+                detailed.append({"basic_info": competitor, "detailed_research": {}})
+        
+        if detailed and all(self._research_failed(detail) for detail in detailed):
+            raise RuntimeError("Ricerca dei dettagli dei competitor non riuscita")
+        
+        return detailed
+    
+    @staticmethod
+    def _research_failed(detail: Dict[str, Any]) -> bool:
+        """True se la ricerca di un competitor non ha prodotto risultati utilizzabili"""
+        research = detail.get("detailed_research") or {}
+        searches = [search.get("results") or {} for search in research.values() if isinstance(search, dict)]
+        return not searches or all("error" in results for results in searches)
+    
+    def comprehensive_social_analysis(self, company_name: str) -> Dict[str, Any]:
+        """Analisi completa social media"""
+        
+        social_platforms = {
+            "instagram": "instagram.com",
+            "facebook": "facebook.com",
+            "linkedin": "linkedin.com",
+            "youtube": "youtube.com",
+            "tiktok": "tiktok.com"
+        }
+        
+        social_analysis = {
+            "platforms_found": {},
+            "social_metrics": {},
+            "engagement_analysis": {}
+        }
+        
+        failures = 0
+        for platform, domain in social_platforms.items():
+            try:
+                query = f"site:{domain} {company_name}"
+                results = self._search(query)
+                if "error" in results:
+                    failures += 1
+                
+                if "organic" in results and len(results["organic"]) > 0:
+                    result = results["organic"][0]
+                    link = result.get("link", "")
+                    
+                    if platform in link.lower():
+                        social_analysis["platforms_found"][platform] = {
+                            "url": link,
+                            "title": result.get("title", ""),
+                            "description": result.get("snippet", "")
+                        }
+                        
+                        # Cerca metriche specifiche
+                        metrics = self._get_platform_metrics(company_name, platform)
+                        social_analysis["social_metrics"][platform] = metrics
+                
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                failures += 1
+                logger.error(f"Errore analisi social {platform}: {e}")
+                continue
+        
+        if failures == len(social_platforms):
+            social_analysis["error"] = "Ricerche Serper non riuscite"
+        
+        # Calcola engagement complessivo
+        platforms_count = len(social_analysis["platforms_found"])
+        total_followers = 0
+        
+        for platform, metrics in social_analysis["social_metrics"].items():
+            followers_str = metrics.get("followers", "0")
+            if followers_str != "N/A":
+                total_followers += self._convert_social_number(followers_str)
+        
+        social_analysis["engagement_analysis"] = {
+            "platforms_active": platforms_count,
+            "presence_score": round((platforms_count / 5) * 100, 1),
+            "total_followers_estimate": total_followers,
+            "social_maturity": "Alto" if platforms_count >= 4 else "Medio" if platforms_count >= 2 else "Basso"
+        }
+        
+        return social_analysis
+    
+    def _get_platform_metrics(self, company_name: str, platform: str) -> Dict[str, Any]:
+        """Cerca metriche specifiche per piattaforma"""
+        
+        try:
+            query = f"{company_name} {platform} follower statistics"
+            results = self._search(query)
+            
+            metrics = {
+                "followers": "N/A",
+                "engagement_rate": "N/A",
+                "verified": "N/A"
+            }
+            
+            if "organic" in results:
+                for result in results["organic"]:
+                    text = f"{result.get('title', '')} {result.get('snippet', '')}"
+                    
+                    # Cerca pattern per follower
+                    follower_match = re.search(r'(\d+(?:\.\d+)?[KMkm]?)\s*(?:follower|seguaci)', text, re.IGNORECASE)
+                    if follower_match and metrics["followers"] == "N/A":
+                        metrics["followers"] = follower_match.group(1)
+                    
+                    # Cerca engagement rate
+                    engagement_match = re.search(r'engagement.*?(\d+(?:\.\d+)?%)', text, re.IGNORECASE)
+                    if engagement_match and metrics["engagement_rate"] == "N/A":
+                        metrics["engagement_rate"] = engagement_match.group(1)
+                    
+                    # Cerca verificato
+                    if "verificat" in text.lower() or "verified" in text.lower():
+                        metrics["verified"] = "Sì"
+            
+            return metrics
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Errore metriche {platform}: {e}")
+            return {"followers": "N/A", "engagement_rate": "N/A", "verified": "N/A"}
+    
+    def _convert_social_number(self, number_str: str) -> int:
+        """Converte numeri social in integer"""
+        if not number_str or number_str == "N/A":
+            return 0
+        
+        number_str = str(number_str).upper().replace(",", "")
+        
+        try:
+            if "K" in number_str:
+                return int(float(number_str.replace("K", "")) * 1000)
+            elif "M" in number_str:
+                return int(float(number_str.replace("M", "")) * 1000000)
+            else:
+                return int(float(number_str))
+        except:
+            return 0
+    
+    def _search(self, query: str) -> Dict[str, Any]:
+        """Effettua ricerca con Serper (con cache persistente delle risposte)"""
+        try:
+            headers = {
+                "X-API-KEY": self.api_key,
+                "Content-Type": "application/json"
+            }
+            
+            payload = {
+                "q": query,
+                "gl": "it",
+                "hl": "it",
+                "num": 10
+            }
+            
+            cache = get_serper_cache()
+            
+            def fetch():
+                if cache:
+                    cached = cache.get(payload)
+                    if cached is not None:
+                        return cached
+                
+                # Ogni tentativo attende solo se il rate limit di Serper lo richiede;
+                # un eventuale duplicato hedged parte solo se c'è un token libero
+                transport = get_transport()
+                limiter = get_rate_limiter()
+                response = call_with_retry(
+                    lambda: transport.post(
+                        self.base_url, headers=headers, json=payload, timeout=30, hedge="serper:search",
+                        hedge_budget=lambda: limiter.try_acquire("serper", self.api_key) <= 0
+                    ),
+                    self.retry_policy, lambda: limiter.acquire("serper", self.api_key)
+                )
+                
+                data = response.json()
+                if cache:
+                    cache.set(payload, data)
+                return data
+            
+            # Ricerche identiche in corso condividono la stessa chiamata
+            flight_key = ("serper", self.api_key, SerperCache.request_key(payload))
+            return get_transport().single_flight.do(flight_key, fetch)
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            return {"error": f"Errore ricerca: {str(e)}"}
+    
+    def _extract_domain(self, url: str) -> str:
+        """Estrae dominio dall'URL"""
+        try:
+            parsed = urlparse(url)
+            domain = parsed.netloc
+            if domain.startswith('www.'):
+                domain = domain[4:]
+            return domain
+        except:
+            return ""
+
+class SimpleSEMRushAgent:
+    """Agente SEMRush semplificato"""
+    
+    def __init__(self, api_key: str, retry_policy: Optional[RetryPolicy] = None):
+        self.api_key = api_key
+        self.base_url = "https://api.semrush.com/"
+        self.retry_policy = retry_policy or RetryPolicy()
+    
+    def comprehensive_seo_analysis(self, domain: str) -> Dict[str, Any]:
+        """Analisi SEO completa"""
+        
+        if not domain:
+            return {"error": "Dominio non fornito"}
+        
+        analysis = {
+            "domain": domain,
+            "overview": {},
+            "keywords": {},
+            "backlinks": {}
+        }
+        
+        try:
+            # Domain overview
+            analysis["overview"] = self._get_domain_overview(domain)
+            
+            # Keywords analysis
+            analysis["keywords"] = self._get_keywords_analysis(domain)
+            
+            # Backlinks analysis
+            analysis["backlinks"] = self._get_backlinks_analysis(domain)
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            analysis["error"] = f"Errore analisi SEO: {str(e)}"
+        
+        return analysis
+    
+    def _request(self, params: Dict[str, Any]) -> Any:
+        """Richiesta SEMRush con cache dei report (stale-while-revalidate)"""
+        
+        def fetch():
+            transport = get_transport()
+            limiter = get_rate_limiter()
+            report = params.get("type", "")
+            response = call_with_retry(
+                lambda: transport.get(
+                    self.base_url, params=params, timeout=30, hedge=f"semrush:{report}",
+                    hedge_budget=lambda: limiter.try_acquire("semrush", self.api_key, report) <= 0
+                ),
+                self.retry_policy,
+                lambda: limiter.acquire("semrush", self.api_key, report)
+            )
+            return response.json()
+        
+        cache = get_semrush_cache()
+        if not cache:
+            return fetch()
+        
+        cached, state = cache.lookup(params)
+        if state == "stale":
+            cache.revalidate(params, fetch)
+        if state != "miss":
+            return cached
+        
+        data = fetch()
+        cache.store(params, data)
+        return data
+    
+    def _get_domain_overview(self, domain: str) -> Dict[str, Any]:
+        """Overview del dominio"""
+        params = {
+            "type": "domain_overview",
+            "key": self.api_key,
+            "domain": domain,
+            "database": "it",
+            "export_format": "json"
+        }
+        
+        try:
+            data = self._request(params)
+            
+            if isinstance(data, list) and len(data) > 0:
+                item = data[0]
+                return {
+                    "organic_keywords": item.get("Or", 0),
+                    "organic_traffic": item.get("Ot", 0),
+                    "organic_cost": item.get("Oc", 0),
+                    "adwords_keywords": item.get("Ad", 0)
+                }
+            
+            return {"error": "Nessun dato overview disponibile"}
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            return {"error": f"Errore overview: {str(e)}"}
+    
+    def _get_keywords_analysis(self, domain: str) -> Dict[str, Any]:
+        """Analisi keywords"""
+        params = {
+            "type": "domain_organic",
+            "key": self.api_key,
+            "domain": domain,
+            "database": "it",
+            "export_format": "json",
+            "display_limit": 20
+        }
+        
+        try:
+            data = self._request(params)
+            
+            if isinstance(data, list):
+                keywords = []
+                position_distribution = {"1-3": 0, "4-10": 0, "11-20": 0, "21+": 0}
+                
+                for item in data:
+                    if isinstance(item, dict):
+                        pos = item.get("Po", 0)
+                        keywords.append({
+                            "keyword": item.get("Ph", ""),
+                            "position": pos,
+                            "volume": item.get("Nq", 0)
+                        })
+                        
+                        if 1 <= pos <= 3:
+                            position_distribution["1-3"] += 1
+                        elif 4 <= pos <= 10:
+                            position_distribution["4-10"] += 1
+                        elif 11 <= pos <= 20:
+                            position_distribution["11-20"] += 1
+                        else:
+                            position_distribution["21+"] += 1
+                
+                return {
+                    "total_keywords": len(keywords),
+                    "position_distribution": position_distribution,
+                    "top_keywords": keywords[:10]
+                }
+            
+            return {"error": "Nessuna keyword trovata"}
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            return {"error": f"Errore keywords: {str(e)}"}
+    
+    def _get_backlinks_analysis(self, domain: str) -> Dict[str, Any]:
+        """Analisi backlinks"""
+        params = {
+            "type": "backlinks_overview",
+            "key": self.api_key,
+            "target": domain,
+            "target_type": "root_domain",
+            "export_format": "json"
+        }
+        
+        try:
+            data = self._request(params)
+            
+            if isinstance(data, dict):
+                return {
+                    "total_backlinks": data.get("backlinks_num", 0),
+                    "referring_domains": data.get("domains_num", 0),
+                    "authority_score": data.get("ascore", 0)
+                }
+            
+            return {"error": "Nessun dato backlinks disponibile"}
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            return {"error": f"Errore backlinks: {str(e)}"}
+
+_TEXT_LIST = {"type": "array", "items": {"type": "string"}}
+
+class OpenAIAnalyzer:
+    """Analyzer OpenAI per insights avanzati"""
+    
+    MODEL = "gpt-4"
+    SYSTEM_PROMPT = "Sei un consulente di business strategy. Rispondi sempre in JSON valido e in italiano."
+    
+    INSIGHTS_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "profilo_aziendale": {
+                "type": "object",
+                "properties": {
+                    **text_fields("settore", "posizionamento"),
+                    "punti_forza": _TEXT_LIST,
+                    "aree_miglioramento": _TEXT_LIST
+                }
+            },
+            "analisi_swot": {
+                "type": "object",
+                "properties": {key: _TEXT_LIST for key in ("strengths", "weaknesses", "opportunities", "threats")},
+                "required": ["strengths", "weaknesses", "opportunities", "threats"]
+            },
+            "raccomandazioni": {
+                "type": "object",
+                "properties": {key: _TEXT_LIST for key in ("immediate", "breve_termine", "lungo_termine")}
+            }
+        },
+        "required": ["profilo_aziendale", "analisi_swot", "raccomandazioni"]
+    }
+    
+    def __init__(self, api_key: str, context_token_budget: int = AppConfig.context_token_budget,
+                 timeout: int = AppConfig.openai_timeout):
+        self.api_key = api_key
+        self.client = get_openai_client(api_key)
+        self.context_token_budget = context_token_budget
+        self.timeout = timeout
+    
+    def generate_insights(self, all_data: Dict[str, Any],
+                          on_partial: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Genera insights AI basati su tutti i dati (on_partial riceve il JSON parziale in streaming)"""
+        
+        # Dati compattati per priorità entro il budget di token
+        context = build_analysis_context(all_data, self.context_token_budget)
+        
+        prompt = f"""
+        Analizza i seguenti dati aziendali e genera insights strutturati:
+        
+        {context}
+        
+        Genera un JSON con:
+        {{
+            "profilo_aziendale": {{
+                "settore": "settore identificato",
+                "posizionamento": "descrizione posizionamento",
+                "punti_forza": ["lista punti forza"],
+                "aree_miglioramento": ["lista aree da migliorare"]
+            }},
+            "analisi_swot": {{
+                "strengths": ["punti di forza"],
+                "weaknesses": ["punti di debolezza"], 
+                "opportunities": ["opportunità"],
+                "threats": ["minacce"]
+            }},
+            "raccomandazioni": {{
+                "immediate": ["azioni immediate"],
+                "breve_termine": ["azioni 3-6 mesi"],
+                "lungo_termine": ["azioni 12+ mesi"]
+            }}
+        }}
+        """
+        
+        return self._query_openai(prompt, on_partial, self.INSIGHTS_SCHEMA)
+    
+    def _query_openai(self, prompt: str,
+                      on_partial: Optional[Callable[[Any], None]] = None,
+                      schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Query OpenAI (le risposte a prompt identici vengono riusate dalla cache).
+        
+        Con on_partial la risposta arriva in streaming e on_partial riceve il
+        JSON ricomposto finora a ogni aggiornamento. Con schema la risposta viene
+        riparata e validata, con al più una richiesta di correzione.
+        """
+        from openai import APIStatusError  # Già caricato dal client in __init__
+        
+        try:
+            content = self._complete(self._params(prompt, self.SYSTEM_PROMPT, json_mode=schema is not None),
+                                     on_partial)
+            
+            if schema is None:
+                try:
+                    return json.loads(content)
+                except json.JSONDecodeError:
+                    return {"analysis": content}
+            
+            def fix_up(prompt: str, system_prompt: str) -> str:
+                return self._complete(self._params(prompt, system_prompt, temperature=0, json_mode=True))
+            
+            try:
+                return query_structured(fix_up, prompt, self.SYSTEM_PROMPT, schema, response=content)
+            except StructuredOutputError:
+                return {"analysis": content}
+                
+        except APIStatusError as e:
+            return {"error": f"OpenAI API error: {e.status_code}"}
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            return {"error": f"Errore OpenAI: {str(e)}"}
+    
+    def _params(self, prompt: str, system_prompt: str, temperature: float = 0.7,
+                json_mode: bool = False) -> Dict[str, Any]:
+        """Parametri della chat completion"""
+        params = {
+            "model": self.MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": 1500
+        }
+        if json_mode and supports_json_mode(self.MODEL):
+            params["response_format"] = {"type": "json_object"}
+        return params
+    
+    def _complete(self, params: Dict[str, Any],
+                  on_partial: Optional[Callable[[Any], None]] = None) -> str:
+        """Testo della risposta, dalla cache o da OpenAI (in streaming se c'è on_partial)"""
+        cache = get_completion_cache()
+        cache_key = cache.key(**params) if cache else None
+        content = cache.get(cache_key) if cache else None
+        
+        if content is None:
+            get_rate_limiter().acquire("openai", self.api_key, params["model"])
+            if on_partial:
+                content = self._stream_completion(params, partial_json_callback(on_partial))
+            else:
+                response = self.client.chat.completions.create(**params, timeout=deadline_timeout(self.timeout))
+                content = response.choices[0].message.content
+            if cache:
+                cache.set(cache_key, content)
+        
+        return content
+    
+    def _stream_completion(self, params: Dict[str, Any], on_token: Callable[[str], None]) -> str:
+        """Completion in streaming: on_token riceve ogni pezzo di testo, restituisce il testo completo"""
+        parts = []
+        stream = self.client.chat.completions.create(**params, stream=True,
+                                                     timeout=deadline_timeout(self.timeout))
+        
+        for chunk in stream:
+            check_deadline()
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+        
+        return "".join(parts)
+
+class ReportGenerator:
+    """Generatore report completo"""
+    
+    def __init__(self, openai_analyzer: OpenAIAnalyzer = None):
+        self.openai_analyzer = openai_analyzer
+    
+    # Sezioni nell'ordine del report: (chiave, stage di cui usano i dati, richiede insights AI)
+    SECTIONS = [
+        ("company_profile", ("company_research",), True),
+        ("financial_analysis", ("company_research",), False),
+        ("products_services", ("company_research",), False),
+        ("digital_presence", ("seo_analysis", "social_analysis"), False),
+        ("market_positioning", ("competitors_analysis",), True),
+        ("competitor_analysis", ("competitors_analysis",), False),
+        ("swot_analysis", (), True),
+        ("recommendations", (), True),
+        ("conclusions", ("competitors_analysis", "social_analysis", "seo_analysis"), False)
+    ]
+    
+    def generate_complete_report(self, company_data: Dict[str, Any], 
+                               all_analysis_data: Dict[str, Any]) -> str:
+        """Genera report completo"""
+        return self.assemble(self.iter_sections(company_data, all_analysis_data))
+    
+    # Intervallo minimo tra due aggiornamenti parziali delle sezioni AI
+    PARTIAL_INTERVAL = 0.5
+    
+    def iter_sections(self, company_data: Dict[str, Any], all_analysis_data: Dict[str, Any],
+                      skip: Iterable[str] = (), stream_ai: bool = False) -> Iterator[ReportSection]:
+        """Genera le sezioni man mano che sono pronte.
+        
+        Le sezioni basate solo sui dati escono subito, mentre gli insights AI
+        vengono calcolati in background; le sezioni AI seguono appena pronti.
+        Con stream_ai le sezioni AI vengono emesse anche in versione parziale
+        (partial=True) mentre la risposta arriva; l'ultima versione di ogni
+        sezione è quella definitiva.
+        """
+        skip = set(skip)
+        partials: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        on_partial = partials.put if stream_ai else None
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Genera insights AI se disponibile
+            insights = executor.submit(bind_deadline(self.openai_analyzer.generate_insights),
+                                       all_analysis_data, on_partial) \
+                if self.openai_analyzer else None
+            
+            if "header" not in skip:
+                yield self.header_section(company_data)
+            
+            for key, _, uses_ai in self.SECTIONS:
+                if not uses_ai and key not in skip:
+                    yield self.render_section(key, company_data, all_analysis_data)
+            
+            # Sezioni AI parziali, aggiornate al più ogni PARTIAL_INTERVAL secondi
+            while stream_ai and insights and not insights.done():
+                try:
+                    partial_insights = partials.get(timeout=self.PARTIAL_INTERVAL)
+                except queue.Empty:
+                    continue
+                while not partials.empty():
+                    partial_insights = partials.get_nowait()
+                
+                if isinstance(partial_insights, dict):
+                    for key, _, uses_ai in self.SECTIONS:
+                        if uses_ai and key not in skip:
+                            section = self.render_section(key, company_data, all_analysis_data, partial_insights)
+                            section.partial = True
+                            yield section
+                time.sleep(self.PARTIAL_INTERVAL)
+            
+            try:
+                ai_insights = insights.result() if insights else {}
+            except Exception as e:
+                # Es. scadenza esaurita: le sezioni AI escono senza insights invece di bloccare il report
+                logger.warning(f"Insights AI non disponibili: {e}")
+                ai_insights = {}
+            
+            for key, _, uses_ai in self.SECTIONS:
+                if uses_ai and key not in skip:
+                    yield self.render_section(key, company_data, all_analysis_data, ai_insights)
+    
+    def ready_sections(self, finished: Iterable[str]) -> List[str]:
+        """Sezioni senza AI i cui stage di dati sono tutti conclusi"""
+        finished = set(finished)
+        return [key for key, requires, uses_ai in self.SECTIONS
+                if not uses_ai and set(requires) <= finished]
+    
+    @staticmethod
+    def assemble(sections: Iterable[ReportSection]) -> str:
+        """Compone il report completo con le sezioni nel loro ordine (ultima versione di ciascuna)"""
+        latest = {section.key: section for section in sections}
+        return "".join(section.markdown for section in sorted(latest.values(), key=lambda s: s.order))
+    
+    def header_section(self, company_data: Dict[str, Any]) -> ReportSection:
+        """Intestazione del report"""
+        company_name = company_data.get("company_name", "Azienda")
+        analysis_date = datetime.now().strftime("%d/%m/%Y")
+        
+        return ReportSection("header", 0, f"""# REPORT ANALISI MARKETING COMPLETA
+## {company_name}
+
+**Data Analisi:** {analysis_date}
+**Generato da:** Marketing Analyzer Pro
+
+---
+
+""")
+    
+    def render_section(self, key: str, company_data: Dict[str, Any], all_analysis_data: Dict[str, Any],
+                       ai_insights: Optional[Dict[str, Any]] = None) -> ReportSection:
+        """Genera una singola sezione del report"""
+        ai_insights = ai_insights or {}
+        company_name = company_data.get("company_name", "Azienda")
+        
+        renderers = {
+            "company_profile": lambda: self._section_company_profile(company_data, all_analysis_data, ai_insights),
+            "financial_analysis": lambda: self._section_financial_analysis(all_analysis_data),
+            "products_services": lambda: self._section_products_services(all_analysis_data),
+            "digital_presence": lambda: self._section_digital_presence(all_analysis_data),
+            "market_positioning": lambda: self._section_market_positioning(all_analysis_data, ai_insights),
+            "competitor_analysis": lambda: self._section_competitor_analysis(all_analysis_data),
+            "swot_analysis": lambda: self._section_swot_analysis(ai_insights),
+            "recommendations": lambda: self._section_recommendations(ai_insights),
+            "conclusions": lambda: self._section_conclusions(company_name, all_analysis_data)
+        }
+        
+        order = 1 + [section[0] for section in self.SECTIONS].index(key)
+        return ReportSection(key, order, renderers[key]())
+    
+    def _section_company_profile(self, company_data: Dict[str, Any], 
+                                all_analysis_data: Dict[str, Any],
+                                ai_insights: Dict[str, Any]) -> str:
+        """Sezione profilo aziendale"""
+        
+        section = """
+## 1. PROFILO AZIENDALE
+
+"""
+        
+        # Informazioni base
+        section += f"**Nome Azienda:** {company_data.get('company_name', 'N/A')}\n"
+        
+        if company_data.get('vat_number'):
+            section += f"**P.IVA:** {company_data['vat_number']}\n"
+        
+        if company_data.get('website'):
+            section += f"**Sito Web:** {company_data['website']}\n"
+        
+        # Settore da AI
+        profilo_ai = ai_insights.get('profilo_aziendale', {})
+        if profilo_ai.get('settore'):
+            section += f"**Settore:** {profilo_ai['settore']}\n"
+        
+        # Knowledge Graph se disponibile
+        company_research = all_analysis_data.get("company_research", {})
+        company_info = company_research.get("company_info", {})
+        kg = company_info.get("knowledge_graph", {})
+        
+        if kg.get("description"):
+            section += f"\n### Descrizione\n{kg['description']}\n"
+        
+        # Posizionamento da AI
+        if profilo_ai.get('posizionamento'):
+            section += f"\n### Posizionamento di Mercato\n{profilo_ai['posizionamento']}\n"
+        
+        return section
+    
+    def _section_financial_analysis(self, all_analysis_data: Dict[str, Any]) -> str:
+        """Sezione analisi finanziaria"""
+        
+        section = """
+## 2. ANALISI FINANZIARIA
+
+"""
+        
+        # Cerca informazioni finanziarie nei risultati di ricerca
+        financial_data = all_analysis_data.get("company_research", {}).get("financial_data", {})
+        
+        if "organic" in financial_data:
+            section += "### Informazioni Finanziarie Disponibili\n"
+            
+            for result in financial_data["organic"][:3]:
+                title = result.get("title", "")
+                snippet = result.get("snippet", "")
+                
+                if any(word in snippet.lower() for word in ["fatturato", "bilancio", "dipendenti", "capitale"]):
+                    section += f"**{title}**\n"
+                    section += f"{snippet}\n\n"
+        
+        if section == """
+## 2. ANALISI FINANZIARIA
+
+""":
+            section += "Dati finanziari dettagliati non disponibili dalle fonti pubbliche analizzate.\n"
+        
+        return section
+    
+    def _section_products_services(self, all_analysis_data: Dict[str, Any]) -> str:
+        """Sezione prodotti e servizi"""
+        
+        section = """
+## 3. PRODOTTI E SERVIZI
+
+"""
+        
+        # Cerca informazioni sui prodotti
+        business_data = all_analysis_data.get("company_research", {}).get("business_info", {})
+        
+        if "organic" in business_data:
+            section += "### Prodotti e Servizi Principali\n"
+            
+            for result in business_data["organic"][:3]:
+                title = result.get("title", "")
+                snippet = result.get("snippet", "")
+                
+                if any(word in snippet.lower() for word in ["prodotti", "servizi", "offerta", "soluzioni"]):
+                    section += f"**{title}**\n"
+                    section += f"{snippet}\n\n"
+        
+        if section == """
+## 3. PRODOTTI E SERVIZI
+
+""":
+            section += "Informazioni dettagliate sui prodotti e servizi non disponibili dalle fonti analizzate.\n"
+        
+        return section
+    
+    def _section_digital_presence(self, all_analysis_data: Dict[str, Any]) -> str:
+        """Sezione presenza digitale"""
+        
+        section = """
+## 4. PRESENZA DIGITALE E SOCIAL MEDIA
+
+"""
+        
+        # Sito web
+        company_data = all_analysis_data.get("company_info", {})
+        if company_data.get("website"):
+            section += f"### Sito Web\n**URL Principale:** {company_data['website']}\n"
+        
+        # Performance SEO
+        seo_data = all_analysis_data.get("seo_analysis", {})
+        if seo_data and "error" not in seo_data:
+            section += "\n### Performance SEO\n"
+            
+            overview = seo_data.get("overview", {})
+            if overview and "error" not in overview:
+                section += f"**Keyword organiche:** {overview.get('organic_keywords', 0):,} posizionamenti\n"
+                section += f"**Traffico organico stimato:** {overview.get('organic_traffic', 0):,} visite/mese\n"
+                section += f"**Valore stimato del traffico:** €{overview.get('organic_cost', 0):,.0f}\n"
+            
+            backlinks = seo_data.get("backlinks", {})
+            if backlinks and "error" not in backlinks:
+                section += f"**Backlink:** {backlinks.get('total_backlinks', 0):,}\n"
+                section += f"**Domini referenti:** {backlinks.get('referring_domains', 0):,}\n"
+                section += f"**Authority Score:** {backlinks.get('authority_score', 0)}\n"
+        
+        # Presenza social
+        social_data = all_analysis_data.get("social_analysis", {})
+        if social_data:
+            section += "\n### Presenza sui Social Media\n"
+            
+            platforms_found = social_data.get("platforms_found", {})
+            social_metrics = social_data.get("social_metrics", {})
+            
+            for platform, platform_data in platforms_found.items():
+                section += f"\n**{platform.title()}** ({platform_data.get('url', 'N/A')})\n"
+                
+                metrics = social_metrics.get(platform, {})
+                if metrics:
+                    for metric_key, metric_value in metrics.items():
+                        if metric_value != "N/A":
+                            metric_label = metric_key.replace("_", " ").title()
+                            section += f"- {metric_label}: {metric_value}\n"
+            
+            # Engagement analysis
+            engagement = social_data.get("engagement_analysis", {})
+            if engagement:
+                section += f"\n### Analisi Engagement\n"
+                section += f"**Piattaforme attive:** {engagement.get('platforms_active', 0)}\n"
+                section += f"**Score presenza:** {engagement.get('presence_score', 0)}%\n"
+                section += f"**Follower totali stimati:** {engagement.get('total_followers_estimate', 0):,}\n"
+                section += f"**Maturità social:** {engagement.get('social_maturity', 'N/A')}\n"
+        
+        return section
+    
+    def _section_market_positioning(self, all_analysis_data: Dict[str, Any], ai_insights: Dict[str, Any]) -> str:
+        """Sezione mercato e posizionamento"""
+        
+        section = """
+## 5. MERCATO E POSIZIONAMENTO
+
+"""
+        
+        # Posizionamento da AI
+        profilo_ai = ai_insights.get('profilo_aziendale', {})
+        if profilo_ai.get('settore'):
+            section += f"### Mercato di Riferimento\n{profilo_ai['settore']}\n"
+        
+        if profilo_ai.get('posizionamento'):
+            section += f"\n### Posizionamento Competitivo\n{profilo_ai['posizionamento']}\n"
+        
+        # Competitor identificati
+        competitors_data = all_analysis_data.get("competitors_analysis", [])
+        if competitors_data:
+            section += f"\n### Concorrenti Diretti\n"
+            for i, comp in enumerate(competitors_data[:3], 1):
+                basic_info = comp.get("basic_info", {})
+                section += f"{i}. {basic_info.get('name', 'N/A')}\n"
+        
+        return section
+    
+    def _section_competitor_analysis(self, all_analysis_data: Dict[str, Any]) -> str:
+        """Sezione analisi competitor"""
+        
+        section = """
+## 6. ANALISI COMPETITOR
+
+"""
+        
+        competitors_data = all_analysis_data.get("competitors_analysis", [])
+        
+        if not competitors_data:
+            section += "Nessun competitor principale identificato nell'analisi.\n"
+            return section
+        
+        section += f"### Competitor Identificati ({len(competitors_data)})\n\n"
+        
+        for i, competitor in enumerate(competitors_data, 1):
+            basic_info = competitor.get("basic_info", {})
+            comp_name = basic_info.get("name", "N/A")
+            section += f"#### {i}. {comp_name}\n"
+            section += f"**Dominio:** {basic_info.get('domain', 'N/A')}\n"
+            section += f"**URL:** {basic_info.get('url', 'N/A')}\n"
+            section += f"**Descrizione:** {basic_info.get('description', 'N/A')}\n"
+            
+            # Analisi dettagliata se disponibile
+            detailed = competitor.get("detailed_research", {})
+            if detailed:
+                for search_key, search_data in detailed.items():
+                    if isinstance(search_data, dict) and "results" in search_data:
+                        results = search_data["results"]
+                        if "organic" in results and len(results["organic"]) > 0:
+                            first_result = results["organic"][0]
+                            snippet = first_result.get("snippet", "")
+                            if len(snippet) > 50:
+                                section += f"**Info Aggiuntive:** {snippet[:200]}...\n"
+                                break
+            
+            section += "\n"
+        
+        return section
+    
+    def _section_swot_analysis(self, ai_insights: Dict[str, Any]) -> str:
+        """Sezione analisi SWOT"""
+        
+        section = """
+## 7. ANALISI SWOT
+
+"""
+        
+        swot = ai_insights.get('analisi_swot', {})
+        profilo = ai_insights.get('profilo_aziendale', {})
+        
+        # Punti di forza
+        strengths = swot.get('strengths', []) or profilo.get('punti_forza', [])
+        if strengths:
+            section += "### Punti di Forza\n"
+            for punto in strengths:
+                section += f"- {punto}\n"
+        
+        # Punti di debolezza
+        weaknesses = swot.get('weaknesses', []) or profilo.get('aree_miglioramento', [])
+        if weaknesses:
+            section += "\n### Punti di Debolezza\n"
+            for punto in weaknesses:
+                section += f"- {punto}\n"
+        
+        # Opportunità
+        opportunities = swot.get('opportunities', [])
+        if opportunities:
+            section += "\n### Opportunità\n"
+            for opportunita in opportunities:
+                section += f"- {opportunita}\n"
+        
+        # Minacce
+        threats = swot.get('threats', [])
+        if threats:
+            section += "\n### Minacce\n"
+            for minaccia in threats:
+                section += f"- {minaccia}\n"
+        
+        if section == """
+## 7. ANALISI SWOT
+
+""":
+            section += "Analisi SWOT non disponibile. Configurare OpenAI API per insights avanzati.\n"
+        
+        return section
+    
+    def _section_recommendations(self, ai_insights: Dict[str, Any]) -> str:
+        """Sezione raccomandazioni"""
+        
+        section = """
+## 8. RACCOMANDAZIONI STRATEGICHE
+
+"""
+        
+        recommendations = ai_insights.get('raccomandazioni', {})
+        
+        # Azioni immediate
+        immediate = recommendations.get('immediate', [])
+        if immediate:
+            section += "### Priorità Immediate (0-3 mesi)\n"
+            for azione in immediate:
+                section += f"- {azione}\n"
+        
+        # Breve termine
+        breve_termine = recommendations.get('breve_termine', [])
+        if breve_termine:
+            section += "\n### Obiettivi Breve Termine (3-6 mesi)\n"
+            for obiettivo in breve_termine:
+                section += f"- {obiettivo}\n"
+        
+        # Lungo termine
+        lungo_termine = recommendations.get('lungo_termine', [])
+        if lungo_termine:
+            section += "\n### Visione Lungo Termine (12+ mesi)\n"
+            for visione in lungo_termine:
+                section += f"- {visione}\n"
+        
+        if section == """
+## 8. RACCOMANDAZIONI STRATEGICHE
+
+""":
+            section += """
+### Raccomandazioni Generali
+
+**Sviluppo Digitale:**
+- Migliorare la presenza SEO attraverso content marketing
+- Ottimizzare la strategia social media
+- Implementare analytics per tracciare le performance
+
+**Crescita Commerciale:**
+- Monitorare costantemente i competitor
+- Sviluppare partnerships strategiche
+- Investire in customer experience
+
+**Innovazione:**
+- Adottare nuove tecnologie di marketing
+- Automatizzare i processi dove possibile
+- Formare il team sulle best practice digitali
+"""
+        
+        return section
+    
+    def _section_conclusions(self, company_name: str, all_analysis_data: Dict[str, Any]) -> str:
+        """Sezione conclusioni"""
+        
+        section = """
+## 9. CONCLUSIONI
+
+"""
+        
+        # Analizza i dati per generare conclusioni
+        competitors_count = len(all_analysis_data.get("competitors_analysis", []))
+        social_platforms = len(all_analysis_data.get("social_analysis", {}).get("platforms_found", {}))
+        
+        seo_data = all_analysis_data.get("seo_analysis", {})
+        has_seo_data = seo_data and "error" not in seo_data
+        
+        section += f"{company_name} rappresenta "
+        
+        if has_seo_data:
+            organic_keywords = seo_data.get("overview", {}).get("organic_keywords", 0)
+            if organic_keywords > 1000:
+                section += "un'azienda con una solida presenza digitale, "
+            elif organic_keywords > 100:
+                section += "un'azienda in crescita nel panorama digitale, "
+            else:
+                section += "un'azienda con significative opportunità di crescita digitale, "
+        else:
+            section += "un'azienda "
+        
+        if competitors_count > 3:
+            section += "operante in un mercato competitivo. "
+        elif competitors_count > 1:
+            section += "con una concorrenza moderata nel suo settore. "
+        else:
+            section += "in un mercato di nicchia. "
+        
+        if social_platforms >= 3:
+            section += "L'azienda dimostra una buona maturità nella presenza social media."
+        elif social_platforms >= 1:
+            section += "La presenza social è presente ma può essere significativamente ampliata."
+        else:
+            section += "Esiste un importante potenziale di sviluppo nella presenza sui social media."
+        
+        section += "\n\n"
+        
+        # Raccomandazioni finali
+        section += "### Raccomandazioni Finali\n\n"
+        section += "Per massimizzare le opportunità di crescita:\n\n"
+        section += "1. **Investire nella presenza digitale** attraverso SEO e content marketing\n"
+        section += "2. **Sviluppare una strategia social integrata** per aumentare la visibilità\n"
+        section += "3. **Monitorare attivamente i competitor** per identificare opportunità\n"
+        section += "4. **Implementare metriche di performance** per misurare i progressi\n"
+        section += "5. **Considerare partnership** per accelerare la crescita\n\n"
+        
+        section += f"Con un approccio strategico e un'implementazione coerente, {company_name} può raggiungere una posizione di leadership nel proprio settore di riferimento.\n\n"
+        
+        section += "---\n"
+        section += f"*Report generato automaticamente da Marketing Analyzer Pro il {datetime.now().strftime('%d/%m/%Y alle %H:%M')}*\n"
+        section += "*Analisi basata su dati pubblici disponibili al momento della generazione*\n"
+        
+        return section
+
+class AdvancedMarketingAnalyzer:
+    """Analyzer principale che coordina tutte le analisi"""
+    
+    # Input da cui dipende ogni sezione dei risultati (fingerprint per la modalità refresh)
+    SECTION_INPUTS = {
+        "company_research": ("company_name", "domain"),
+        "competitors_analysis": ("company_name",),
+        "social_analysis": ("company_name",),
+        "seo_analysis": ("domain",)
+    }
+    
+    def __init__(self):
+        self.api_config = APIConfig()
+        self.app_config = AppConfig()
+        self.serper_agent = None
+        self.semrush_agent = None
+        self.openai_analyzer = None
+        self.report_generator = None
+        self._deadline: Optional[Deadline] = None
+    
+    def abort(self, reason: str = "Analisi interrotta dall'utente"):
+        """Interrompe l'analisi in corso: gli stage si fermano al prossimo controllo della scadenza"""
+        if self._deadline is not None:
+            self._deadline.cancel(reason)
+    
+    def setup_api_config(self, openai_key: str, semrush_key: str, serper_key: str):
+        """Setup delle API keys"""
+        self.api_config.openai_api_key = openai_key
+        self.api_config.semrush_api_key = semrush_key
+        self.api_config.serper_api_key = serper_key
+        
+        # Inizializza gli agenti disponibili, riusandoli se la chiave non è cambiata
+        # (Streamlit richiama questo metodo ad ogni rerun)
+        retry_policy = RetryPolicy(self.app_config.max_retries, self.app_config.retry_base_delay,
+                                   self.app_config.retry_max_delay)
+        if not serper_key:
+            self.serper_agent = None
+        elif not self.serper_agent or self.serper_agent.api_key != serper_key:
+            self.serper_agent = SimpleSerperAgent(serper_key, retry_policy)
+        
+        if not semrush_key:
+            self.semrush_agent = None
+        elif not self.semrush_agent or self.semrush_agent.api_key != semrush_key:
+            self.semrush_agent = SimpleSEMRushAgent(semrush_key, retry_policy)
+        
+        if not openai_key:
+            self.openai_analyzer = None
+        elif not self.openai_analyzer or self.openai_analyzer.api_key != openai_key:
+            self.openai_analyzer = OpenAIAnalyzer(openai_key, self.app_config.context_token_budget,
+                                                  self.app_config.openai_timeout)
+        
+        if not self.report_generator or self.report_generator.openai_analyzer is not self.openai_analyzer:
+            self.report_generator = ReportGenerator(self.openai_analyzer)
+    
+    def run_comprehensive_analysis(self, company_input: str,
+                                   on_progress: Optional[ProgressCallback] = None,
+                                   deadline: Optional[Deadline] = None,
+                                   previous: Optional[Dict[str, Any]] = None,
+                                   refresh: Iterable[str] = ()) -> Dict[str, Any]:
+        """Esegue l'analisi completa, notificando l'avanzamento a on_progress.
+        
+        L'analisi ha a disposizione app_config.analysis_deadline secondi (o la
+        deadline indicata); esaurito il tempo, o chiamato abort(), si conclude con
+        i risultati parziali disponibili.
+        
+        Modalità refresh: con previous (risultati di un'analisi precedente) vengono
+        ricalcolate solo le sezioni scadute (section_max_age), con input diversi o
+        indicate in refresh; quelle scadute o indicate vengono richieste di nuovo
+        alle API senza leggere le risposte in cache. Le altre sezioni, e il report
+        se nessuna è cambiata, vengono riusate.
+        
+        Le analisi complete vengono salvate nell'archivio locale
+        (results["analysis_id"]); quelle parziali (results["incomplete"]: stage
+        falliti, tempo esaurito o abort()) no, così non diventano l'analisi
+        precedente riusata dalla modalità refresh.
+        """
+        deadline = deadline or Deadline(self.app_config.analysis_deadline)
+        self._deadline = deadline
+        try:
+            with use_deadline(deadline):
+                results = self._run_analysis(company_input, on_progress, deadline, previous, set(refresh))
+        finally:
+            # Ferma i lavori ancora in corso (stage abbandonati, UI chiusa durante l'analisi)
+            deadline.cancel("Analisi conclusa")
+        
+        self._save_analysis(results, company_input)
+        return results
+    
+    def previous_analysis(self, company_input: str) -> Optional[Dict[str, Any]]:
+        """Ultima analisi salvata della stessa azienda (per P.IVA, dominio o nome), se presente"""
+        store = get_analysis_store(self.app_config)
+        if not store:
+            return None
+        is_valid, input_type, company_data = resolve_company_input(company_input, self.app_config)
+        if not is_valid:
+            return None
+        # Il nome identifica l'azienda se digitato o già risolto, non se ricavato da dominio o P.IVA
+        known_name = input_type == "name" or "entity_key" in company_data
+        try:
+            return store.latest(
+                vat=company_data.get("vat_number", ""),
+                domain=company_data.get("domain", ""),
+                name=company_data.get("company_name", "") if known_name else ""
+            )
+        except Exception as e:
+            logger.warning(f"Archivio analisi non disponibile: {str(e)}")
+            return None
+    
+    def _save_analysis(self, results: Dict[str, Any], company_input: str):
+        """Salva l'analisi nell'archivio locale; un errore dell'archivio non invalida l'analisi"""
+        store = get_analysis_store(self.app_config)
+        if not store or "error" in results or results.get("incomplete"):
+            return
+        try:
+            results["analysis_id"] = store.save(results, company_input)
+        except Exception as e:
+            logger.warning(f"Salvataggio analisi non riuscito: {str(e)}")
+    
+    def _run_analysis(self, company_input: str, on_progress: Optional[ProgressCallback],
+                      deadline: Deadline, previous: Optional[Dict[str, Any]] = None,
+                      refresh: Optional[set] = None) -> Dict[str, Any]:
+        notify = on_progress or log_progress
+        
+        def emit(kind: str, message: str, progress: Optional[int] = None):
+            notify(ProgressEvent(kind, message, progress))
+        
+        # Valida input e lo risolve sull'azienda canonica, se già nota
+        is_valid, input_type, company_data = resolve_company_input(company_input, self.app_config)
+        
+        if not is_valid:
+            return {"error": "Input non valido"}
+        
+        emit("info", f"🎯 Tipo input riconosciuto: **{input_type.upper()}**")
+        
+        # Inizializza risultati
+        results = {
+            "company_info": company_data,
+            "input_type": input_type,
+            "analysis_timestamp": datetime.now().isoformat(),
+            "analysis_status": {}
+        }
+        
+        company_name = company_data.get("company_name", "")
+        domain = company_data.get("domain", "") or InputValidator.extract_domain(company_data.get("website", ""))
+        
+        # Grafo degli stage: quelli senza dipendenze reciproche girano in parallelo
+        stages = []
+        
+        if self.serper_agent:
+            serper = self.serper_agent
+            stages += [
+                Stage("company_research", lambda _: serper.deep_company_research(company_name, domain),
+                      label="🔍 Ricerca approfondita azienda"),
+                Stage("competitors", lambda _: serper.research_competitors(company_name),
+                      label="🎯 Ricerca competitor"),
+                Stage("competitors_analysis",
+                      lambda inputs: serper.analyze_competitors_details(inputs["competitors"][:3],
+                                                                        self.app_config.competitor_workers),
+                      depends_on=("competitors",), label="🔍 Analisi dettagliata competitor"),
+                Stage("social_analysis", lambda _: serper.comprehensive_social_analysis(company_name),
+                      label="📱 Analisi social media")
+            ]
+        else:
+            results["analysis_status"]["company_research"] = "❌ Serper non disponibile"
+            results["analysis_status"]["competitors_analysis"] = "❌ Serper non disponibile"
+            results["analysis_status"]["social_analysis"] = "❌ Social analyzer non disponibile"
+        
+        if self.semrush_agent and domain:
+            semrush = self.semrush_agent
+            stages.append(Stage("seo_analysis", lambda _: semrush.comprehensive_seo_analysis(domain),
+                                label="📊 Analisi SEO con SEMRush"))
+        else:
+            results["analysis_status"]["seo_analysis"] = "⚠️ SEMRush non disponibile"
+            if not domain:
+                emit("warning", "⚠️ Dominio non identificato per analisi SEO")
+            else:
+                emit("warning", "⚠️ SEMRush API non configurata")
+        
+        # Modalità refresh: le sezioni ancora valide dell'analisi precedente vengono riusate
+        section_inputs = {"company_name": company_name, "domain": domain}
+        fingerprints = {section: fingerprint({key: section_inputs[key] for key in keys})
+                        for section, keys in self.SECTION_INPUTS.items()}
+        refresh = refresh or set()
+        reused = reusable_sections(previous, fingerprints, self.app_config.section_max_age, refresh)
+        reused &= {stage.name for stage in stages}
+        
+        for name in sorted(reused):
+            entry = previous[FRESHNESS_KEY][name]
+            results[name] = previous[name]
+            results.setdefault(FRESHNESS_KEY, {})[name] = entry
+            results["analysis_status"][name] = f"♻️ Dati del {_format_timestamp(entry['fetched_at'])}"
+        if reused:
+            emit("info", f"♻️ Sezioni ancora valide riusate: {', '.join(sorted(reused))}")
+        
+        # "competitors" è un dato intermedio: si ricalcola solo insieme all'analisi dettagliata
+        stages = [stage for stage in stages if stage.name not in reused
+                  and not (stage.name == "competitors" and "competitors_analysis" in reused)]
+        # Le sezioni scadute o richieste della stessa azienda vanno chieste di nuovo alle API
+        previous_fingerprints = {name: entry.get("fingerprint")
+                                 for name, entry in (previous or {}).get(FRESHNESS_KEY, {}).items()}
+        outdated = {name for name, value in fingerprints.items() if previous_fingerprints.get(name) == value}
+        if "competitors_analysis" in outdated:
+            outdated.add("competitors")
+        stages = [replace(stage, func=_without_response_cache(stage.func)) if stage.name in outdated else stage
+                  for stage in stages]
+        
+        # Le sezioni del report vengono emesse appena i dati che usano sono pronti
+        report = self.report_generator
+        scheduled = {stage.name for stage in stages}
+        sections: Dict[str, ReportSection] = {}
+        
+        def emit_section(section: ReportSection):
+            sections[section.key] = section
+            notify(ProgressEvent("section", section.key, section=section))
+        
+        def emit_ready_sections():
+            # Gli stage non in programma (API non configurate) non arriveranno mai: contano come conclusi
+            required = {name for _, requires, _ in report.SECTIONS for name in requires}
+            finished = set(completed) | (required - scheduled)
+            for key in report.ready_sections(finished):
+                if key not in sections:
+                    emit_section(report.render_section(key, company_data, results))
+        
+        running = {}
+        completed = []
+        failed = set()
+        
+        def on_stage_start(stage: Stage):
+            running[stage.name] = stage.label
+            emit("status", "⏳ In corso: " + " · ".join(running.values()))
+        
+        def on_stage_done(stage: Stage, result: StageResult):
+            running.pop(stage.name, None)
+            completed.append(stage.name)
+            progress = int(len(completed) / (len(stages) + 1) * 100)  # +1: generazione report
+            if running:
+                emit("status", "⏳ In corso: " + " · ".join(running.values()), progress)
+            else:
+                emit("status", f"✅ {stage.label}", progress)
+            
+            status_key = stage.name
+            if stage.name == "competitors" and result.ok:
+                return  # Dato intermedio, usato solo dall'analisi dettagliata
+            if not result.ok:
+                failed.add(stage.name)
+                results["analysis_status"][status_key] = f"❌ {result.error}"
+                emit("error", f"❌ {stage.label}: {result.error}")
+                emit_ready_sections()
+                return
+            
+            results[stage.name] = result.value
+            # Le sezioni con ricerche fallite non sono "fresche": alla prossima analisi si ricalcolano
+            if stage.name in fingerprints and not has_errors(result.value):
+                stamp(results, stage.name, fingerprints[stage.name])
+            elapsed = f"({result.duration:.1f}s)"
+            
+            if stage.name == "competitors_analysis":
+                results["analysis_status"][status_key] = f"✅ Analizzati {len(result.value)} competitor"
+                emit("success", f"✅ Analisi competitor completata ({len(result.value)} competitor) {elapsed}")
+            elif stage.name == "social_analysis":
+                platforms_found = len(result.value.get("platforms_found", {}))
+                results["analysis_status"][status_key] = f"✅ Trovate {platforms_found} piattaforme"
+                emit("success", f"✅ Analisi social completata ({platforms_found} piattaforme) {elapsed}")
+            else:
+                results["analysis_status"][status_key] = "✅ Completata"
+                name = "Ricerca azienda" if stage.name == "company_research" else "Analisi SEO"
+                emit("success", f"✅ {name} completata {elapsed}")
+            
+            emit_ready_sections()
+        
+        try:
+            emit_section(report.header_section(company_data))
+            emit_ready_sections()
+            
+            pipeline_run = StagePipeline(stages).run(on_stage_start, on_stage_done, deadline,
+                                                     self.app_config.stage_budgets)
+            results["stage_timings"] = pipeline_run.timings()
+            if deadline.expired:
+                reason = deadline.root_reason() if deadline.cancelled else "tempo a disposizione esaurito"
+                results["analysis_status"]["deadline"] = f"⚠️ Risultati parziali: {reason}"
+                emit("warning", f"⚠️ Analisi conclusa con risultati parziali ({reason})")
+            
+            # Il report dipende dai dati di tutte le sezioni: si riusa solo se nessuna è cambiata
+            report_fingerprint = fingerprint({
+                "company_info": company_data,
+                "sections": {name: entry for name, entry in results.get(FRESHNESS_KEY, {}).items()
+                             if name in fingerprints}
+            })
+            report_start = time.time()
+            if (previous and "comprehensive_report" not in refresh
+                    and "comprehensive_report" in reusable_sections(
+                        previous, {"comprehensive_report": report_fingerprint}, {})):
+                results["comprehensive_report"] = previous["comprehensive_report"]
+                results.setdefault(FRESHNESS_KEY, {})["comprehensive_report"] = previous[FRESHNESS_KEY]["comprehensive_report"]
+                results["analysis_status"]["report_generation"] = "♻️ Report invariato"
+            else:
+                # Sezioni rimanenti: quelle AI, appena gli insights sono pronti
+                emit("status", "📋 Generazione report completo...")
+                try:
+                    for section in report.iter_sections(company_data, results, skip=set(sections), stream_ai=True):
+                        emit_section(section)
+                    results["comprehensive_report"] = report.assemble(sections.values())
+                    results["analysis_status"]["report_generation"] = "✅ Report generato"
+                    stamp(results, "comprehensive_report", report_fingerprint)
+                except Exception as e:
+                    results["analysis_status"]["report_generation"] = f"❌ {str(e)}"
+                    emit("error", f"❌ Generazione report: {str(e)}")
+            results["stage_timings"]["comprehensive_report"] = round(time.time() - report_start, 2)
+            
+            # Sezioni mancanti o in errore (stage falliti, scadenza, interruzione): l'analisi è parziale
+            incomplete = (({stage.name for stage in stages} - set(completed)) | failed
+                          | {name for name in fingerprints
+                             if isinstance(results.get(name), dict) and "error" in results[name]})
+            if "comprehensive_report" not in results:
+                incomplete.add("comprehensive_report")
+            if incomplete:
+                results["incomplete"] = sorted(incomplete)
+            
+            total = pipeline_run.total_duration + results["stage_timings"]["comprehensive_report"]
+            emit("status", f"✅ Analisi completa terminata in {total:.1f}s!", 100)
+            emit("success", "🎉 Analisi completa terminata con successo!")
+            
+            return results
+            
+        except Exception as e:
+            emit("error", f"Errore durante l'analisi: {str(e)}")
+            results["error"] = str(e)
+            return results
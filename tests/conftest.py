@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from utils import analysis_store, cache, competitor_kb, entities, http_client, rate_limit  # noqa: E402
+
+SINGLETONS = [
+    (analysis_store, "_store"),
+    (cache, "_serper_cache"),
+    (cache, "_semrush_cache"),
+    (cache, "_completion_cache"),
+    (competitor_kb, "_kb"),
+    (entities, "_resolver"),
+    (http_client, "_transport"),
+    (rate_limit, "_rate_limiter"),
+]
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Cache, archivi e singleton di processo nuovi per ogni test, in una cartella temporanea"""
+    monkeypatch.chdir(tmp_path)
+    for module, name in SINGLETONS:
+        monkeypatch.setattr(module, name, None)
+    yield tmp_path
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    from config import AppConfig
+    return AppConfig(
+        cache_dir=str(tmp_path / "cache"),
+        analysis_store_path=str(tmp_path / "analyses.sqlite3"),
+        competitor_kb_path=str(tmp_path / "competitors.sqlite3"),
+        entity_store_path=str(tmp_path / "entities.sqlite3"),
+    )
+
+
+@pytest.fixture
+def api_config():
+    from config import APIConfig
+    return APIConfig("sk-test", "semrush-test", "serper-test")
@@ -0,0 +1,44 @@
+"""Doppi di test per OpenAI e per le risposte HTTP"""
+
+from types import SimpleNamespace
+
+
+class FakeCompletions:
+    """chat.completions con risposte predefinite; registra i parametri di ogni chiamata"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def create(self, **params):
+        self.calls.append(params)
+        content = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if params.get("stream"):
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + 5]))])
+                         for i in range(0, len(content), 5)])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def fake_openai(*replies):
+    completions = FakeCompletions(*replies)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions)), completions
+
+
+class FakeResponse:
+    def __init__(self, data=None, status_code=200):
+        self._data = data if data is not None else {}
+        self.status_code = status_code
+        self.headers = {}
+        self.content = b""
+        self.text = ""
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+    def close(self):
+        pass
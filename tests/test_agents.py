@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+from agents.agents import BaseAgent, run_sync
+from utils.deadline import Deadline, current_deadline, use_deadline
+
+
+class EchoAgent(BaseAgent):
+    async def analyze_async(self, company_data):
+        await asyncio.sleep(0)
+        return dict(company_data, deadline=current_deadline())
+
+
+def test_run_sync_inside_a_running_event_loop():
+    async def answer():
+        await asyncio.sleep(0)
+        return 42
+
+    async def caller():
+        return run_sync(answer())
+
+    assert run_sync(answer()) == 42
+    assert asyncio.run(caller()) == 42
+
+
+def test_sync_wrapper_keeps_the_current_deadline(api_config, app_config):
+    agent = EchoAgent(api_config, app_config)
+    deadline = Deadline(30)
+
+    async def from_loop():
+        return agent.analyze({"company_name": "Acme"})
+
+    with use_deadline(deadline):
+        assert agent.analyze({"company_name": "Acme"})["deadline"] is deadline
+        assert asyncio.run(from_loop())["deadline"] is deadline
+
+
+def test_requests_are_bounded_by_max_concurrency(api_config, app_config, monkeypatch):
+    app_config.max_concurrency = 2
+    agent = EchoAgent(api_config, app_config)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def slow_request(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    monkeypatch.setattr(agent, "make_request", slow_request)
+
+    async def fan_out():
+        await asyncio.gather(*(agent.make_request_async(f"https://example.it/{i}") for i in range(6)))
+
+    asyncio.run(fan_out())
+    assert peak[0] == 2
@@ -0,0 +1,56 @@
+import pytest
+
+from utils.analysis_store import AnalysisStore, company_identity
+
+VAT = "04427770278"
+
+
+def results(name="Acme S.r.l.", website="https://www.acme.it", vat=f"IT{VAT}", report="# Report", **extra):
+    return {"company_info": {"company_name": name, "website": website, "vat_number": vat},
+            "input_type": "name", "comprehensive_report": report, **extra}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AnalysisStore(str(tmp_path / "analyses.sqlite3"))
+
+
+def test_identity_is_normalised():
+    assert company_identity(results()) == {"vat": VAT, "domain": "acme.it", "name": "acme"}
+    assert company_identity(dict(results(), input_type="vat"))["name"] == ""
+
+
+def test_latest_analysis_by_vat_domain_or_name(store, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("utils.analysis_store.time.time", lambda: now[0])
+    old = store.save(results(report="# Vecchio"), "Acme")
+    now[0] += 60
+    new = store.save(results(report="# Nuovo"), "acme.it")
+    store.save(results(name="Rivale", website="https://rivale.it", vat=""), "Rivale")
+
+    assert store.latest(vat=VAT)["comprehensive_report"] == "# Nuovo"
+    assert store.lookup("https://acme.it/contatti")["comprehensive_report"] == "# Nuovo"
+    assert store.lookup("ACME srl")["comprehensive_report"] == "# Nuovo"
+    assert store.lookup("acme.it", max_age=30)["comprehensive_report"] == "# Nuovo"
+    now[0] += 60
+    assert store.lookup("acme.it", max_age=30) is None
+    assert store.get(old)["comprehensive_report"] == "# Vecchio"
+
+    store.delete(new)
+    assert store.latest(domain="acme.it")["comprehensive_report"] == "# Vecchio"
+
+
+def test_history_lists_summaries_newest_first(store):
+    store.save(results(), "Acme")
+    store.save(results(name="Rivale", website="https://rivale.it", vat="", report=""), "Rivale")
+
+    history = store.history()
+    assert [entry["company_name"] for entry in history] == ["Rivale", "Acme S.r.l."]
+    assert [entry["has_report"] for entry in history] == [False, True]
+    assert "results" not in history[0]
+    assert [entry["company_name"] for entry in store.history(name="riv")] == ["Rivale"]
+
+
+def test_store_survives_restart(tmp_path):
+    analysis_id = AnalysisStore(str(tmp_path / "analyses.sqlite3")).save(results(), "Acme")
+    assert AnalysisStore(str(tmp_path / "analyses.sqlite3")).get(analysis_id)["company_info"]["vat_number"] == f"IT{VAT}"
@@ -0,0 +1,93 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import batch
+
+
+@pytest.fixture
+def thread_workers(monkeypatch):
+    """Worker in thread al posto dei processi, senza creare gli agenti"""
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(batch, "_init_worker", lambda *args: None)
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_company_id_ignores_case_and_spacing():
+    assert batch.company_id("  Acme   SRL ") == batch.company_id("acme srl")
+
+
+def test_read_inputs_detects_column(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("id,azienda\n1,Acme Srl\n2,\n3,https://rivale.it\n", encoding="utf-8")
+    assert list(batch.read_inputs(str(path))) == ["Acme Srl", "https://rivale.it"]
+
+
+def test_failed_companies_are_retried_on_resume(tmp_path, monkeypatch, thread_workers, api_config, app_config):
+    attempts = []
+
+    def flaky(company_input, input_type):
+        attempts.append(company_input)
+        record = {"id": batch.company_id(company_input), "input": company_input, "input_type": input_type}
+        if company_input == "Rivale" and attempts.count("Rivale") == 1:
+            return dict(record, status="error", error="Connection reset")
+        return dict(record, status="ok", results={"input_type": input_type})
+
+    monkeypatch.setattr(batch, "_process_company", flaky)
+    output, checkpoints = str(tmp_path / "out.jsonl"), str(tmp_path / "ckpt")
+
+    assert batch.run_batch(["Acme", "Rivale"], output, checkpoints, 2, api_config, app_config) == (2, 1)
+    assert batch.run_batch(["Acme", "Rivale"], output, checkpoints, 2, api_config, app_config) == (1, 0)
+    assert batch.run_batch(["Acme", "Rivale"], output, checkpoints, 2, api_config, app_config) == (0, 0)
+
+    assert sorted(attempts) == ["Acme", "Rivale", "Rivale"]
+    assert [r["status"] for r in read_records(output) if r["input"] == "Rivale"] == ["error", "ok"]
+    assert batch.CheckpointStore(checkpoints).failed_ids() == set()
+
+
+def test_partial_records_are_not_stored(tmp_path, monkeypatch, thread_workers, api_config, app_config):
+    from utils.analysis_store import get_analysis_store
+
+    def partial(company_input, input_type):
+        return {"id": batch.company_id(company_input), "input": company_input, "input_type": input_type,
+                "status": "partial", "results": {"incomplete": ["seo_analysis"]}}
+
+    monkeypatch.setattr(batch, "_process_company", partial)
+    batch.run_batch(["Acme"], str(tmp_path / "out.jsonl"), str(tmp_path / "ckpt"), 1, api_config, app_config)
+
+    assert get_analysis_store(app_config).history() == []
+    assert batch.CheckpointStore(str(tmp_path / "ckpt")).failed_ids() == {batch.company_id("Acme")}
+
+
+class FakeAnalyzer:
+    """Motore di core con risultati predefiniti per input"""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def run_comprehensive_analysis(self, company_input, on_progress=None, **kwargs):
+        self.calls.append(company_input)
+        on_progress({"stage": "company_analysis"})
+        return self.results[company_input]
+
+
+@pytest.mark.parametrize("results, status", [
+    ({"comprehensive_report": "# Report"}, "ok"),
+    ({"comprehensive_report": "# Report", "incomplete": ["seo_analysis"]}, "partial"),
+    ({"error": "Input non valido"}, "error"),
+])
+def test_worker_runs_the_core_engine(monkeypatch, results, status):
+    analyzer = FakeAnalyzer({"Acme": results})
+    monkeypatch.setitem(batch._worker_state, "analyzer", analyzer)
+
+    record = batch._process_company("Acme", "company_name")
+
+    assert analyzer.calls == ["Acme"]
+    assert record["status"] == status
+    assert record["results"] == results
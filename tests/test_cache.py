@@ -0,0 +1,172 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import agents.agents as agents_module
+from agents.agents import BaseAgent
+from utils.cache import CompletionCache, PersistentCache, SemrushCache, SerperCache, get_completion_cache
+from utils.structured_output import supports_json_mode
+
+from fakes import fake_openai
+
+
+class EchoAgent(BaseAgent):
+    async def analyze_async(self, company_data):
+        return company_data
+
+
+SCHEMA = {"type": "object", "properties": {"company_name": {"type": "string"}}, "required": ["company_name"]}
+
+
+def test_completion_key_includes_response_format():
+    params = {"model": "gpt-4o", "messages": [{"role": "user", "content": "x"}],
+              "temperature": 0, "max_tokens": 10}
+    plain = CompletionCache.key(**params)
+    json_mode = CompletionCache.key(**params, response_format={"type": "json_object"})
+    assert plain != json_mode
+    assert plain == CompletionCache.key(**params, response_format=None)
+
+
+def test_json_mode_model_goes_through_cache(monkeypatch, api_config, app_config):
+    monkeypatch.setattr(agents_module, "OPENAI_MODEL", "gpt-4o")
+    assert supports_json_mode("gpt-4o")
+    agent = EchoAgent(api_config, app_config)
+    agent.client, completions = fake_openai('{"company_name": "Acme"}')
+
+    first = agent.query_structured("Chi è?", "Sistema", SCHEMA)
+    second = agent.query_structured("Chi è?", "Sistema", SCHEMA)
+
+    assert first == second == {"company_name": "Acme"}
+    assert len(completions.calls) == 1
+    assert completions.calls[0]["response_format"] == {"type": "json_object"}
+    assert get_completion_cache(app_config).stats()["entries"] >= 1
+
+
+def test_async_completions_use_the_cache_off_the_event_loop(monkeypatch, api_config, app_config):
+    agent = EchoAgent(api_config, app_config)
+    cache = get_completion_cache(app_config)
+    threads = []
+    for name in ("get", "set"):
+        method = getattr(cache, name)
+        monkeypatch.setattr(cache, name, lambda *args, method=method: threads.append(threading.get_ident())
+                            or method(*args))
+
+    async def create(**params):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Risposta"))])
+
+    monkeypatch.setattr(EchoAgent, "async_client", SimpleNamespace(chat=SimpleNamespace(
+        completions=SimpleNamespace(create=create))))
+    params = agent._completion_params("Chi è?", "Sistema", True)
+
+    async def complete_twice():
+        return [await agent._complete_async(params) for _ in range(2)], threading.get_ident()
+
+    answers, loop_thread = asyncio.run(complete_twice())
+
+    assert answers == ["Risposta", "Risposta"]
+    assert len(threads) == 3 and loop_thread not in threads
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("utils.cache.time.time", lambda: now[0])
+    return now
+
+
+def test_persistent_cache_expires_entries(tmp_path, clock):
+    cache = PersistentCache(str(tmp_path / "cache.sqlite3"), "test")
+    cache.set("k", {"v": 1}, ttl=60)
+
+    clock[0] += 59
+    assert cache.get("k") == {"v": 1}
+    clock[0] += 2
+    assert cache.get("k") is None
+
+
+def test_persistent_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = PersistentCache(str(tmp_path / "cache.sqlite3"), "test", max_entries=2)
+    for key in ("a", "b"):
+        cache.set(key, key, ttl=60)
+        clock[0] += 1
+    cache.get("a")
+    clock[0] += 1
+    cache.set("c", "c", ttl=60)
+
+    assert [cache.get(key) for key in ("a", "b", "c")] == ["a", None, "c"]
+
+
+def test_persistent_cache_survives_restart(tmp_path):
+    PersistentCache(str(tmp_path / "cache.sqlite3"), "test").set("k", [1, 2], ttl=60)
+    assert PersistentCache(str(tmp_path / "cache.sqlite3"), "test").get("k") == [1, 2]
+    assert PersistentCache(str(tmp_path / "cache.sqlite3"), "altro").get("k") is None
+
+
+def test_serper_cache_normalizes_queries_and_skips_errors(tmp_path):
+    cache = SerperCache(PersistentCache(str(tmp_path / "cache.sqlite3"), "serper"), {"default": 60})
+    cache.set({"q": "Acme  SRL", "gl": "it"}, {"organic": []})
+    cache.set({"q": "Rivale", "gl": "it"}, {"error": "quota"})
+
+    assert cache.get({"q": "acme srl", "gl": "it"}) == {"organic": []}
+    assert cache.get({"q": "acme srl", "gl": "fr"}) is None
+    assert cache.get({"q": "Rivale", "gl": "it"}) is None
+
+
+@pytest.mark.parametrize("query, family", [
+    ("Acme site:linkedin.com", "social"),
+    ("Acme partita iva", "registry"),
+    ("Acme fatturato 2023", "financial"),
+    ("concorrenti di Acme", "competitors"),
+    ("Acme Srl", "default"),
+])
+def test_serper_query_families(query, family):
+    assert SerperCache.query_family(query) == family
+
+
+def test_semrush_cache_serves_stale_reports_while_refreshing(tmp_path, clock):
+    cache = SemrushCache(PersistentCache(str(tmp_path / "cache.sqlite3"), "semrush"),
+                         {"domain_ranks": 60, "default": 10}, stale_ttl=600)
+    params = {"type": "domain_ranks", "domain": "Acme.it", "database": "it", "key": "segreta"}
+    cache.store(params, [{"Rk": 1}])
+
+    assert cache.lookup(dict(params, domain="acme.it", key="altra")) == ([{"Rk": 1}], "fresh")
+    clock[0] += 120
+    assert cache.lookup(params) == ([{"Rk": 1}], "stale")
+
+    fetches, release = [], threading.Event()
+
+    def fetch():
+        fetches.append(1)
+        release.wait(5)
+        return [{"Rk": 2}]
+
+    cache.revalidate(params, fetch)
+    cache.revalidate(params, fetch)  # Aggiornamento già in corso
+    release.set()
+    cache._executor.shutdown(wait=True)
+
+    assert len(fetches) == 1
+    assert cache.lookup(params) == ([{"Rk": 2}], "fresh")
+    clock[0] += 1000
+    assert cache.lookup(params) == (None, "miss")
+
+
+def test_identical_prompts_reuse_the_cached_completion(api_config, app_config):
+    agent = EchoAgent(api_config, app_config)
+    agent.client, completions = fake_openai("Risposta A", "Risposta B")
+
+    assert agent.query_openai("Analizza Acme", "Sistema") == "Risposta A"
+    assert agent.query_openai("Analizza Acme", "Sistema") == "Risposta A"
+    assert agent.query_openai("Analizza Acme", "Altro sistema") == "Risposta B"
+    assert len(completions.calls) == 2
+
+
+def test_empty_completions_are_not_cached(api_config, app_config):
+    agent = EchoAgent(api_config, app_config)
+    agent.client, completions = fake_openai("")
+
+    assert agent.query_openai("Analizza Acme") == ""
+    agent.query_openai("Analizza Acme")
+    assert len(completions.calls) == 2
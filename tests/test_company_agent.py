@@ -0,0 +1,79 @@
+import asyncio
+
+from agents.company_agent import CompanyAgent
+from utils.entities import get_entity_resolver, resolve_company_input
+
+VAT = "04427770278"
+
+
+def test_confident_registry_data_links_searched_name(api_config, app_config):
+    agent = CompanyAgent(api_config, app_config)
+    agent._link_entity({"company_name": "Venezianico"},
+                       {"company_name": "Venezianico Orologi S.r.l.", "vat_number": f"IT{VAT}",
+                        "website": "https://www.venezianico.com", "confidence_score": 0.8})
+
+    _, _, data = resolve_company_input("venezianico", app_config)
+    assert data["company_name"] == "Venezianico Orologi S.r.l."
+    assert data["vat_number"] == VAT
+    assert data["domain"] == "venezianico.com"
+
+
+def test_low_confidence_or_invalid_vat_is_not_linked(api_config, app_config):
+    agent = CompanyAgent(api_config, app_config)
+    agent._link_entity({"company_name": "Bassa"}, {"company_name": "Bassa", "vat_number": VAT,
+                                                   "confidence_score": 0.2})
+    agent._link_entity({"company_name": "Errata"}, {"company_name": "Errata", "vat_number": "12345678901",
+                                                    "confidence_score": 0.9})
+    assert get_entity_resolver(app_config).stats()["entities"] == 0
+
+
+def test_domain_guessed_name_is_not_an_alias(api_config, app_config):
+    agent = CompanyAgent(api_config, app_config)
+    agent._link_entity({"company_name": "Acme", "domain": "acme.it", "website": "https://acme.it"},
+                       {"company_name": "Industrie Bianchi S.p.A.", "vat_number": VAT, "confidence_score": 0.9})
+
+    assert get_entity_resolver(app_config).lookup(company_name="Acme") is None
+    assert get_entity_resolver(app_config).lookup(domain="acme.it")["company_name"] == "Industrie Bianchi S.p.A."
+
+
+def serper_results(*titles):
+    return {"serper_results": {"organic": [{"title": t, "snippet": f"{t} - dati", "link": "https://x.it"}
+                                           for t in titles]}}
+
+
+def test_registry_extraction_is_one_structured_call(api_config, app_config, monkeypatch):
+    agent = CompanyAgent(api_config, app_config)
+    calls = []
+
+    async def fake_structured(prompt, system_prompt, schema):
+        calls.append(prompt)
+        record = {"company_name": "Acme S.r.l.", "vat_number": f"IT{VAT}"}
+        return {"sources": {"registro_imprese": record, "ufficio_camerale": dict(record, employees=""),
+                            "reportaziende": {"revenue": None}, "sconosciuta": record},
+                "consolidated": dict(record, employees="12")}
+
+    monkeypatch.setattr(agent, "query_structured_async", fake_structured)
+    all_results = {"registro_imprese": serper_results("Acme Registro"),
+                   "ufficio_camerale": serper_results("Acme Camerale"),
+                   "reportaziende": serper_results(),
+                   "additional_sources": {"Acme fatturato": {"organic": [{"title": "Acme bilancio"}]}}}
+
+    consolidated = asyncio.run(agent._consolidate_company_data(all_results, "Acme", VAT))
+
+    assert len(calls) == 1
+    assert all(text in calls[0] for text in ("Acme Registro", "Acme Camerale", "Acme bilancio"))
+    assert "=== Fonte: reportaziende ===" not in calls[0]
+    assert consolidated["data_sources"] == ["registro_imprese", "ufficio_camerale"]
+    assert consolidated["employees"] == "12"
+    assert consolidated["confidence_score"] > 0
+    assert all_results["ufficio_camerale"]["company_info"] == {"company_name": "Acme S.r.l.",
+                                                                "vat_number": f"IT{VAT}"}
+
+
+def test_no_evidence_means_no_extraction(api_config, app_config, monkeypatch):
+    agent = CompanyAgent(api_config, app_config)
+    monkeypatch.setattr(agent, "query_structured_async", None)
+
+    consolidated = asyncio.run(agent._consolidate_company_data({"registro_imprese": serper_results()}))
+
+    assert consolidated["data_sources"] == [] and consolidated["confidence_score"] == 0
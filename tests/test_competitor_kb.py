@@ -0,0 +1,87 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.competitor_kb import CompetitorKnowledgeBase, competitor_key
+from utils.cache import bypass_response_cache
+
+
+@pytest.fixture
+def kb(tmp_path):
+    return CompetitorKnowledgeBase(str(tmp_path / "kb.sqlite3"), {"profile": 3600, "default": 3600})
+
+
+def test_key_prefers_canonical_domain():
+    assert competitor_key("https://www.Rivale.it/chi-siamo", "Rivale Srl") == "rivale.it"
+    assert competitor_key("", "Rivale S.r.l.") == "name:rivale"
+
+
+def test_read_through_fetches_once_and_matches_by_name(kb):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"name": "Rivale", "search_results": [{"title": "x"}], "sector": "moda"}
+
+    first = kb.read_through("profile", fetch, domain="rivale.it", name="Rivale Srl")
+    second = kb.read_through("profile", fetch, domain="https://www.rivale.it", name="")
+    by_name = kb.get("profile", name="RIVALE s.r.l.")
+    assert first == second == by_name
+    assert len(calls) == 1
+
+
+def test_name_fallback_never_crosses_domains(kb):
+    kb.put("profile", {"name": "Rossi Srl", "sector": "edilizia"}, domain="rossi-edilizia.it", name="Rossi Srl")
+
+    assert kb.get("profile", domain="rossi-moda.it", name="Rossi Srl") is None
+    assert kb.get("profile", name="Rossi Srl")["sector"] == "edilizia"
+
+    kb.put("profile", {"name": "Rossi Srl", "sector": "moda"}, name="Rossi Srl")
+    assert kb.get("profile", domain="rossi-moda.it", name="Rossi Srl")["sector"] == "moda"
+
+
+def test_async_read_through_keeps_sqlite_off_the_event_loop(kb, monkeypatch):
+    threads = []
+    for name in ("get", "put"):
+        method = getattr(kb, name)
+        monkeypatch.setattr(kb, name, lambda *args, method=method: threads.append(threading.get_ident())
+                            or method(*args))
+
+    async def fetch():
+        return {"name": "Rivale", "sector": "moda"}
+
+    async def read_twice():
+        values = [await kb.read_through_async("profile", fetch, domain="rivale.it") for _ in range(2)]
+        return values, threading.get_ident()
+
+    values, loop_thread = asyncio.run(read_twice())
+
+    assert values[0] == values[1] == {"name": "Rivale", "sector": "moda"}
+    assert len(threads) == 3 and loop_thread not in threads
+
+
+@pytest.mark.parametrize("value", [
+    {},
+    {"error": "timeout"},
+    {"name": "Rivale", "search_results": [], "services": []},
+    {"name": "Rivale", "search_results": [{"title": "x"}], "analysis_raw": "non json"},
+    {"company_name": "Rivale", "data_found": False},
+    {"raw_text": "non json"},
+    None,
+])
+def test_failed_results_are_not_stored(kb, value):
+    kb.put("profile", value, domain="rivale.it", name="Rivale")
+    assert kb.get("profile", domain="rivale.it") is None
+
+
+def test_expired_and_bypassed_facts_are_misses(tmp_path):
+    kb = CompetitorKnowledgeBase(str(tmp_path / "kb.sqlite3"), {"default": -1})
+    kb.put("seo", {"se_keywords": 10}, domain="rivale.it")
+    assert kb.get("seo", domain="rivale.it") is None
+
+    fresh = CompetitorKnowledgeBase(str(tmp_path / "kb2.sqlite3"), {"default": 3600})
+    fresh.put("seo", {"se_keywords": 10}, domain="rivale.it")
+    with bypass_response_cache():
+        assert fresh.get("seo", domain="rivale.it") is None
+    assert fresh.get("seo", domain="rivale.it") == {"se_keywords": 10}
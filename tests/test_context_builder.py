@@ -0,0 +1,43 @@
+from utils.context_builder import ContextBuilder, build_analysis_context, compact, count_tokens
+
+SNIPPET = "Acme produce componenti meccanici di precisione per l'industria automobilistica italiana"
+
+
+def test_compact_drops_noise_urls_and_repeated_snippets():
+    value = {
+        "organic": [{"title": "Acme", "snippet": SNIPPET, "link": "https://acme.it/chi-siamo"},
+                    {"title": "Acme news", "snippet": SNIPPET.upper()}],
+        "website": "https://www.acme.it/home",
+        "searchParameters": {"q": "acme"},
+        "revenue": "N/A",
+    }
+
+    assert compact(value, set()) == {
+        "organic": [{"title": "Acme", "snippet": SNIPPET}, {"title": "Acme news"}],
+        "website": "acme.it",
+    }
+
+
+def test_sections_shrink_before_being_omitted():
+    keywords = [{"keyword": f"parola chiave {i}", "note": SNIPPET} for i in range(40)]
+    builder = ContextBuilder(budget_tokens=120)
+    builder.add("keywords", {"list": keywords, "extra": SNIPPET * 3}, priority=1)
+    builder.add("profilo", {"company_name": "Acme"}, priority=0)
+    builder.add("social", {"posts": [SNIPPET * 10] * 10}, priority=2)
+
+    context = builder.build()
+
+    assert context.startswith('profilo: {"company_name":"Acme"}')
+    assert "parola chiave 0" in context and "parola chiave 10" not in context
+    assert builder.omitted == ["social"]
+    assert builder.tokens_used <= 120
+    assert count_tokens(context) <= 120
+
+
+def test_analysis_context_follows_default_priorities():
+    data = {"social_analysis": {"platforms": ["linkedin"]}, "company_info": {"company_name": "Acme"},
+            "stage_timings": {"seo": 1.2}, "seo_analysis": {"traffic": 1200}}
+
+    lines = build_analysis_context(data, budget_tokens=1000).splitlines()
+
+    assert [line.split(":")[0] for line in lines] == ["company_info", "seo_analysis", "social_analysis"]
@@ -0,0 +1,187 @@
+import copy
+import threading
+import time
+
+import pytest
+
+import core
+from fakes import fake_openai
+from utils.analysis_store import get_analysis_store
+from utils.deadline import Deadline, DeadlineExceeded, use_deadline
+
+RESEARCH = {"search_1": {"query": "Rivale azienda", "results": {"organic": [{"title": "Rivale"}]}}}
+
+SECTION_VALUES = {
+    "deep_company_research": {"company_info": {}},
+    "research_competitors": [{"name": "Rivale"}],
+    "analyze_competitor_details": {"basic_info": {"name": "Rivale"}, "detailed_research": RESEARCH},
+    "comprehensive_social_analysis": {"platforms_found": {"linkedin": {"url": "https://linkedin.com/x"}}},
+}
+
+
+def fake(made, name, value):
+    """Metodo finto che registra la chiamata e restituisce (o solleva) value"""
+    def method(self, *args, **kwargs):
+        made.append(name)
+        if isinstance(value, Exception):
+            raise value
+        return copy.deepcopy(value)
+    return method
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Agenti Serper/SEMRush e insights AI finti: registrano le chiamate e rispondono subito"""
+    made = []
+    for name, value in SECTION_VALUES.items():
+        monkeypatch.setattr(core.SimpleSerperAgent, name, fake(made, name, value))
+    monkeypatch.setattr(core.SimpleSEMRushAgent, "comprehensive_seo_analysis", fake(made, "seo", {"overview": {}}))
+    monkeypatch.setattr(core.OpenAIAnalyzer, "generate_insights",
+                        fake(made, "insights", {"analisi_swot": {"strengths": ["x"]}}))
+    return made
+
+
+@pytest.fixture
+def analyzer():
+    analyzer = core.AdvancedMarketingAnalyzer()
+    analyzer.setup_api_config("sk-test", "semrush-test", "serper-test")
+    return analyzer
+
+
+def run(analyzer, company_input="https://www.example.it", **kwargs):
+    return analyzer.run_comprehensive_analysis(company_input, on_progress=lambda event: None, **kwargs)
+
+
+def test_complete_analysis_is_saved(analyzer, calls):
+    results = run(analyzer)
+
+    assert "incomplete" not in results
+    assert results["comprehensive_report"]
+    assert get_analysis_store().get(results["analysis_id"])["comprehensive_report"] == results["comprehensive_report"]
+
+
+def test_partial_analysis_is_not_saved(analyzer, calls, monkeypatch):
+    monkeypatch.setattr(core.SimpleSEMRushAgent, "comprehensive_seo_analysis",
+                        fake(calls, "seo", RuntimeError("SEMRush non raggiungibile")))
+
+    results = run(analyzer)
+
+    assert results["incomplete"] == ["seo_analysis"]
+    assert "analysis_id" not in results
+    assert analyzer.previous_analysis("https://www.example.it") is None
+
+
+def test_error_section_marks_analysis_incomplete(analyzer, calls, monkeypatch):
+    monkeypatch.setattr(core.SimpleSEMRushAgent, "comprehensive_seo_analysis",
+                        fake(calls, "seo", {"error": "API error: 403"}))
+
+    results = run(analyzer)
+
+    assert results["incomplete"] == ["seo_analysis"]
+    assert "analysis_id" not in results
+
+
+def test_expired_deadline_is_not_saved(analyzer, calls):
+    deadline = Deadline(0)
+
+    results = run(analyzer, deadline=deadline)
+
+    assert results.get("incomplete")
+    assert "analysis_id" not in results
+
+
+def test_search_past_its_deadline_fails_the_stage(analyzer, monkeypatch):
+    class ExpiredCache:
+        def get(self, payload):
+            raise DeadlineExceeded("Tempo a disposizione esaurito")
+
+    made = []
+    monkeypatch.setattr(core, "get_serper_cache", lambda: ExpiredCache())
+    monkeypatch.setattr(core.SimpleSEMRushAgent, "comprehensive_seo_analysis", fake(made, "seo", {"overview": {}}))
+    monkeypatch.setattr(core.OpenAIAnalyzer, "generate_insights", fake(made, "insights", {}))
+
+    results = run(analyzer)
+
+    assert "company_research" in results["incomplete"]
+    assert "company_research" not in results
+    assert "analysis_id" not in results
+
+
+def test_openai_timeout_comes_from_app_config():
+    analyzer = core.AdvancedMarketingAnalyzer()
+    analyzer.app_config.openai_timeout = 7
+    analyzer.setup_api_config("sk-test", "", "")
+    analyzer.openai_analyzer.client, completions = fake_openai('{"ok": true}')
+
+    assert analyzer.openai_analyzer._query_openai("prompt") == {"ok": True}
+    with use_deadline(Deadline(3)):
+        analyzer.openai_analyzer._query_openai("altro prompt")
+
+    assert completions.calls[0]["timeout"] == 7
+    assert 0 < completions.calls[1]["timeout"] <= 3
+
+
+def test_competitor_fan_out_is_bounded_and_ordered(monkeypatch):
+    agent = core.SimpleSerperAgent("serper-test")
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def research(competitor):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02 if competitor["name"] != "Lento" else 0.05)
+        with lock:
+            running[0] -= 1
+        if competitor["name"] == "Rotto":
+            raise RuntimeError("timeout")
+        return {"basic_info": competitor, "detailed_research": RESEARCH}
+
+    monkeypatch.setattr(agent, "analyze_competitor_details", research)
+    competitors = [{"name": name} for name in ("Lento", "A", "Rotto", "B", "C")]
+
+    detailed = agent.analyze_competitors_details(competitors, max_workers=2)
+
+    assert peak[0] == 2
+    assert [d["basic_info"]["name"] for d in detailed] == ["Lento", "A", "Rotto", "B", "C"]
+    assert detailed[2]["detailed_research"] == {}
+
+
+def test_refresh_reuses_valid_sections(analyzer, calls):
+    first = run(analyzer)
+    previous = analyzer.previous_analysis("https://www.example.it")
+    assert previous["freshness"] == first["freshness"]
+    calls.clear()
+
+    second = run(analyzer, previous=previous, refresh=["social_analysis"])
+
+    assert calls == ["comprehensive_social_analysis", "insights"]
+    assert second["company_research"] == first["company_research"]
+    assert second["freshness"]["seo_analysis"] == first["freshness"]["seo_analysis"]
+    assert second["freshness"]["social_analysis"] != first["freshness"]["social_analysis"]
+
+
+def test_sections_with_nested_errors_are_recomputed(analyzer, calls, monkeypatch):
+    monkeypatch.setattr(core.SimpleSEMRushAgent, "comprehensive_seo_analysis",
+                        fake(calls, "seo", {"overview": {}, "keywords": {"error": "API error: 503"}}))
+    first = run(analyzer)
+    previous = analyzer.previous_analysis("https://www.example.it")
+    assert "seo_analysis" not in first["freshness"]
+    calls.clear()
+
+    run(analyzer, previous=previous)
+
+    assert "seo" in calls
+
+
+def test_serper_outage_is_not_saved_as_complete(analyzer, monkeypatch):
+    made = []
+    monkeypatch.setattr(core.SimpleSerperAgent, "_search", fake(made, "search", {"error": "Errore ricerca: 503"}))
+    monkeypatch.setattr(core.SimpleSEMRushAgent, "comprehensive_seo_analysis", fake(made, "seo", {"overview": {}}))
+    monkeypatch.setattr(core.OpenAIAnalyzer, "generate_insights", fake(made, "insights", {}))
+
+    results = run(analyzer)
+
+    assert results["incomplete"] == ["company_research", "competitors", "competitors_analysis", "social_analysis"]
+    assert "analysis_id" not in results
+    assert analyzer.previous_analysis("https://www.example.it") is None
@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.deadline import (AnalysisCancelled, Deadline, DeadlineExceeded, bind_deadline, check_deadline,
+                            current_deadline, deadline_timeout, use_deadline)
+from utils.pipeline import Stage, StagePipeline
+
+
+def test_child_budget_never_outlives_its_parent():
+    parent = Deadline(1)
+    assert parent.child(60).remaining() <= 1
+    assert parent.child(0.1).remaining() <= 0.1
+    assert Deadline().child().remaining() == float("inf")
+
+
+def test_cancelling_a_child_cancels_the_run():
+    run = Deadline(60)
+    stage = run.child(10, "seo")
+
+    stage.cancel("Analisi interrotta dall'utente")
+
+    assert run.cancelled and run.remaining() == 0
+    with pytest.raises(AnalysisCancelled, match="dall'utente"):
+        run.check()
+
+
+def test_sleep_wakes_up_on_cancel():
+    deadline = Deadline(60)
+    threading.Timer(0.05, deadline.cancel).start()
+    start = time.monotonic()
+
+    with pytest.raises(AnalysisCancelled):
+        deadline.sleep(5)
+    assert time.monotonic() - start < 1
+
+
+def test_timeouts_and_checks_follow_the_current_deadline():
+    assert deadline_timeout(30) == 30
+    with use_deadline(Deadline(2)):
+        assert 0 < deadline_timeout(30) <= 2
+    with use_deadline(Deadline(0)), pytest.raises(DeadlineExceeded):
+        check_deadline()
+
+
+def test_bound_functions_carry_the_deadline_to_other_threads():
+    deadline = Deadline(60)
+    with use_deadline(deadline), ThreadPoolExecutor(1) as executor:
+        assert executor.submit(bind_deadline(current_deadline)).result() is deadline
+        assert executor.submit(current_deadline).result() is None
+
+
+def test_stage_over_its_budget_is_abandoned():
+    def slow(inputs):
+        while True:
+            check_deadline()
+            time.sleep(0.01)
+
+    pipeline = StagePipeline([Stage("social", slow), Stage("seo", lambda inputs: "ok"),
+                              Stage("report", lambda inputs: inputs, depends_on=("social", "seo"),
+                                    allow_partial=True)])
+    start = time.monotonic()
+
+    run = pipeline.run(deadline=Deadline(30), stage_budgets={"social": 0.1})
+
+    assert time.monotonic() - start < 5
+    assert "social" in run.results["social"].error
+    assert run.value("report") == {"social": None, "seo": "ok"}
+
+
+def test_cancelled_run_returns_partial_results_at_once():
+    deadline = Deadline(60)
+    release = threading.Event()
+
+    def blocking(inputs):
+        release.wait(5)  # Ignora la cancellazione: non va atteso
+
+    def cancel(inputs):
+        deadline.cancel("Sessione chiusa")
+        return "fatto"
+
+    pipeline = StagePipeline([Stage("blocking", blocking), Stage("cancel", cancel),
+                              Stage("after", lambda inputs: 1, depends_on=("cancel",))])
+    start = time.monotonic()
+
+    run = pipeline.run(deadline=deadline)
+    release.set()
+
+    assert time.monotonic() - start < 2
+    assert run.value("cancel") == "fatto"
+    assert run.results["blocking"].error == "Sessione chiusa"
+    assert run.results["after"].skipped
@@ -0,0 +1,97 @@
+import pytest
+
+from utils.entities import (EntityResolver, normalize_domain, normalize_name, normalize_vat,
+                            parse_company_input)
+
+VAT_A = "04427770278"
+VAT_B = "00743110157"
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    return EntityResolver(str(tmp_path / "entities.sqlite3"))
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Venezianico S.r.l.", "venezianico"),
+    ("  CAFFÈ  Vergnano S.p.A. ", "caffe vergnano"),
+    ("Acme & C. snc", "acme"),
+    ("Apple Inc.", "apple"),
+    ("SRL", "srl"),
+])
+def test_normalize_name_folds_accents_and_legal_forms(raw, expected):
+    assert normalize_name(raw) == expected
+
+
+def test_normalize_domain_and_vat():
+    assert normalize_domain("https://WWW.Acme.it:443/chi-siamo?x=1") == "acme.it"
+    assert normalize_domain("nome azienda") == ""
+    assert normalize_vat("IT 044 2777 0278") == VAT_A
+    assert normalize_vat("123") == ""
+
+
+@pytest.mark.parametrize("text, input_type, expected", [
+    ("venezianico.com", "url", {"domain": "venezianico.com", "company_name": "Venezianico"}),
+    ("P.IVA: 04427770278", "vat", {"vat_number": VAT_A}),
+    ("Acme S.r.l. - P.IVA 04427770278 - www.acme.it", "name",
+     {"company_name": "Acme S.r.l.", "vat_number": VAT_A, "domain": "acme.it"}),
+    ("Web Agency Rossi", "name", {"company_name": "Web Agency Rossi"}),
+    ("IT00359200447", "name", {"company_name": "IT00359200447"}),  # Checksum non valido
+])
+def test_parse_company_input(text, input_type, expected):
+    parsed_type, data = parse_company_input(text)
+    assert parsed_type == input_type
+    assert expected.items() <= data.items()
+
+
+def test_parse_rejects_too_short_input():
+    assert parse_company_input("x") == ("invalid", {})
+
+
+def test_spelling_variants_resolve_to_linked_company(resolver):
+    resolver.register("Venezianico S.r.l.", "venezianico.com", VAT_A, authoritative=True)
+
+    for text in ("venezianico srl", "VENEZIANICO", "https://www.venezianico.com/it/", "IT " + VAT_A):
+        is_valid, _, data = resolver.resolve_input(text)
+        assert is_valid
+        assert data["company_name"] == "Venezianico S.r.l."
+        assert data["vat_number"] == VAT_A
+        assert data["domain"] == "venezianico.com"
+
+
+def test_typed_names_are_not_registered(resolver):
+    resolver.resolve_input("Ferrari")
+    resolver.resolve_input("Ferrari Srl")
+    assert resolver.stats()["entities"] == 0
+    assert resolver.lookup(company_name="Ferrari") is None
+
+
+def test_same_name_different_companies_are_not_conflated(resolver):
+    resolver.register("Ferrari S.p.A.", "ferrari.com", VAT_A, authoritative=True)
+    resolver.register("Ferrari S.r.l.", "ferrari-arredamenti.it", VAT_B, authoritative=True)
+
+    first = resolver.lookup(vat=VAT_A)
+    second = resolver.lookup(vat=VAT_B)
+    assert (first["domain"], second["domain"]) == ("ferrari.com", "ferrari-arredamenti.it")
+    assert first["key"] != second["key"]
+
+    # Il nome è ora ambiguo: non porta più il dominio o la P.IVA di nessuna delle due
+    _, _, data = resolver.resolve_input("Ferrari")
+    assert data == {"company_name": "Ferrari"}
+
+
+def test_unverified_registration_does_not_merge_on_name(resolver):
+    resolver.register("Rossi Srl", "rossi.it", VAT_A, authoritative=True)
+    resolver.register("Rossi", domain="rossi-impianti.it")
+    assert resolver.lookup(domain="rossi-impianti.it")["vat"] == ""
+    assert resolver.lookup(domain="rossi.it")["vat"] == VAT_A
+
+
+def test_vat_and_domain_entities_merge_when_linked(resolver):
+    resolver.resolve_input(VAT_A)
+    resolver.resolve_input("acme.it")
+    assert resolver.stats()["entities"] == 2
+
+    resolver.register("Acme S.r.l.", "acme.it", VAT_A, authoritative=True)
+    assert resolver.stats()["entities"] == 1
+    assert resolver.lookup(domain="acme.it")["vat"] == VAT_A
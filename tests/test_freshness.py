@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from utils.freshness import fingerprint, has_errors, reusable_sections, section_state, stamp
+
+NOW = datetime(2026, 10, 1, 12, 0)
+
+
+def saved_results(now=NOW):
+    results = {"seo_analysis": {"traffic": 10}, "social_analysis": {}, "company_research": {}}
+    stamp(results, "seo_analysis", fingerprint({"domain": "acme.it"}), now - timedelta(days=2))
+    stamp(results, "social_analysis", fingerprint({"company_name": "Acme"}), now - timedelta(days=10))
+    return results
+
+
+def test_section_states():
+    results = saved_results()
+    seo = fingerprint({"domain": "acme.it"})
+
+    assert section_state(results, "seo_analysis", seo, max_age=7 * 86400, now=NOW) == "fresh"
+    assert section_state(results, "seo_analysis", seo, max_age=86400, now=NOW) == "stale"
+    assert section_state(results, "seo_analysis", fingerprint({"domain": "rivale.it"})) == "changed"
+    assert section_state(results, "company_research", seo) == "missing"
+    assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+
+
+def test_reusable_sections_skip_stale_missing_and_forced():
+    previous = saved_results(datetime.now())
+    fingerprints = {"seo_analysis": fingerprint({"domain": "acme.it"}),
+                    "social_analysis": fingerprint({"company_name": "Acme"}),
+                    "company_research": fingerprint({"company_name": "Acme"})}
+    max_ages = {"social_analysis": 7 * 86400, "default": 30 * 86400}
+
+    assert reusable_sections(previous, fingerprints, max_ages) == {"seo_analysis"}
+    assert reusable_sections(previous, fingerprints, max_ages, refresh=["seo_analysis"]) == set()
+    assert reusable_sections(None, fingerprints, max_ages) == set()
+
+
+def test_sections_with_errors_are_never_reused():
+    previous = saved_results(datetime.now())
+    previous["seo_analysis"] = {"overview": {"traffic": 10}, "keywords": {"error": "Errore API: 503"}}
+    fingerprints = {"seo_analysis": fingerprint({"domain": "acme.it"})}
+
+    assert has_errors([{"results": {"error": "Errore ricerca: 503"}}])
+    assert not has_errors({"organic": [{"title": "Acme"}]})
+    assert section_state(previous, "seo_analysis", fingerprints["seo_analysis"]) == "failed"
+    assert reusable_sections(previous, fingerprints, {"default": 30 * 86400}) == set()
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from utils.hedging import HedgePolicy, LatencyTracker
+from utils.http_client import HTTPTransport
+
+from fakes import FakeResponse
+
+
+class SlowFirstSession:
+    """La prima richiesta resta appesa finché release non viene impostato; le altre rispondono subito"""
+
+    def __init__(self):
+        self.sent = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self.sent += 1
+            number = self.sent
+        if number == 1:
+            self.release.wait(5)
+        return FakeResponse({"request": number})
+
+    def close(self):
+        self.release.set()
+
+
+def hedging_transport(**policy):
+    policy = HedgePolicy(**{"min_samples": 5, "min_delay": 0.05, "max_ratio": 0.5, **policy})
+    for _ in range(5):
+        policy.latencies.record("serper:search", 0.01)
+    transport = HTTPTransport(hedge_policy=policy)
+    transport.session = SlowFirstSession()
+    return transport, policy
+
+
+def test_latency_percentiles():
+    tracker = LatencyTracker(window=10)
+    for ms in range(1, 21):
+        tracker.record("k", ms / 1000)
+
+    assert tracker.count("k") == 10
+    assert tracker.percentile("k", 50) == 0.015
+    assert tracker.percentile("k", 95) == 0.02
+    assert tracker.percentile("altro", 95) is None
+
+
+def test_hedging_waits_for_samples_and_respects_the_ratio():
+    policy = HedgePolicy(min_samples=3, min_delay=0.3, max_ratio=0.1)
+    policy.latencies.record("k", 0.1)
+    assert policy.delay("k") is None
+    policy.latencies.record("k", 0.1)
+    policy.latencies.record("k", 0.2)
+    assert policy.delay("k") == 0.3  # Mai sotto min_delay
+
+    for _ in range(10):
+        policy.start()
+    assert policy.reserve()
+    assert not policy.reserve()
+
+
+def test_slow_request_is_hedged_and_the_duplicate_wins():
+    transport, policy = hedging_transport()
+    policy.start()  # Quota per un duplicato
+
+    start = time.monotonic()
+    response = transport.post("https://google.serper.dev/search", json={"q": "acme"}, hedge="serper:search")
+
+    assert response.json() == {"request": 2}
+    assert time.monotonic() - start < 2
+    assert policy.stats() == {"eligible": 2, "sent": 1, "won": 1}
+    transport.close()
+
+
+def test_no_duplicate_without_rate_limit_budget():
+    transport, policy = hedging_transport()
+    policy.start()
+    threading.Timer(0.2, transport.session.release.set).start()
+
+    response = transport.post("https://google.serper.dev/search", json={"q": "acme"}, hedge="serper:search",
+                              hedge_budget=lambda: False)
+
+    assert response.json() == {"request": 1}
+    assert transport.session.sent == 1
+    assert policy.stats()["sent"] == 0
+    transport.close()
@@ -0,0 +1,136 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from agents.semrush_agent import SEMRushAgent
+from agents.serper_agent import SerperAgent
+from utils.cache import bypass_response_cache
+from utils.deadline import Deadline, use_deadline
+from utils.http_client import HTTPTransport, SingleFlight, configure_transport, get_openai_client, get_transport
+from utils.retry import RetryPolicy, call_with_retry
+
+from fakes import FakeResponse
+
+
+def test_agents_share_transport_and_openai_client(api_config, app_config):
+    serper, semrush = SerperAgent(api_config, app_config), SEMRushAgent(api_config, app_config)
+
+    assert serper.transport is semrush.transport is get_transport()
+    assert serper.client is semrush.client is get_openai_client(api_config.openai_api_key)
+
+
+def test_transport_pools_follow_the_configuration(app_config):
+    app_config.http_pool_maxsize = 4
+    transport = configure_transport(app_config)
+
+    assert get_transport() is transport
+    assert transport.session.get_adapter("https://api.semrush.com/")._pool_maxsize == 4
+
+
+class FakeSession:
+    """Sessione requests finta: registra le richieste inviate"""
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.sent = []
+
+    def request(self, method, url, **kwargs):
+        self.sent.append((method, url))
+        return FakeResponse({"n": len(self.sent)}, self.status_code)
+
+    def close(self):
+        pass
+
+
+def transport_with(session, **kwargs):
+    transport = HTTPTransport(**kwargs)
+    transport.session = session
+    return transport
+
+
+def test_single_flight_shares_concurrent_calls():
+    flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"ok": True}
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(flight.do, "k", fetch)
+        started.wait(5)
+        followers = [executor.submit(flight.do, "k", fetch) for _ in range(3)]
+        while flight.shared < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert results == [{"ok": True}] * 4
+    assert len(calls) == 1
+    assert flight.do("k", lambda: "nuovo") == "nuovo"  # Senza finestra il risultato non resta condiviso
+
+
+def test_single_flight_window_reuses_results_but_not_errors():
+    flight = SingleFlight(window=60)
+
+    def fail():
+        raise ValueError("boom")
+
+    with use_deadline(Deadline(60)):
+        with pytest.raises(ValueError):
+            flight.do("k", fail)
+        assert flight.do("k", lambda: {"error": "quota"}) == {"error": "quota"}
+        assert flight.do("k", lambda: 1) == 1
+        assert flight.do("k", lambda: 2) == 1
+
+
+def test_single_flight_memo_is_scoped_to_one_analysis():
+    flight = SingleFlight(window=60)
+    first_run, second_run = Deadline(60), Deadline(60)
+
+    with use_deadline(first_run.child(10, "seo")):
+        assert flight.do("k", lambda: 1) == 1
+    with use_deadline(first_run):
+        assert flight.do("k", lambda: 2) == 1  # Stesso run, altro stage
+        with bypass_response_cache():
+            assert flight.do("k", lambda: 3) == 3  # Modalità refresh
+    with use_deadline(second_run):
+        assert flight.do("k", lambda: 4) == 4
+    assert flight.do("k", lambda: 5) == 5  # Fuori da un'analisi
+
+
+@pytest.fixture
+def analysis_run():
+    with use_deadline(Deadline(60)) as deadline:
+        yield deadline
+
+
+def test_transport_coalesces_identical_gets_only(analysis_run):
+    session = FakeSession()
+    transport = transport_with(session, coalesce_window=60)
+
+    first = transport.get("https://api.semrush.com/", params={"domain": "acme.it"}, coalesce=True)
+    second = transport.get("https://api.semrush.com/", params={"domain": "acme.it"}, coalesce=True)
+    transport.get("https://api.semrush.com/", params={"domain": "rivale.it"}, coalesce=True)
+    transport.post("https://google.serper.dev/search", json={"q": "acme"})
+    transport.post("https://google.serper.dev/search", json={"q": "acme"})
+
+    assert first is second
+    assert len(session.sent) == 4
+
+
+def test_error_responses_are_not_reused_by_retries(analysis_run):
+    session = FakeSession(status_code=503)
+    transport = transport_with(session, coalesce_window=60)
+
+    with pytest.raises(requests.HTTPError):
+        call_with_retry(lambda: transport.get("https://api.semrush.com/", params={"domain": "acme.it"},
+                                              coalesce=True),
+                        RetryPolicy(3, base_delay=0))
+
+    assert len(session.sent) == 3
@@ -0,0 +1,57 @@
+import pytest
+
+from agents.agents import BaseAgent
+from utils.json_stream import JSONStreamAssembler, partial_json_callback
+
+from fakes import fake_openai
+
+DOCUMENT = '```json\n{"settore": "Moda", "punti_forza": ["Marchio", "Rete \\"diretta\\""], "score": 12}\n```'
+
+
+class EchoAgent(BaseAgent):
+    async def analyze_async(self, company_data):
+        return company_data
+
+
+@pytest.mark.parametrize("prefix, expected", [
+    ('```json\n', None),
+    ('{"settore": "Mo', {"settore": "Mo"}),
+    ('{"settore": "Moda", "punti_forza": ["Marchio", "Re', {"settore": "Moda", "punti_forza": ["Marchio", "Re"]}),
+    ('{"settore": "Moda", "punti_forza": ["Marchio"], "sco', {"settore": "Moda", "punti_forza": ["Marchio"]}),
+    ('{"settore": "Moda", "score": 1', {"settore": "Moda", "score": 1}),
+])
+def test_partial_values_close_what_is_open(prefix, expected):
+    assert JSONStreamAssembler().feed(prefix).partial() == expected
+
+
+def test_assembler_gives_the_same_result_for_any_chunking():
+    for size in (1, 3, 7, len(DOCUMENT)):
+        assembler = JSONStreamAssembler()
+        for i in range(0, len(DOCUMENT), size):
+            assembler.feed(DOCUMENT[i:i + size])
+        assert assembler.complete
+        assert assembler.result()["punti_forza"][1] == 'Rete "diretta"'
+
+
+def test_callback_reports_only_changed_values():
+    seen = []
+    on_token = partial_json_callback(seen.append)
+
+    for delta in ['{"a": ', '"x', '"', ', ', '"b": [1', ']}']:
+        on_token(delta)
+
+    assert seen == [{}, {"a": "x"}, {"a": "x", "b": [1]}]
+
+
+def test_query_openai_streams_tokens(api_config, app_config):
+    agent = EchoAgent(api_config, app_config)
+    agent.client, completions = fake_openai("Analisi del mercato italiano")
+    tokens = []
+
+    text = agent.query_openai("Analizza", on_token=tokens.append)
+
+    assert text == "Analisi del mercato italiano"
+    assert len(tokens) > 1 and "".join(tokens) == text
+    assert completions.calls[0]["stream"] is True
+    # La risposta completa viene riusata dalla cache in un solo pezzo
+    assert list(agent.stream_openai("Analizza")) == [text]
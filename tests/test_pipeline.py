@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from utils.pipeline import Stage, StagePipeline
+
+
+def test_stages_receive_their_dependencies():
+    pipeline = StagePipeline([
+        Stage("report", lambda inputs: f"{inputs['company']} vs {inputs['competitors']}",
+              depends_on=("company", "competitors")),
+        Stage("company", lambda inputs: "Acme"),
+        Stage("competitors", lambda inputs: ["Rivale"]),
+    ])
+
+    run = pipeline.run()
+
+    assert run.value("report") == "Acme vs ['Rivale']"
+    assert set(run.timings()) == {"company", "competitors", "report"}
+
+
+def test_independent_stages_run_in_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+    pipeline = StagePipeline([Stage("serper", lambda inputs: barrier.wait()),
+                              Stage("semrush", lambda inputs: barrier.wait())])
+
+    run = pipeline.run()
+
+    assert run.results["serper"].ok and run.results["semrush"].ok
+
+
+def test_failed_dependency_skips_dependents_unless_partial():
+    def fail(inputs):
+        raise RuntimeError("quota esaurita")
+
+    pipeline = StagePipeline([
+        Stage("seo", fail),
+        Stage("social", lambda inputs: {"linkedin": True}),
+        Stage("summary", lambda inputs: "riassunto", depends_on=("seo",)),
+        Stage("report", lambda inputs: sorted(k for k, v in inputs.items() if v is not None),
+              depends_on=("seo", "social"), allow_partial=True),
+    ])
+    done = []
+
+    run = pipeline.run(on_stage_done=lambda stage, result: done.append(stage.name))
+
+    assert run.results["seo"].error == "quota esaurita"
+    assert run.results["summary"].skipped
+    assert run.value("report") == ["social"]
+    assert sorted(done) == ["report", "seo", "social", "summary"]
+
+
+@pytest.mark.parametrize("stages, message", [
+    ([Stage("a", lambda inputs: 1, depends_on=("b",))], "non esiste"),
+    ([Stage("a", lambda inputs: 1, depends_on=("b",)), Stage("b", lambda inputs: 1, depends_on=("a",))], "Ciclo"),
+])
+def test_invalid_graphs_are_rejected(stages, message):
+    with pytest.raises(ValueError, match=message):
+        StagePipeline(stages)
+
+
+def test_callbacks_run_on_the_calling_thread():
+    caller = threading.get_ident()
+    threads = []
+    pipeline = StagePipeline([Stage("a", lambda inputs: time.sleep(0.01)), Stage("b", lambda inputs: 1)])
+
+    pipeline.run(on_stage_start=lambda stage: threads.append(threading.get_ident()),
+                 on_stage_done=lambda stage, result: threads.append(threading.get_ident()))
+
+    assert threads == [caller] * 4
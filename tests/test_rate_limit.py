@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.deadline import Deadline, DeadlineExceeded, use_deadline
+from utils.rate_limit import RateLimiter
+
+LIMITS = {"serper": {"rate": 2, "burst": 2}, "semrush:domain_organic": {"rate": 1, "burst": 1}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("utils.rate_limit.time.time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return RateLimiter(str(tmp_path / "rate_limits.sqlite3"), LIMITS)
+
+
+def test_bucket_allows_a_burst_then_refills(limiter, clock):
+    assert [limiter.try_acquire("serper", "k") for _ in range(2)] == [0.0, 0.0]
+    assert limiter.try_acquire("serper", "k") == pytest.approx(0.5)
+
+    clock[0] += 0.5
+    assert limiter.try_acquire("serper", "k") == 0.0
+
+
+def test_buckets_are_per_api_key_and_endpoint(limiter, clock):
+    limiter.try_acquire("semrush", "k", "domain_organic")
+    assert limiter.try_acquire("semrush", "k", "domain_organic") > 0
+    assert limiter.try_acquire("semrush", "altra", "domain_organic") == 0.0
+    assert limiter.try_acquire("semrush", "k", "backlinks_overview") == 0.0  # Senza limite
+    assert limiter.limit_for("semrush", "domain_adwords") is None
+
+
+def test_buckets_are_shared_between_processes(tmp_path, clock):
+    path = str(tmp_path / "rate_limits.sqlite3")
+    first, second = RateLimiter(path, LIMITS), RateLimiter(path, LIMITS)
+
+    first.try_acquire("serper", "k")
+    first.try_acquire("serper", "k")
+    assert second.try_acquire("serper", "k") > 0
+
+
+def test_acquire_waits_only_when_needed(limiter, monkeypatch):
+    slept, waits = [], iter([0.0, 0.25, 0.0])
+    monkeypatch.setattr("utils.rate_limit.deadline_sleep", slept.append)
+    monkeypatch.setattr(limiter, "try_acquire", lambda *args: next(waits))
+
+    limiter.acquire("serper", "k")
+    assert slept == []
+    limiter.acquire("serper", "k")
+    assert slept == [0.25] and limiter.waited == 0.25
+
+
+def test_async_acquire_keeps_sqlite_off_the_event_loop(limiter, monkeypatch):
+    threads, waits = [], iter([0.01, 0.0])
+
+    def try_acquire(*args):
+        threads.append(threading.get_ident())
+        return next(waits)
+
+    monkeypatch.setattr(limiter, "try_acquire", try_acquire)
+
+    async def acquire():
+        await limiter.acquire_async("serper", "k")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(acquire())
+    assert len(threads) == 2 and loop_thread not in threads
+    assert limiter.waited == 0.01
+
+
+def test_acquire_respects_the_deadline(limiter):
+    limiter.try_acquire("semrush", "k", "domain_organic")
+    with use_deadline(Deadline(0.1)), pytest.raises(DeadlineExceeded):
+        limiter.acquire("semrush", "k", "domain_organic")
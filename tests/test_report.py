@@ -0,0 +1,60 @@
+import threading
+
+import core
+
+AI_SECTIONS = ["company_profile", "market_positioning", "swot_analysis", "recommendations"]
+
+
+class SlowInsights:
+    """Insights AI che arrivano solo dopo release; on_partial riceve una versione parziale"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate_insights(self, all_data, on_partial=None):
+        if on_partial:
+            on_partial({"analisi_swot": {"strengths": ["Marchio"]}})
+        self.release.wait(5)
+        return {"analisi_swot": {"strengths": ["Marchio", "Rete vendita"]}}
+
+
+def test_data_sections_do_not_wait_for_ai_insights():
+    insights = SlowInsights()
+    report = core.ReportGenerator(insights)
+    sections = report.iter_sections({"company_name": "Acme"}, {})
+
+    first = [next(sections).key for _ in range(6)]
+    insights.release.set()
+    rest = [section.key for section in sections]
+
+    assert first == ["header", "financial_analysis", "products_services", "digital_presence",
+                     "competitor_analysis", "conclusions"]
+    assert rest == AI_SECTIONS
+
+
+def test_streamed_ai_sections_end_with_the_final_version(monkeypatch):
+    monkeypatch.setattr(core.ReportGenerator, "PARTIAL_INTERVAL", 0.01)
+    insights = SlowInsights()
+    report = core.ReportGenerator(insights)
+    sections = []
+
+    for section in report.iter_sections({"company_name": "Acme"}, {}, skip={"header"}, stream_ai=True):
+        sections.append(section)
+        if section.partial:
+            insights.release.set()
+
+    swot = [s for s in sections if s.key == "swot_analysis"]
+    assert swot[0].partial and not swot[-1].partial
+    assert "Rete vendita" not in swot[0].markdown and "Rete vendita" in swot[-1].markdown
+
+    markdown = report.assemble(sections)
+    assert markdown.count("Rete vendita") == 1
+    assert markdown.index("Rete vendita") < markdown.index(report.render_section(
+        "conclusions", {"company_name": "Acme"}, {}).markdown)
+
+
+def test_ready_sections_follow_finished_stages():
+    report = core.ReportGenerator()
+
+    assert report.ready_sections([]) == []
+    assert report.ready_sections(["company_research"]) == ["financial_analysis", "products_services"]
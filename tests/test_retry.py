@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+import core
+from utils.http_client import get_transport
+from utils.retry import CircuitBreaker, RetryPolicy, call_with_retry, classify
+
+from fakes import FakeResponse
+
+
+def http_error(status_code, headers=None):
+    response = FakeResponse(status_code=status_code)
+    response.headers.update(headers or {})
+    return requests.HTTPError(f"{status_code} Error", response=response)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (requests.exceptions.ConnectTimeout(), (True, None)),
+    (requests.exceptions.ConnectionError(), (True, None)),
+    (http_error(503), (True, None)),
+    (http_error(429, {"Retry-After": "2"}), (True, 2.0)),
+    (http_error(404), (False, None)),
+    (http_error(401), (False, None)),
+])
+def test_only_transient_errors_are_retried(error, expected):
+    assert classify(error) == expected
+
+
+def test_call_with_retry_stops_at_the_first_success():
+    responses = [FakeResponse(status_code=503), FakeResponse(status_code=502), FakeResponse({"ok": True})]
+
+    response = call_with_retry(lambda: responses.pop(0), RetryPolicy(3, base_delay=0))
+
+    assert response.json() == {"ok": True}
+    assert responses == []
+
+
+def test_call_with_retry_does_not_retry_client_errors():
+    sent = []
+
+    with pytest.raises(requests.HTTPError):
+        call_with_retry(lambda: sent.append(1) or FakeResponse(status_code=404), RetryPolicy(3, base_delay=0))
+
+    assert len(sent) == 1
+
+
+def test_circuit_breaker_opens_and_probes_once(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("utils.retry.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 10
+    assert breaker.allow()       # Richiesta di prova
+    assert not breaker.allow()   # Le altre attendono l'esito della prova
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_core_agents_retry_as_configured(monkeypatch):
+    analyzer = core.AdvancedMarketingAnalyzer()
+    analyzer.app_config.max_retries = 2
+    analyzer.app_config.retry_base_delay = 0
+    analyzer.setup_api_config("", "", "serper-test")
+    sent = []
+    monkeypatch.setattr(get_transport(), "post", lambda *args, **kwargs: sent.append(1) or FakeResponse(status_code=503))
+
+    result = analyzer.serper_agent._search("acme srl")
+
+    assert "error" in result
+    assert len(sent) == 2
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+from agents.semrush_agent import SEMRushAgent
+from utils.cache import SemrushCache
+from utils.competitor_kb import get_competitor_kb
+
+from fakes import FakeResponse
+
+ORGANIC_COMPETITORS = [
+    {"Dn": "rivale.it", "Cr": 120, "Or": 900, "Ot": 4000, "Cl": 0.4},
+    {"Dn": "altro.it", "Cr": 80, "Or": 300, "Ot": 1500, "Cl": 0.2},
+]
+
+
+def make_agent(api_config, app_config, monkeypatch, data):
+    agent = SEMRushAgent(api_config, app_config)
+    calls = []
+
+    async def fake_request(url, params=None, **kwargs):
+        calls.append(dict(params))
+        return FakeResponse(data(params) if callable(data) else data)
+
+    monkeypatch.setattr(agent, "make_request_async", fake_request)
+    return agent, calls
+
+
+def test_competitors_are_read_through_the_knowledge_base(api_config, app_config, monkeypatch):
+    app_config.cache_enabled = False  # Solo la knowledge base può evitare la seconda chiamata
+    agent, calls = make_agent(api_config, app_config, monkeypatch, ORGANIC_COMPETITORS)
+
+    first = asyncio.run(agent._get_competitors("cliente.it"))
+    second = asyncio.run(agent._get_competitors("cliente.it"))
+
+    assert [c["domain"] for c in first] == ["rivale.it", "altro.it"]
+    assert second == first
+    assert len(calls) == 1
+    assert get_competitor_kb(app_config).get("seo", domain="rivale.it") == {"se_keywords": 900, "se_traffic": 4000}
+
+
+def test_failed_competitor_report_is_not_remembered(api_config, app_config, monkeypatch):
+    app_config.cache_enabled = False
+    agent, calls = make_agent(api_config, app_config, monkeypatch, {"error": "quota"})
+
+    asyncio.run(agent._get_competitors("cliente.it"))
+    asyncio.run(agent._get_competitors("cliente.it"))
+
+    assert len(calls) == 2
+
+
+def test_report_cache_is_used_off_the_event_loop(api_config, app_config, monkeypatch):
+    agent, calls = make_agent(api_config, app_config, monkeypatch, [{"Ph": "scarpe"}])
+    threads = []
+
+    def on_thread(method):
+        def wrapper(self, *args):
+            threads.append(threading.current_thread())
+            return method(self, *args)
+        return wrapper
+
+    monkeypatch.setattr(SemrushCache, "lookup", on_thread(SemrushCache.lookup))
+    monkeypatch.setattr(SemrushCache, "store", on_thread(SemrushCache.store))
+
+    first = asyncio.run(agent._get_organic_dataset("cliente.it"))
+    second = asyncio.run(agent._get_organic_dataset("cliente.it"))
+
+    assert first == second == [{"Ph": "scarpe"}]
+    assert len(calls) == 1
+    assert len(threads) == 3  # lookup, store, lookup
+    assert threading.main_thread() not in threads
+
+
+def test_organic_views_come_from_one_domain_organic_report(api_config, app_config, monkeypatch):
+    app_config.cache_enabled = False
+    reports = {
+        "domain_organic": [{"Ph": f"kw{i}", "Po": i, "Nq": 100, "Cp": 1, "Kd": 30} for i in range(1, 13)],
+        "backlinks_overview": {"backlinks_num": 50, "domains_num": 10, "ascore": 20},
+        "domain_organic_organic": ORGANIC_COMPETITORS,
+        "domain_adwords": [],
+    }
+    agent, calls = make_agent(api_config, app_config, monkeypatch, lambda params: reports[params["type"]])
+
+    result = agent.analyze({"website": "https://www.cliente.it/chi-siamo"})
+
+    assert sorted(call["type"] for call in calls) == sorted(reports)
+    assert len(result["organic_traffic"]["top_keywords"]) == 10
+    assert result["keywords"]["total_keywords"] == 12
+    assert (result["keywords"]["keywords_1_3"], result["keywords"]["keywords_4_10"],
+            result["keywords"]["keywords_11_20"]) == (3, 7, 2)
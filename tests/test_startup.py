@@ -0,0 +1,34 @@
+import pytest
+
+import bench_startup
+
+
+def loaded_by(statement, forbidden):
+    return sorted(set(bench_startup.measure_once(statement)["loaded"]) & set(forbidden))
+
+
+def test_core_imports_without_ui_or_openai():
+    assert loaded_by("import core", ["streamlit", "openai", "pandas"]) == []
+
+
+def test_core_engine_is_set_up_without_streamlit():
+    statement = "import core; core.AdvancedMarketingAnalyzer().setup_api_config('', '', '')"
+    assert loaded_by(statement, ["streamlit", "pandas"]) == []
+
+
+def test_packages_defer_agent_and_util_modules():
+    assert loaded_by("import agents, utils", ["openai", "bs4", "pandas", "requests"]) == []
+    assert loaded_by("from utils import DataProcessor", ["pandas"]) == []
+
+
+def test_lazy_exports_resolve_on_first_access():
+    import agents
+    import utils
+    from agents.serper_agent import SerperAgent
+
+    assert agents.SerperAgent is SerperAgent
+    assert "SerperAgent" in vars(agents)  # Accessi successivi senza __getattr__
+    assert set(agents.__all__) <= set(dir(agents))
+    assert utils.count_tokens("ciao") > 0
+    with pytest.raises(AttributeError):
+        agents.MissingAgent
@@ -0,0 +1,66 @@
+import pytest
+
+from utils.deadline import DeadlineExceeded
+from utils.structured_output import (StructuredOutputError, parse_structured, query_structured, repair_json,
+                                     supports_json_mode)
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "company_name": {"type": ["string", "null"]},
+        "employees": {"type": ["string", "null"]},
+        "products": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["company_name"],
+}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Ecco: {"a": [1, 2,], "b": True, "c": None,}', {"a": [1, 2], "b": True, "c": None}),
+    ('{“a”: “x”}', {"a": "x"}),
+    ('{"a": "testo tronc', {"a": "testo tronc"}),
+])
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_types_are_coerced_before_validation():
+    value, errors = parse_structured('{"company_name": "Acme", "employees": 12, "products": "viti"}', SCHEMA)
+
+    assert errors == []
+    assert value == {"company_name": "Acme", "employees": "12", "products": ["viti"]}
+
+
+def test_one_fix_up_request_for_invalid_answers():
+    prompts = []
+
+    def complete(prompt, system_prompt):
+        prompts.append((prompt, system_prompt))
+        return '{"products": []}' if len(prompts) == 1 else '{"company_name": "Acme", "products": []}'
+
+    assert query_structured(complete, "Estrai", "Sei un analista", SCHEMA) == {"company_name": "Acme",
+                                                                               "products": []}
+    assert len(prompts) == 2
+    assert "JSON Schema" in prompts[0][1]
+    assert "manca la chiave obbligatoria 'company_name'" in prompts[1][0]
+
+
+def test_still_invalid_answers_raise_with_the_raw_text():
+    with pytest.raises(StructuredOutputError) as error:
+        query_structured(lambda prompt, system_prompt: "non lo so", "Estrai", None, SCHEMA)
+
+    assert error.value.raw == "non lo so"
+
+
+def test_deadline_is_not_reported_as_a_format_error():
+    def complete(prompt, system_prompt):
+        raise DeadlineExceeded("Tempo a disposizione esaurito")
+
+    with pytest.raises(DeadlineExceeded):
+        query_structured(complete, "Estrai", None, SCHEMA)
+
+
+def test_json_mode_models():
+    assert supports_json_mode("gpt-4o-mini")
+    assert not supports_json_mode("gpt-4")
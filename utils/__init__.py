@@ -1 +1,35 @@
+"""
+Marketing Analyzer - Utils Package
 
+Utilities per validazione, processamento dati e web scraping.
+I moduli vengono importati al primo accesso (PEP 562).
+"""
+
+import importlib
+
+_LAZY_IMPORTS = {
+    'InputValidator': 'utils.validator',
+    'DataProcessor': 'utils.data_processor',
+    'ContextBuilder': 'utils.context_builder',
+    'count_tokens': 'utils.context_builder'
+}
+
+__all__ = [
+    'InputValidator',
+    'DataProcessor',
+    'ContextBuilder',
+    'count_tokens'
+]
+
+
+def __getattr__(name):
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # Gli accessi successivi non passano da __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,181 @@
+"""
+Archivio locale delle analisi concluse.
+
+Ogni analisi viene salvata in SQLite con i risultati completi in JSON e con
+P.IVA, dominio e nome azienda normalizzati in colonne indicizzate: la ricerca
+dell'ultima analisi di un'azienda è una lettura su indice, senza API esterne.
+L'archivio sopravvive alla sessione Streamlit e alimenta lo storico, la
+modalità refresh (analisi precedente) e il resume dei batch.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import AppConfig
+from utils.entities import normalize_domain, normalize_name, normalize_vat, parse_company_input
+
+# Colonne dello storico (senza i risultati completi)
+SUMMARY_COLUMNS = ("id", "created_at", "company_name", "vat", "domain", "input", "input_type", "has_report")
+
+
+def company_identity(results: Dict[str, Any], company_input: str = "") -> Dict[str, str]:
+    """P.IVA, dominio e nome normalizzati dei risultati di un'analisi"""
+    info = results.get("company_info") or {}
+    # Per le P.IVA il nome è un segnaposto ("Azienda P.IVA ..."): non identifica l'azienda
+    name = "" if results.get("input_type") == "vat" else info.get("company_name") or company_input
+    return {
+        "vat": normalize_vat(info.get("vat_number") or info.get("vat")),
+        "domain": normalize_domain(info.get("domain") or info.get("website")),
+        "name": normalize_name(name)
+    }
+
+
+class AnalysisStore:
+    """Analisi salvate su SQLite, indicizzate per P.IVA, dominio, nome e data"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Una connessione condivisa tra thread, serializzata da self._lock (WAL per più processi)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL NOT NULL,
+                    input TEXT NOT NULL,
+                    input_type TEXT,
+                    company_name TEXT,
+                    vat TEXT,
+                    domain TEXT,
+                    name TEXT,
+                    has_report INTEGER NOT NULL DEFAULT 0,
+                    results TEXT NOT NULL
+                )
+            """)
+            for column in ("vat", "domain", "name"):
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_analyses_{column} ON analyses ({column}, created_at)"
+                )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses (created_at)")
+            self._conn.commit()
+
+    def save(self, results: Dict[str, Any], company_input: str = "") -> int:
+        """Salva i risultati di un'analisi e restituisce il suo id"""
+        identity = company_identity(results, company_input)
+        info = results.get("company_info") or {}
+        payload = json.dumps(results, ensure_ascii=False, default=str)
+
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO analyses (created_at, input, input_type, company_name, vat, domain, name, "
+                "has_report, results) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), company_input, results.get("input_type"), info.get("company_name", ""),
+                 identity["vat"], identity["domain"], identity["name"],
+                 int(bool(results.get("comprehensive_report"))), payload)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def get(self, analysis_id: int) -> Optional[Dict[str, Any]]:
+        """Risultati completi di un'analisi salvata"""
+        with self._lock:
+            row = self._conn.execute("SELECT results FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def latest(self, vat: str = "", domain: str = "", name: str = "",
+               max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Ultima analisi con la P.IVA, il dominio o il nome indicati (in quest'ordine di priorità)"""
+        since = time.time() - max_age if max_age is not None else 0
+        keys = [("vat", normalize_vat(vat)), ("domain", normalize_domain(domain)), ("name", normalize_name(name))]
+
+        with self._lock:
+            for column, value in keys:
+                if not value:
+                    continue
+                row = self._conn.execute(
+                    f"SELECT results FROM analyses WHERE {column} = ? AND created_at >= ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (value, since)
+                ).fetchone()
+                if row:
+                    return json.loads(row[0])
+        return None
+
+    def lookup(self, company_input: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Ultima analisi dell'azienda indicata da un input (nome, URL o P.IVA)"""
+        input_type, company_data = parse_company_input(company_input)
+        if input_type == "invalid":
+            return None
+        return self.latest(
+            vat=company_data.get("vat_number", ""),
+            domain=company_data.get("domain", ""),
+            name=company_data.get("company_name", "") if input_type == "name" else "",
+            max_age=max_age
+        )
+
+    def history(self, limit: int = 50, vat: str = "", domain: str = "", name: str = "") -> List[Dict[str, Any]]:
+        """Analisi salvate, dalla più recente, senza caricare i risultati completi.
+
+        I filtri sono in OR; name cerca i nomi che iniziano con il testo indicato.
+        """
+        filters, params = [], []
+        for column, value in (("vat", normalize_vat(vat)), ("domain", normalize_domain(domain))):
+            if value:
+                filters.append(f"{column} = ?")
+                params.append(value)
+        name = normalize_name(name)
+        if name:
+            # Intervallo sul prefisso: usa l'indice, a differenza di LIKE
+            filters.append("(name >= ? AND name < ?)")
+            params += [name, name + "\uffff"]
+        where = f"WHERE {' OR '.join(filters)} " if filters else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM analyses {where}ORDER BY created_at DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+
+        history = []
+        for row in rows:
+            entry = dict(zip(SUMMARY_COLUMNS, row))
+            entry["created_at"] = datetime.fromtimestamp(entry["created_at"]).isoformat(timespec="seconds")
+            entry["has_report"] = bool(entry["has_report"])
+            history.append(entry)
+        return history
+
+    def delete(self, analysis_id: int):
+        """Elimina un'analisi dall'archivio"""
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+            self._conn.commit()
+
+
+_store_lock = threading.Lock()
+_store: Optional[AnalysisStore] = None
+
+
+def get_analysis_store(app_config: Optional[AppConfig] = None) -> Optional[AnalysisStore]:
+    """Archivio delle analisi di processo, o None se disabilitato"""
+    global _store
+    config = app_config or AppConfig()
+    if not config.analysis_store_enabled:
+        return None
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AnalysisStore(config.analysis_store_path)
+    return _store
@@ -0,0 +1,396 @@
+import contextvars
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import AppConfig
+
+
+class PersistentCache:
+    """Cache persistente su SQLite con scadenza (TTL) e rimozione LRU.
+
+    Ogni voce è "fresca" fino a fresh_until e resta leggibile come "stale"
+    fino a expires_at, per le letture stale-while-revalidate.
+    """
+
+    def __init__(self, path: str, namespace: str, max_entries: int = 5000):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Una connessione condivisa tra thread, serializzata da self._lock;
+        # il file può essere usato anche da più processi (WAL)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    fresh_until REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(cache_entries)")]
+            if "fresh_until" not in columns:
+                self._conn.execute("ALTER TABLE cache_entries ADD COLUMN fresh_until REAL")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache_entries (namespace, last_access)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Calcola una chiave stabile a partire da valori serializzabili in JSON"""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Restituisce il valore in cache, o None se assente o non più fresco"""
+        entry = self.get_entry(key, allow_stale=False)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str, allow_stale: bool = True) -> Optional[Tuple[Any, bool]]:
+        """Restituisce (valore, is_stale), o None se la voce è assente o scaduta"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, COALESCE(fresh_until, expires_at), expires_at FROM cache_entries "
+                "WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+
+            is_stale = row is not None and row[1] < now
+            if row is None or row[2] < now or (is_stale and not allow_stale):
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            self._conn.commit()
+            if is_stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+
+        return json.loads(row[0]), is_stale
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0):
+        """Salva un valore fresco per ttl secondi e leggibile come stale per altri stale_ttl"""
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries "
+                "(namespace, key, value, created_at, expires_at, last_access, fresh_until) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, payload, now, now + ttl + stale_ttl, now, now + ttl)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Rimuove le voci scadute e quelle usate meno di recente oltre max_entries"""
+        self._conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?",
+            (self.namespace, time.time())
+        )
+
+        count = self._conn.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache_entries WHERE namespace = ? "
+                "ORDER BY last_access ASC LIMIT ?)",
+                (self.namespace, self.namespace, count - self.max_entries)
+            )
+
+    def clear(self):
+        """Svuota il namespace della cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori di hit/miss del processo e numero di voci salvate"""
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / total, 3) if total else 0.0,
+            "entries": entries
+        }
+
+
+# Famiglie di query Serper, riconosciute in ordine; la prima che corrisponde vince
+SERPER_QUERY_FAMILIES = [
+    ("social", re.compile(r"site:(facebook|instagram|linkedin|twitter|youtube|tiktok)\.com"
+                          r"|\b(facebook|instagram|linkedin|twitter|youtube|tiktok)\b")),
+    ("registry", re.compile(r"site:(registroimprese|ufficiocamerale|reportaziende)\.it"
+                            r"|partita iva|codice fiscale")),
+    ("financial", re.compile(r"fatturato|bilancio|dipendenti|capitale sociale")),
+    ("competitors", re.compile(r"competitor|concorrenti|alternative|aziende come")),
+]
+
+
+class SerperCache:
+    """Cache delle risposte Serper con TTL per famiglia di query"""
+
+    def __init__(self, cache: PersistentCache, ttls: Dict[str, float]):
+        self.cache = cache
+        self.ttls = ttls
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Normalizza la query: unicode NFKC, minuscolo, spazi compattati"""
+        query = unicodedata.normalize("NFKC", query or "")
+        return re.sub(r"\s+", " ", query).strip().lower()
+
+    @classmethod
+    def query_family(cls, query: str) -> str:
+        """Classifica la query per scegliere la durata della cache"""
+        normalized = cls.normalize_query(query)
+        for family, pattern in SERPER_QUERY_FAMILIES:
+            if pattern.search(normalized):
+                return family
+        return "default"
+
+    @classmethod
+    def request_key(cls, payload: Dict[str, Any], endpoint: str = "search") -> str:
+        """Chiave di cache: endpoint + query normalizzata + gl/hl/num e altri parametri"""
+        params = dict(payload)
+        params["q"] = cls.normalize_query(params.get("q", ""))
+        return PersistentCache.make_key(endpoint, params)
+
+    def get(self, payload: Dict[str, Any], endpoint: str = "search") -> Optional[Dict[str, Any]]:
+        """Risposta in cache per il payload (q, gl, hl, num, ...), se ancora valida"""
+        if response_cache_bypassed():
+            return None
+        return self.cache.get(self.request_key(payload, endpoint))
+
+    def set(self, payload: Dict[str, Any], data: Dict[str, Any], endpoint: str = "search"):
+        """Salva la risposta con il TTL della famiglia di query"""
+        if not isinstance(data, dict) or "error" in data:
+            return
+        family = self.query_family(payload.get("q", ""))
+        ttl = self.ttls.get(family, self.ttls.get("default", 0))
+        if ttl > 0:
+            self.cache.set(self.request_key(payload, endpoint), data, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori della cache Serper"""
+        return self.cache.stats()
+
+
+class SemrushCache:
+    """Cache dei report SEMRush con freschezza per tipo di report e stale-while-revalidate"""
+
+    # Parametri che identificano il report; key ed export_format sono esclusi
+    KEY_PARAMS = ("type", "domain", "target", "target_type", "database",
+                  "display_limit", "export_columns")
+
+    def __init__(self, cache: PersistentCache, ttls: Dict[str, float], stale_ttl: float):
+        self.cache = cache
+        self.ttls = ttls
+        self.stale_ttl = stale_ttl
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="semrush-refresh")
+
+    def _key(self, params: Dict[str, Any]) -> str:
+        """Chiave di cache: (type, domain/target, database, display_limit, colonne)"""
+        identity = {name: params.get(name) for name in self.KEY_PARAMS if params.get(name) is not None}
+        if "domain" in identity:
+            identity["domain"] = str(identity["domain"]).lower()
+        if "target" in identity:
+            identity["target"] = str(identity["target"]).lower()
+        return PersistentCache.make_key(identity)
+
+    def lookup(self, params: Dict[str, Any]) -> Tuple[Optional[Any], str]:
+        """Legge il report: restituisce (dati, stato) con stato fresh, stale o miss"""
+        if response_cache_bypassed():
+            return None, "miss"
+        entry = self.cache.get_entry(self._key(params))
+        if entry is None:
+            return None, "miss"
+        value, is_stale = entry
+        return value, "stale" if is_stale else "fresh"
+
+    def store(self, params: Dict[str, Any], data: Any):
+        """Salva il report con la freschezza prevista per il suo tipo"""
+        if isinstance(data, dict) and "error" in data:
+            return
+        report_type = params.get("type", "default")
+        ttl = self.ttls.get(report_type, self.ttls.get("default", 0))
+        if ttl > 0:
+            self.cache.set(self._key(params), data, ttl, self.stale_ttl)
+
+    def revalidate(self, params: Dict[str, Any], fetch: Callable[[], Any]):
+        """Aggiorna in background un report stale, una sola volta per chiave"""
+        key = self._key(params)
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.store(params, fetch())
+            except Exception:
+                pass  # Il valore stale resta disponibile fino alla scadenza
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori della cache SEMRush"""
+        return self.cache.stats()
+
+
+class CompletionCache:
+    """Cache content-addressed delle risposte OpenAI"""
+
+    def __init__(self, cache: PersistentCache, ttl: float):
+        self.cache = cache
+        self.ttl = ttl
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+            response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Hash di modello, prompt di sistema, prompt utente, temperature, max_tokens e formato di risposta"""
+        parts = [model, messages, float(temperature), int(max_tokens)]
+        if response_format:
+            # Le risposte in modalità JSON non sono intercambiabili con quelle libere
+            parts.append(response_format)
+        return PersistentCache.make_key(*parts)
+
+    def get(self, key: str) -> Optional[str]:
+        """Risposta salvata per la chiave, se presente"""
+        return self.cache.get(key)
+
+    def set(self, key: str, content: str):
+        """Salva il testo della risposta"""
+        if content and self.ttl > 0:
+            self.cache.set(key, content, self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori della cache OpenAI"""
+        return self.cache.stats()
+
+
+# Attivo mentre si ricalcola una sezione in modalità refresh: le risposte Serper e
+# SEMRush vengono richieste di nuovo (e salvate), senza leggere quelle in cache
+_bypass_responses: contextvars.ContextVar[bool] = contextvars.ContextVar("bypass_responses", default=False)
+
+
+@contextmanager
+def bypass_response_cache() -> Iterator[None]:
+    """Ignora le risposte Serper e SEMRush in cache per il blocco (le nuove vengono comunque salvate)"""
+    token = _bypass_responses.set(True)
+    try:
+        yield
+    finally:
+        _bypass_responses.reset(token)
+
+
+def response_cache_bypassed() -> bool:
+    return _bypass_responses.get()
+
+
+_caches_lock = threading.Lock()
+_serper_cache: Optional[SerperCache] = None
+_semrush_cache: Optional[SemrushCache] = None
+_completion_cache: Optional[CompletionCache] = None
+
+
+def get_serper_cache(app_config: Optional[AppConfig] = None) -> Optional[SerperCache]:
+    """Cache Serper di processo, o None se la cache è disabilitata"""
+    global _serper_cache
+    config = app_config or AppConfig()
+    if not config.cache_enabled:
+        return None
+
+    if _serper_cache is None:
+        with _caches_lock:
+            if _serper_cache is None:
+                cache = PersistentCache(
+                    os.path.join(config.cache_dir, "api_cache.sqlite3"),
+                    namespace="serper",
+                    max_entries=config.serper_cache_max_entries
+                )
+                _serper_cache = SerperCache(cache, config.serper_cache_ttls)
+    return _serper_cache
+
+
+def get_semrush_cache(app_config: Optional[AppConfig] = None) -> Optional[SemrushCache]:
+    """Cache SEMRush di processo, o None se la cache è disabilitata"""
+    global _semrush_cache
+    config = app_config or AppConfig()
+    if not config.cache_enabled:
+        return None
+
+    if _semrush_cache is None:
+        with _caches_lock:
+            if _semrush_cache is None:
+                cache = PersistentCache(
+                    os.path.join(config.cache_dir, "api_cache.sqlite3"),
+                    namespace="semrush",
+                    max_entries=config.semrush_cache_max_entries
+                )
+                _semrush_cache = SemrushCache(
+                    cache, config.semrush_cache_ttls, config.semrush_stale_ttl
+                )
+    return _semrush_cache
+
+
+def get_completion_cache(app_config: Optional[AppConfig] = None) -> Optional[CompletionCache]:
+    """Cache delle risposte OpenAI di processo, o None se la cache è disabilitata"""
+    global _completion_cache
+    config = app_config or AppConfig()
+    if not config.cache_enabled:
+        return None
+
+    if _completion_cache is None:
+        with _caches_lock:
+            if _completion_cache is None:
+                cache = PersistentCache(
+                    os.path.join(config.cache_dir, "llm_cache.sqlite3"),
+                    namespace="openai",
+                    max_entries=config.openai_cache_max_entries
+                )
+                _completion_cache = CompletionCache(cache, config.openai_cache_ttl)
+    return _completion_cache
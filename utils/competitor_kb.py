@@ -0,0 +1,180 @@
+"""
+Knowledge base dei competitor condivisa tra le analisi.
+
+Gli stessi competitor ricorrono tra i clienti di un settore: le loro schede
+(profilo, ricerca, dati aziendali, profili social, panoramica SEO) vengono
+salvate per dominio canonico, ciascuna con la propria data di aggiornamento,
+e gli agenti le leggono prima di chiamare Serper, SEMRush o OpenAI. Senza
+dominio la scheda è indicizzata per nome normalizzato.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import AppConfig
+from utils.entities import normalize_domain, normalize_name
+from utils.cache import response_cache_bypassed
+
+# Chiavi dei risultati di ripiego degli agenti (risposta AI non interpretabile)
+FALLBACK_KEYS = ("analysis_raw", "raw_analysis", "raw_text")
+
+
+def competitor_key(domain: str = "", name: str = "") -> str:
+    """Chiave della scheda: dominio canonico, o nome normalizzato se il dominio non è noto"""
+    domain = normalize_domain(domain)
+    if domain:
+        return domain
+    name = normalize_name(name)
+    return f"name:{name}" if name else ""
+
+
+def _storable(value: Any) -> bool:
+    """Solo i dati effettivamente trovati entrano nella knowledge base (niente errori o risultati vuoti)"""
+    if isinstance(value, dict):
+        if not value or "error" in value or any(key in value for key in FALLBACK_KEYS):
+            return False
+        # Profili costruiti su ricerche fallite o senza dati trovati
+        if value.get("search_results") == [] or value.get("data_found") is False:
+            return False
+        return True
+    if isinstance(value, list):
+        return bool(value)
+    return value is not None
+
+
+class CompetitorKnowledgeBase:
+    """Schede dei competitor su SQLite: una riga per (competitor, tipo di dato)"""
+
+    def __init__(self, path: str, max_age: Dict[str, float]):
+        self.path = path
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Una connessione condivisa tra thread, serializzata da self._lock (WAL per più processi)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS competitor_facts (
+                    key TEXT NOT NULL,
+                    facet TEXT NOT NULL,
+                    domain TEXT,
+                    name TEXT,
+                    display_name TEXT,
+                    value TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (key, facet)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_competitor_name ON competitor_facts (name, facet)")
+            self._conn.commit()
+
+    def get(self, facet: str, domain: str = "", name: str = "") -> Optional[Any]:
+        """Dato del competitor se presente e non scaduto; cerca per dominio, poi per nome.
+
+        Il ripiego per nome esclude le schede di altri domini: aziende omonime
+        (es. due "Rossi Srl") non devono scambiarsi i dati.
+        """
+        if response_cache_bypassed():
+            return None
+
+        max_age = self.max_age.get(facet, self.max_age.get("default", 0))
+        since = time.time() - max_age
+        key = competitor_key(domain)
+        name = normalize_name(name)
+
+        with self._lock:
+            row = None
+            if key:
+                row = self._conn.execute(
+                    "SELECT value FROM competitor_facts WHERE key = ? AND facet = ? AND updated_at >= ?",
+                    (key, facet, since)
+                ).fetchone()
+            if row is None and name:
+                row = self._conn.execute(
+                    "SELECT value FROM competitor_facts WHERE name = ? AND facet = ? AND updated_at >= ? "
+                    "AND (? = '' OR COALESCE(domain, '') IN ('', ?)) ORDER BY updated_at DESC LIMIT 1",
+                    (name, facet, since, key, key)
+                ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, facet: str, value: Any, domain: str = "", name: str = ""):
+        """Salva (o aggiorna) un dato del competitor"""
+        key = competitor_key(domain, name)
+        if not key or not _storable(value):
+            return
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO competitor_facts "
+                "(key, facet, domain, name, display_name, value, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, facet, normalize_domain(domain), normalize_name(name), name,
+                 json.dumps(value, ensure_ascii=False, default=str), time.time())
+            )
+            self._conn.commit()
+
+    def read_through(self, facet: str, fetch: Callable[[], Any], domain: str = "", name: str = "") -> Any:
+        """Dato dalla knowledge base, oppure fetch() salvandone il risultato"""
+        value = self.get(facet, domain, name)
+        if value is None:
+            value = fetch()
+            self.put(facet, value, domain, name)
+        return value
+
+    async def read_through_async(self, facet: str, fetch: Callable[[], Awaitable[Any]],
+                                 domain: str = "", name: str = "") -> Any:
+        """Versione awaitable di read_through (le query SQLite girano fuori dall'event loop)"""
+        value = await asyncio.to_thread(self.get, facet, domain, name)
+        if value is None:
+            value = await fetch()
+            await asyncio.to_thread(self.put, facet, value, domain, name)
+        return value
+
+    def profile(self, domain: str = "", name: str = "") -> Dict[str, Any]:
+        """Tutti i dati noti di un competitor, con la data di aggiornamento di ciascuno"""
+        key = competitor_key(domain, name)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT facet, value, updated_at FROM competitor_facts WHERE key = ?", (key,)
+            ).fetchall()
+        return {facet: {"value": json.loads(value), "updated_at": updated_at} for facet, value, updated_at in rows}
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori della knowledge base"""
+        with self._lock:
+            competitors = self._conn.execute("SELECT COUNT(DISTINCT key) FROM competitor_facts").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "competitors": competitors}
+
+
+_kb_lock = threading.Lock()
+_kb: Optional[CompetitorKnowledgeBase] = None
+
+
+def get_competitor_kb(app_config: Optional[AppConfig] = None) -> Optional[CompetitorKnowledgeBase]:
+    """Knowledge base dei competitor di processo, o None se disabilitata"""
+    global _kb
+    config = app_config or AppConfig()
+    if not config.competitor_kb_enabled:
+        return None
+
+    if _kb is None:
+        with _kb_lock:
+            if _kb is None:
+                _kb = CompetitorKnowledgeBase(config.competitor_kb_path, config.competitor_kb_max_age)
+    return _kb
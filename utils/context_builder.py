@@ -0,0 +1,187 @@
+"""
+Costruzione del contesto dei prompt LLM entro un budget di token.
+
+I risultati delle analisi vengono proiettati in una rappresentazione compatta:
+senza URL e campi di servizio delle API, senza snippet ripetuti e con liste e
+testi accorciati quanto basta perché le sezioni più importanti entrino nel budget.
+"""
+
+import json
+import math
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import OPENAI_MODEL
+
+# Campi di servizio o di presentazione che non portano informazione al modello
+NOISE_KEYS = {
+    "link", "url", "imageUrl", "thumbnailUrl", "favicon", "sitelinks", "searchParameters",
+    "credits", "cid", "raw_html", "error", "analysis_status", "stage_timings", "comprehensive_report",
+    "freshness", "entity_key"
+}
+
+# Campi URL che restano nel contesto, ridotti al dominio
+DOMAIN_KEYS = {"website", "domain", "site"}
+
+# Priorità delle chiavi dei risultati di analisi (più bassa = più importante)
+DEFAULT_PRIORITIES = {
+    "company_info": 0,
+    "company_analysis": 1,
+    "company_research": 1,
+    "seo_analysis": 2,
+    "semrush_analysis": 2,
+    "competitors_analysis": 3,
+    "serper_analysis": 3,
+    "social_analysis": 4
+}
+
+# Livelli di compattazione provati in ordine: (elementi per lista, caratteri per testo)
+SHRINK_LEVELS = [(10, 300), (5, 200), (3, 120), (2, 80), (1, 60)]
+
+# Stima senza tiktoken: JSON e testo italiano stanno intorno ai 3.5 caratteri per token
+CHARS_PER_TOKEN = 3.5
+
+# Testi più corti di così non vengono deduplicati (valori, nomi, keyword)
+DEDUPE_MIN_CHARS = 40
+
+_URL_RE = re.compile(r"^https?://", re.IGNORECASE)
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Encoding tiktoken del modello, o None se tiktoken non è disponibile"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+
+
+def count_tokens(text: str, model: str = OPENAI_MODEL) -> int:
+    """Conta i token del testo localmente (tiktoken se installato, altrimenti stima)"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _domain(url: str) -> str:
+    domain = _URL_RE.sub("", url).split("/")[0]
+    return domain[4:] if domain.startswith("www.") else domain
+
+
+def compact(value: Any, seen: Set[str], max_items: int = 10, max_chars: int = 300,
+            key: Optional[str] = None) -> Any:
+    """Proiezione compatta di un valore; None se non resta nulla di utile.
+
+    seen raccoglie i testi già inclusi, così gli snippet ripetuti compaiono una volta sola.
+    """
+    if isinstance(value, dict):
+        result = {}
+        for k, v in value.items():
+            if k in NOISE_KEYS:
+                continue
+            item = compact(v, seen, max_items, max_chars, k)
+            if item is not None:
+                result[k] = item
+        return result or None
+
+    if isinstance(value, (list, tuple)):
+        result = []
+        for v in value:
+            if len(result) >= max_items:
+                break
+            item = compact(v, seen, max_items, max_chars, key)
+            if item is not None:
+                result.append(item)
+        return result or None
+
+    if isinstance(value, str):
+        text = value.strip()
+        if not text or text == "N/A":
+            return None
+        if _URL_RE.match(text):
+            return _domain(text) if key in DOMAIN_KEYS else None
+        if len(text) >= DEDUPE_MIN_CHARS:
+            normalized = _normalize(text)
+            if normalized in seen:
+                return None
+            seen.add(normalized)
+        if len(text) > max_chars:
+            text = text[:max_chars].rstrip() + "…"
+        return text
+
+    return value
+
+
+def _render(label: str, value: Any) -> str:
+    return f"{label}: {json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)}"
+
+
+class ContextBuilder:
+    """Riempie un budget di token con sezioni compattate, in ordine di priorità"""
+
+    def __init__(self, budget_tokens: int, model: str = OPENAI_MODEL):
+        self.budget_tokens = budget_tokens
+        self.model = model
+        self.tokens_used = 0
+        self.omitted: List[str] = []  # Sezioni escluse per mancanza di budget
+        self._sections: List[Tuple[int, int, str, Any]] = []
+
+    def add(self, label: str, data: Any, priority: int = 0) -> "ContextBuilder":
+        """Aggiunge una sezione; a parità di priorità conta l'ordine di inserimento"""
+        self._sections.append((priority, len(self._sections), label, data))
+        return self
+
+    def build(self) -> str:
+        """Testo del contesto: ogni sezione usa il livello di dettaglio più alto che entra nel budget"""
+        seen: Set[str] = set()
+        lines = []
+        self.tokens_used = 0
+        self.omitted = []
+
+        for _, _, label, data in sorted(self._sections, key=lambda s: s[:2]):
+            remaining = self.budget_tokens - self.tokens_used
+            for max_items, max_chars in SHRINK_LEVELS:
+                section_seen = set(seen)
+                value = compact(data, section_seen, max_items, max_chars)
+                if value is None:
+                    break
+                line = _render(label, value)
+                tokens = count_tokens(line + "\n", self.model)
+                if tokens <= remaining:
+                    lines.append(line)
+                    seen = section_seen
+                    self.tokens_used += tokens
+                    break
+            else:
+                self.omitted.append(label)
+
+        return "\n".join(lines)
+
+
+def build_analysis_context(all_data: Dict[str, Any], budget_tokens: int,
+                           priorities: Optional[Dict[str, int]] = None,
+                           model: str = OPENAI_MODEL) -> str:
+    """Contesto compatto dei risultati di analisi, con le chiavi più importanti per prime"""
+    priorities = priorities or DEFAULT_PRIORITIES
+    lowest = max(priorities.values(), default=0) + 1
+
+    builder = ContextBuilder(budget_tokens, model)
+    for key, value in all_data.items():
+        if key not in NOISE_KEYS:
+            builder.add(key, value, priorities.get(key, lowest))
+    return builder.build()
@@ -1,9 +1,11 @@
 import json
-import pandas as pd
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
 import re
 from datetime import datetime
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 class DataProcessor:
     """Classe per processare e normalizzare i dati raccolti"""
     
@@ -146,8 +148,9 @@ class DataProcessor:
         return normalized
     
     @staticmethod
-    def create_competitor_matrix(competitors_data: List[Dict[str, Any]]) -> pd.DataFrame:
+    def create_competitor_matrix(competitors_data: List[Dict[str, Any]]) -> "pd.DataFrame":
         """Crea una matrice dei competitor per analisi comparativa"""
+        import pandas as pd  # Import pesante, caricato solo quando serve
         
         if not competitors_data:
             return pd.DataFrame()
@@ -414,6 +417,8 @@ class DataProcessor:
     def export_to_csv(data: List[Dict[str, Any]], filename: str) -> bool:
         """Esporta dati in formato CSV"""
         try:
+            import pandas as pd
+            
             df = pd.DataFrame(data)
             df.to_csv(filename, index=False, encoding='utf-8')
             return True
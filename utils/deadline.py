@@ -0,0 +1,157 @@
+"""
+Scadenza e cancellazione cooperativa di un'analisi.
+
+Una Deadline copre un'intera esecuzione; gli stage ricevono sotto-budget
+(child) che scadono al più tardi insieme alla scadenza padre. La scadenza
+corrente viaggia in un ContextVar: trasporto HTTP, retry, rate limiter e
+chiamate OpenAI la leggono con current_deadline() e accorciano i timeout,
+saltano le attese troppo lunghe e si interrompono se l'analisi è stata
+annullata. asyncio (task e to_thread) propaga il contesto da sé; per i
+thread avviati a mano si usa bind_deadline, che porta con sé l'intero contesto.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """Il budget di tempo dell'analisi (o dello stage) è esaurito"""
+
+
+class AnalysisCancelled(DeadlineExceeded):
+    """L'analisi è stata interrotta (utente, sessione chiusa o esecuzione conclusa)"""
+
+
+class Deadline:
+    """Scadenza con cancellazione cooperativa; seconds=None significa nessun limite di tempo.
+
+    I sotto-budget condividono la cancellazione con la scadenza da cui derivano:
+    annullarne uno annulla l'intera esecuzione.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional["Deadline"] = None,
+                 name: str = ""):
+        self.name = name
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        if parent is not None and parent.expires_at is not None:
+            self.expires_at = min(self.expires_at or parent.expires_at, parent.expires_at)
+        self._root = parent._root if parent is not None else self
+        self._cancelled = threading.Event() if parent is None else None
+        self.reason = ""
+
+    @property
+    def root(self) -> "Deadline":
+        """Scadenza dell'intera esecuzione da cui deriva questo (sotto-)budget"""
+        return self._root
+
+    def child(self, seconds: Optional[float] = None, name: str = "") -> "Deadline":
+        """Sotto-budget: scade dopo seconds, e comunque non oltre questa scadenza"""
+        return Deadline(seconds, self, name)
+
+    def cancel(self, reason: str = "Analisi interrotta"):
+        """Annulla l'esecuzione: i lavori in corso si fermano al prossimo controllo"""
+        root = self._root
+        if not root._cancelled.is_set():
+            root.reason = reason
+            root._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._root._cancelled.is_set()
+
+    def remaining(self) -> float:
+        """Secondi rimasti (inf senza limite, 0 se annullata)"""
+        if self.cancelled:
+            return 0.0
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        """Solleva AnalysisCancelled o DeadlineExceeded se il lavoro deve fermarsi"""
+        if self.cancelled:
+            raise AnalysisCancelled(self._root.reason)
+        if self.expired:
+            raise DeadlineExceeded(self._exhausted_message())
+
+    def timeout(self, default: Optional[float] = None) -> float:
+        """Timeout da usare per una chiamata: default limitato al tempo rimasto"""
+        self.check()
+        remaining = self.remaining()
+        return min(default, remaining) if default is not None else remaining
+
+    def _exhausted_message(self) -> str:
+        label = f" ({self.name})" if self.name else ""
+        return f"Tempo a disposizione esaurito{label}"
+
+    def root_reason(self) -> str:
+        """Motivo della cancellazione dell'esecuzione"""
+        return self._root.reason
+
+    def sleep(self, seconds: float):
+        """Attende seconds uscendo subito se l'analisi viene annullata; rifiuta attese oltre la scadenza"""
+        self.check()
+        if seconds > self.remaining():
+            raise DeadlineExceeded(self._exhausted_message())
+        self._root._cancelled.wait(seconds)
+        self.check()
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Scadenza dell'esecuzione in corso nel contesto corrente (None se non impostata)"""
+    return _current.get()
+
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Imposta la scadenza corrente per il blocco"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def bind_deadline(func: Callable) -> Callable:
+    """Lega func alla scadenza (e alle altre ContextVar) correnti, per eseguirla in un altro thread"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Una copia per chiamata: lo stesso Context non può essere attivo in due thread
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def check_deadline():
+    """Punto di controllo cooperativo: solleva se la scadenza corrente è esaurita o annullata"""
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check()
+
+
+def deadline_timeout(default: Optional[float]) -> Optional[float]:
+    """Timeout di una chiamata limitato dalla scadenza corrente (default se non c'è scadenza)"""
+    deadline = current_deadline()
+    return deadline.timeout(default) if deadline is not None else default
+
+
+def deadline_sleep(seconds: float):
+    """time.sleep che rispetta scadenza e cancellazione correnti"""
+    deadline = current_deadline()
+    if deadline is None:
+        time.sleep(seconds)
+    else:
+        deadline.sleep(seconds)
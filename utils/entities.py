@@ -0,0 +1,462 @@
+"""
+Risoluzione delle entità: da qualsiasi input (nome, URL, dominio, P.IVA) a
+un'azienda canonica con chiave stabile.
+
+Nomi, domini e P.IVA vengono normalizzati in modo deterministico (accenti,
+forma giuridica, maiuscole, www e percorsi); le corrispondenze note tra nome,
+dominio e P.IVA della stessa azienda sono salvate su SQLite come alias. Le
+varianti di scrittura della stessa azienda producono così gli stessi dati di
+partenza, le stesse query e le stesse chiavi di cache, e l'interpretazione
+dell'input con il modello serve solo per testi non riconoscibili.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+# Forme giuridiche rimosse dalla coda dei nomi (dopo la rimozione dei punti: "S.r.l." -> "srl")
+LEGAL_FORMS = {
+    ("srl",), ("srls",), ("spa",), ("snc",), ("sas",), ("sapa",), ("ss",), ("scarl",), ("scrl",),
+    ("scpa",), ("sc",), ("soc", "coop"), ("societa", "cooperativa"), ("cooperativa",), ("coop",),
+    ("societa", "a", "responsabilita", "limitata"), ("societa", "per", "azioni"),
+    ("ltd",), ("limited",), ("inc",), ("llc",), ("llp",), ("plc",), ("corp",), ("co",),
+    ("gmbh",), ("ag",), ("sa",), ("sarl",), ("sl",), ("bv",), ("nv",), ("c",), ("e", "c")
+}
+_MAX_FORM_TOKENS = max(len(form) for form in LEGAL_FORMS)
+
+# Colonne di un'azienda; il resto dei dati è salvato in JSON
+ENTITY_COLUMNS = ("key", "company_name", "domain", "vat")
+
+# Suffissi di dominio composti, da togliere interi quando si ricava un nome dal dominio
+COMPOUND_TLDS = ("co.uk", "com.au", "co.jp", "com.br", "co.nz", "org.uk")
+
+_DOMAIN_RE = re.compile(r"^(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,}$")
+_BARE_DOMAIN_RE = re.compile(r"^(?:www\.)?[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}(?:[/:?#]\S*)?$", re.IGNORECASE)
+_VAT_RE = re.compile(r"(?:\bIT\s*)?(\d[\d\s.-]{9,15}\d)", re.IGNORECASE)
+_URL_TOKEN_RE = re.compile(r"(?:https?://\S+|(?<![@\w])(?:www\.)?[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}(?:/\S*)?)",
+                           re.IGNORECASE)
+# Etichette che accompagnano P.IVA e siti negli input misti ("Acme S.r.l. - P.IVA ... - sito ...")
+_LABELS_RE = re.compile(r"\b(?:p\.?\s*iva|partita\s+iva|c\.?\s*f\.?|vat|sito(?:\s+web)?|web|website)\b\s*:?",
+                        re.IGNORECASE)
+
+
+def fold_accents(text: str) -> str:
+    """Testo senza accenti e segni diacritici ("Caffè" -> "Caffe")"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def is_valid_vat(digits: str) -> bool:
+    """Checksum della partita IVA italiana (11 cifre)"""
+    if len(digits) != 11 or not digits.isdigit():
+        return False
+    odd_sum = sum(int(digits[i]) for i in range(0, 10, 2))
+    even_sum = 0
+    for i in range(1, 10, 2):
+        double = int(digits[i]) * 2
+        even_sum += double if double < 10 else double - 9
+    return int(digits[10]) == (10 - (odd_sum + even_sum) % 10) % 10
+
+
+def normalize_vat(vat: Optional[str]) -> str:
+    """P.IVA italiana senza prefisso IT, spazi e separatori"""
+    if not vat:
+        return ""
+    digits = re.sub(r"\D", "", str(vat).upper().replace("IT", ""))
+    return digits if len(digits) == 11 else ""
+
+
+def normalize_domain(value: Optional[str]) -> str:
+    """Dominio canonico: minuscolo, senza schema, credenziali, porta, percorso, www e punto finale"""
+    if not value:
+        return ""
+    value = str(value).strip().lower()
+    if "://" not in value:
+        value = f"http://{value}"
+    try:
+        host = urlparse(value).hostname or ""
+    except ValueError:
+        return ""
+    host = host.rstrip(".")
+    for prefix in ("www.", "www2.", "m."):
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix):]
+            break
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    return host if _DOMAIN_RE.match(host) else ""
+
+
+def _name_tokens(name: str) -> List[str]:
+    folded = fold_accents(str(name)).lower().replace(".", "")
+    return re.sub(r"[^\w]+", " ", folded).split()
+
+
+def strip_legal_form(tokens: List[str]) -> List[str]:
+    """Toglie le forme giuridiche in coda ("acme srl" -> "acme"), senza svuotare il nome"""
+    tokens = list(tokens)
+    stripped = True
+    while stripped:
+        stripped = False
+        for size in range(min(_MAX_FORM_TOKENS, len(tokens) - 1), 0, -1):
+            if tuple(tokens[-size:]) in LEGAL_FORMS:
+                tokens = tokens[:-size]
+                stripped = True
+                break
+    return tokens
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Nome canonico: senza accenti, punteggiatura, maiuscole e forma giuridica"""
+    if not name:
+        return ""
+    return " ".join(strip_legal_form(_name_tokens(name)))
+
+
+def domain_to_company_name(domain: str) -> str:
+    """Nome plausibile ricavato dal dominio ("caffe-nero.co.uk" -> "Caffe Nero")"""
+    domain = normalize_domain(domain)
+    if not domain:
+        return ""
+    label = next((domain[:-len(tld) - 1] for tld in COMPOUND_TLDS if domain.endswith(f".{tld}")),
+                 domain.rsplit(".", 1)[0])
+    label = label.rsplit(".", 1)[-1]
+    return " ".join(part.capitalize() for part in re.split(r"[-_]+", label) if part)
+
+
+def find_vat(text: str) -> str:
+    """P.IVA valida contenuta nel testo ("P.IVA IT 04427770278"), o stringa vuota"""
+    for match in _VAT_RE.finditer(text or ""):
+        digits = re.sub(r"\D", "", match.group(1))
+        if is_valid_vat(digits):
+            return digits
+    return ""
+
+
+def parse_company_input(text: str) -> Tuple[str, Dict[str, Any]]:
+    """Interpretazione deterministica di un input: (tipo, dati) con tipo url, vat, name o invalid"""
+    text = (text or "").strip()
+    if len(text) < 2:
+        return "invalid", {}
+
+    if " " not in text and ("://" in text or _BARE_DOMAIN_RE.match(text)):
+        domain = normalize_domain(text)
+        if domain:
+            website = text if "://" in text else f"https://{text}"
+            return "url", {"website": website, "domain": domain,
+                           "company_name": domain_to_company_name(domain)}
+
+    # Input misti: il nome è ciò che resta tolti etichette, sito e P.IVA
+    rest = _LABELS_RE.sub(" ", text)
+    vat = find_vat(rest)
+    url_match = _URL_TOKEN_RE.search(rest)
+    domain = normalize_domain(url_match.group(0)) if url_match else ""
+    if domain:
+        rest = _URL_TOKEN_RE.sub(" ", rest)
+    if vat:
+        rest = _VAT_RE.sub(" ", rest)
+    name = " ".join(rest.split()).strip(" ,;:|/-–") if (vat or domain) else " ".join(text.split())
+
+    if vat and not name and not domain:
+        return "vat", {"vat_number": vat, "company_name": f"Azienda P.IVA {vat}"}
+
+    company_data = {"company_name": name or domain_to_company_name(domain) or f"Azienda P.IVA {vat}"}
+    if domain:
+        website = url_match.group(0)
+        company_data.update(website=website if "://" in website else f"https://{website}", domain=domain)
+    if vat:
+        company_data["vat_number"] = vat
+    return "name", company_data
+
+
+def entity_aliases(company_name: str = "", domain: str = "", vat: str = "",
+                   company_input: str = "") -> List[str]:
+    """Alias con cui un'azienda può essere cercata, dal più affidabile"""
+    aliases = []
+    if normalize_vat(vat):
+        aliases.append(f"vat:{normalize_vat(vat)}")
+    if normalize_domain(domain):
+        aliases.append(f"domain:{normalize_domain(domain)}")
+    if normalize_name(company_name):
+        aliases.append(f"name:{normalize_name(company_name)}")
+    if company_input:
+        aliases.append(f"input:{' '.join(fold_accents(company_input).lower().split())}")
+    return aliases
+
+
+# Chiave degli alias di nome condivisi da aziende diverse: non risolvono più nessuna azienda
+AMBIGUOUS = ""
+
+
+class EntityResolver:
+    """Aziende canoniche e alias (nome, dominio, P.IVA, input) su SQLite.
+
+    Registrare insieme più identificativi li collega alla stessa azienda: le
+    aziende già note per ciascuno vengono unite, salvo P.IVA o domini diversi
+    (in quel caso sono aziende distinte e le loro corrispondenze restano).
+    Gli alias di nome nascono solo da dati ufficiali (authoritative): un nome
+    digitato non identifica un'azienda, e un nome collegato ad aziende con
+    P.IVA o domini diversi diventa ambiguo e smette di risolvere.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Una connessione condivisa tra thread, serializzata da self._lock (WAL per più processi)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entities (
+                    key TEXT PRIMARY KEY,
+                    company_name TEXT,
+                    domain TEXT,
+                    vat TEXT,
+                    data TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entity_aliases (
+                    alias TEXT PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def _find_all(self, aliases: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Aziende distinte a cui puntano gli alias, con l'alias che le ha trovate, nell'ordine degli alias"""
+        found = {}
+        for alias in aliases:
+            row = self._conn.execute(
+                "SELECT e.key, e.company_name, e.domain, e.vat, e.data FROM entity_aliases a "
+                "JOIN entities e ON e.key = a.key WHERE a.alias = ?",
+                (alias,)
+            ).fetchone()
+            if row and row[0] not in found:
+                key, company_name, domain, vat, data = row
+                found[key] = (alias, {"key": key, "company_name": company_name, "domain": domain, "vat": vat,
+                                      **json.loads(data or "{}")})
+        return list(found.values())
+
+    def lookup(self, company_name: str = "", domain: str = "", vat: str = "",
+               company_input: str = "") -> Optional[Dict[str, Any]]:
+        """Azienda nota per uno degli identificativi indicati (P.IVA, poi dominio, nome, input)"""
+        aliases = entity_aliases(company_name, domain, vat, company_input)
+        with self._lock:
+            entities = self._find_all(aliases)
+            if entities:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entities[0][1] if entities else None
+
+    def register(self, company_name: str = "", domain: str = "", vat: str = "",
+                 company_input: str = "", authoritative: bool = False,
+                 alias_names: Tuple[str, ...] = (), **data: Any) -> str:
+        """Registra (o completa) un'azienda e i suoi alias; restituisce la chiave canonica.
+
+        Con authoritative (dati ufficiali verificati) nome, dominio e P.IVA
+        indicati sostituiscono quelli dell'azienda invece di completarli, e il
+        nome (con gli eventuali alias_names) diventa un alias di ricerca.
+        """
+        aliases = entity_aliases(company_name, domain, vat, company_input)
+        if authoritative:
+            aliases += [f"name:{normalize_name(name)}" for name in alias_names
+                        if normalize_name(name) and f"name:{normalize_name(name)}" not in aliases]
+        else:
+            aliases = [alias for alias in aliases if not alias.startswith("name:")]
+        if not aliases:
+            return ""
+        domain, vat = normalize_domain(domain), normalize_vat(vat)
+        now = time.time()
+
+        with self._lock:
+            key, known = None, {}
+            for alias, entity in self._find_all(aliases):
+                # P.IVA o dominio diversi: aziende distinte, anche se con lo stesso nome
+                if (domain and entity["domain"] and entity["domain"] != domain) or \
+                        (vat and entity["vat"] and entity["vat"] != vat):
+                    if alias.startswith("name:"):
+                        self._conn.execute("UPDATE entity_aliases SET key = ? WHERE alias = ?", (AMBIGUOUS, alias))
+                    continue
+
+                entity_data = {k: v for k, v in entity.items() if k not in ENTITY_COLUMNS}
+                if key is None:
+                    key = entity["key"]
+                    fields = [(entity[field], value) for field, value in
+                              (("company_name", company_name), ("domain", domain), ("vat", vat))]
+                    company_name, domain, vat = [(new or old) if authoritative else (old or new)
+                                                 for old, new in fields]
+                    known = {**entity_data, **data} if authoritative else {**data, **entity_data}
+                    continue
+
+                # Un'altra azienda compatibile trovata per un alias diverso: è la stessa, si uniscono
+                company_name = company_name or entity["company_name"]
+                domain, vat = domain or entity["domain"], vat or entity["vat"]
+                known = {**entity_data, **known}
+                self._conn.execute("UPDATE entity_aliases SET key = ? WHERE key = ?", (key, entity["key"]))
+                self._conn.execute("DELETE FROM entities WHERE key = ?", (entity["key"],))
+
+            if key is None:
+                taken = {row[0] for row in self._conn.execute(
+                    f"SELECT key FROM entities WHERE key IN ({', '.join('?' * len(aliases))})", aliases
+                )}
+                key = next((alias for alias in aliases if alias not in taken), f"{aliases[0]}#{now:.6f}")
+                self._conn.execute(
+                    "INSERT INTO entities (key, company_name, domain, vat, data, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, company_name, domain, vat, json.dumps(data, ensure_ascii=False, default=str), now)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE entities SET company_name = ?, domain = ?, vat = ?, data = ?, updated_at = ? "
+                    "WHERE key = ?",
+                    (company_name, domain, vat, json.dumps(known, ensure_ascii=False, default=str), now, key)
+                )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO entity_aliases (alias, key, updated_at) VALUES (?, ?, ?)",
+                [(alias, key, now) for alias in aliases]
+            )
+            self._conn.commit()
+        return key
+
+    def resolve_input(self, company_input: str) -> Tuple[bool, str, Dict[str, Any]]:
+        """Come InputValidator.validate_company_input, completato con l'azienda canonica se nota.
+
+        Un input già visto, o che corrisponde per nome ufficiale, dominio o
+        P.IVA a un'azienda nota, restituisce il nome, il dominio e la P.IVA
+        canonici: le varianti di scrittura producono gli stessi dati di partenza.
+        Un nome digitato da solo non viene registrato: non identifica l'azienda.
+        """
+        input_type, company_data = parse_company_input(company_input)
+        if input_type == "invalid":
+            return False, input_type, {}
+
+        entity = self.lookup(
+            company_name=company_data.get("company_name", "") if input_type == "name" else "",
+            domain=company_data.get("domain", ""),
+            vat=company_data.get("vat_number", ""),
+            company_input=company_input
+        )
+        if entity is None:
+            if company_data.get("domain") or company_data.get("vat_number"):
+                self.register(
+                    company_name=company_data["company_name"] if input_type == "name" else "",
+                    domain=company_data.get("domain", ""), vat=company_data.get("vat_number", ""),
+                    company_input=company_input
+                )
+            return True, input_type, company_data
+
+        resolved = dict(company_data, entity_key=entity["key"])
+        if entity["company_name"]:
+            resolved["company_name"] = entity["company_name"]
+        if entity["domain"]:
+            resolved["domain"] = entity["domain"]
+            resolved.setdefault("website", f"https://{entity['domain']}")
+        if entity["vat"]:
+            resolved["vat_number"] = entity["vat"]
+        return True, input_type, resolved
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori della risoluzione"""
+        with self._lock:
+            entities = self._conn.execute("SELECT COUNT(*) FROM entities").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entities": entities}
+
+
+_resolver_lock = threading.Lock()
+_resolver: Optional[EntityResolver] = None
+
+
+def get_entity_resolver(app_config: Optional[AppConfig] = None) -> Optional[EntityResolver]:
+    """Risolutore delle entità di processo, o None se disabilitato"""
+    global _resolver
+    config = app_config or AppConfig()
+    if not config.entity_resolution_enabled:
+        return None
+
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = EntityResolver(config.entity_store_path)
+    return _resolver
+
+
+def resolve_company_input(company_input: str,
+                          app_config: Optional[AppConfig] = None) -> Tuple[bool, str, Dict[str, Any]]:
+    """Interpreta un input usando le aziende note, senza archivio se la risoluzione è disabilitata"""
+    try:
+        resolver = get_entity_resolver(app_config)
+        if resolver is not None:
+            return resolver.resolve_input(company_input)
+    except sqlite3.Error as e:
+        logger.warning(f"Archivio entità non disponibile: {str(e)}")
+    input_type, company_data = parse_company_input(company_input)
+    return input_type != "invalid", input_type, company_data
+
+
+def register_company(company_data: Dict[str, Any], app_config: Optional[AppConfig] = None,
+                     company_input: str = "", authoritative: bool = False,
+                     alias_names: Tuple[str, ...] = ()) -> str:
+    """Collega nome, sito e P.IVA di un'azienda nell'archivio entità (chiave canonica, "" se non salvata)"""
+    name = company_data.get("company_name") or ""
+    if name.startswith("Azienda P.IVA"):
+        name = ""
+    try:
+        resolver = get_entity_resolver(app_config)
+        if resolver is None:
+            return ""
+        return resolver.register(
+            company_name=name,
+            domain=company_data.get("domain") or company_data.get("website") or "",
+            vat=company_data.get("vat_number") or company_data.get("vat") or "",
+            company_input=company_input, authoritative=authoritative, alias_names=alias_names
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Archivio entità non disponibile: {str(e)}")
+        return ""
+
+
+def known_interpretation(company_input: str, app_config: Optional[AppConfig] = None) -> Optional[Dict[str, Any]]:
+    """Interpretazione dell'input già ottenuta dal modello in passato, se presente"""
+    try:
+        resolver = get_entity_resolver(app_config)
+        entity = resolver.lookup(company_input=company_input) if resolver else None
+    except sqlite3.Error as e:
+        logger.warning(f"Archivio entità non disponibile: {str(e)}")
+        return None
+    return (entity or {}).get("interpretation")
+
+
+def remember_interpretation(company_input: str, interpretation: Dict[str, Any],
+                            app_config: Optional[AppConfig] = None):
+    """Salva l'interpretazione del modello come alias dell'input (senza promuoverla a nome canonico)"""
+    try:
+        resolver = get_entity_resolver(app_config)
+        if resolver is not None:
+            resolver.register(vat=find_vat(company_input), company_input=company_input,
+                              interpretation=interpretation)
+    except sqlite3.Error as e:
+        logger.warning(f"Archivio entità non disponibile: {str(e)}")
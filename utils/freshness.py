@@ -0,0 +1,80 @@
+"""
+Freshness delle sezioni dei risultati di analisi.
+
+Ogni sezione salvata nei risultati è accompagnata dal fingerprint degli input
+da cui è stata calcolata e dall'ora dell'aggiornamento (results["freshness"]).
+In modalità refresh una sezione viene riusata se il fingerprint coincide e non
+è più vecchia della sua durata massima; altrimenti viene ricalcolata. Le sezioni
+che contengono errori (anche annidati, es. ricerche Serper fallite) non vengono
+marcate né riusate.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+FRESHNESS_KEY = "freshness"
+
+
+def fingerprint(inputs: Any) -> str:
+    """Impronta stabile degli input di una sezione"""
+    raw = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def has_errors(value: Any) -> bool:
+    """True se i dati contengono un marcatore di errore, anche annidato"""
+    if isinstance(value, dict):
+        return "error" in value or any(has_errors(item) for item in value.values())
+    if isinstance(value, list):
+        return any(has_errors(item) for item in value)
+    return False
+
+
+def stamp(results: Dict[str, Any], section: str, section_fingerprint: str,
+          fetched_at: Optional[datetime] = None):
+    """Registra fingerprint e ora di aggiornamento di una sezione"""
+    results.setdefault(FRESHNESS_KEY, {})[section] = {
+        "fingerprint": section_fingerprint,
+        "fetched_at": (fetched_at or datetime.now()).isoformat()
+    }
+
+
+def section_state(results: Optional[Dict[str, Any]], section: str, section_fingerprint: str,
+                  max_age: Optional[float] = None, now: Optional[datetime] = None) -> str:
+    """Stato di una sezione: fresh, stale (troppo vecchia), changed (input diversi), failed o missing"""
+    entry = (results or {}).get(FRESHNESS_KEY, {}).get(section)
+    if not entry or section not in results:
+        return "missing"
+    if has_errors(results[section]):
+        return "failed"
+    if entry.get("fingerprint") != section_fingerprint:
+        return "changed"
+    if max_age is not None and age_seconds(results, section, now) > max_age:
+        return "stale"
+    return "fresh"
+
+
+def age_seconds(results: Dict[str, Any], section: str, now: Optional[datetime] = None) -> float:
+    """Secondi trascorsi dall'aggiornamento della sezione (inf se sconosciuto)"""
+    entry = results.get(FRESHNESS_KEY, {}).get(section) or {}
+    try:
+        fetched_at = datetime.fromisoformat(entry["fetched_at"])
+    except (KeyError, TypeError, ValueError):
+        return float("inf")
+    return ((now or datetime.now()) - fetched_at).total_seconds()
+
+
+def reusable_sections(previous: Optional[Dict[str, Any]], fingerprints: Dict[str, str],
+                      max_ages: Dict[str, float], refresh: Iterable[str] = ()) -> set:
+    """Sezioni dei risultati precedenti ancora valide, escluse quelle da aggiornare comunque"""
+    if not previous:
+        return set()
+    forced = set(refresh)
+    return {
+        section for section, section_fingerprint in fingerprints.items()
+        if section not in forced
+        and section_state(previous, section, section_fingerprint,
+                          max_ages.get(section, max_ages.get("default"))) == "fresh"
+    }
@@ -0,0 +1,94 @@
+"""
+Richieste hedged per le chiamate idempotenti con latenza di coda elevata.
+
+Se una richiesta non ha risposto entro il percentile configurato delle latenze
+recenti dello stesso endpoint, ne parte un duplicato e vince la prima risposta.
+Ogni duplicato consuma un token del rate limit del provider (senza attendere:
+se il bucket è vuoto il duplicato non parte) e la quota di richieste duplicate
+è limitata a max_ratio delle richieste hedgeable, così il consumo di quota
+cresce di pochi punti percentuali.
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """Latenze recenti (in secondi) per chiave, su una finestra scorrevole"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self._samples[key] = samples
+            samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, percentile: float) -> Optional[float]:
+        """Percentile (0-100) delle latenze della chiave, None senza campioni"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(percentile / 100 * len(samples)) - 1))
+        return samples[index]
+
+
+class HedgePolicy:
+    """Quando e quanto duplicare le richieste idempotenti lente"""
+
+    def __init__(self, percentile: float = 95, min_samples: int = 20, min_delay: float = 0.3,
+                 max_ratio: float = 0.1, window: int = 200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.latencies = LatencyTracker(window)
+        self.eligible = 0  # Richieste hedgeable inviate
+        self.sent = 0  # Duplicati inviati
+        self.won = 0  # Duplicati che hanno risposto prima dell'originale
+        self._lock = threading.Lock()
+
+    def delay(self, key: str) -> Optional[float]:
+        """Secondi dopo cui duplicare una richiesta della chiave (None se i campioni non bastano)"""
+        if self.latencies.count(key) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latencies.percentile(key, self.percentile))
+
+    def start(self):
+        """Registra una richiesta hedgeable"""
+        with self._lock:
+            self.eligible += 1
+
+    def reserve(self) -> bool:
+        """Prenota un duplicato se la quota max_ratio lo consente"""
+        with self._lock:
+            if self.sent + 1 > self.max_ratio * self.eligible:
+                return False
+            self.sent += 1
+            return True
+
+    def release(self):
+        """Annulla una prenotazione non usata (es. rate limit esaurito)"""
+        with self._lock:
+            self.sent -= 1
+
+    def record_win(self):
+        with self._lock:
+            self.won += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Contatori per la diagnostica"""
+        with self._lock:
+            return {"eligible": self.eligible, "sent": self.sent, "won": self.won}
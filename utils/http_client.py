@@ -0,0 +1,330 @@
+import asyncio
+import functools
+import hashlib
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, Optional, TYPE_CHECKING
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import AppConfig
+from utils.retry import CircuitBreakers, CircuitOpenError, is_server_failure
+from utils.cache import response_cache_bypassed
+from utils.deadline import Deadline, bind_deadline, current_deadline, deadline_timeout
+from utils.hedging import HedgePolicy
+
+if TYPE_CHECKING:
+    # openai è pesante da importare: viene caricato alla creazione del primo client
+    from openai import OpenAI, AsyncOpenAI
+
+
+class _InFlightCall:
+    """Chiamata in corso condivisa tra più richiedenti"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _shareable(result: Any) -> bool:
+    """True se il risultato può essere riusato dalle ripetizioni (no errori HTTP o dell'API)"""
+    if isinstance(result, dict):
+        return "error" not in result
+    status_code = getattr(result, "status_code", None)  # requests.Response
+    return not isinstance(status_code, int) or status_code < 400
+
+
+class SingleFlight:
+    """Unisce chiamate identiche: la prima esegue, le altre attendono e ne condividono il risultato.
+
+    Con window > 0 un risultato riuscito resta condiviso anche per le ripetizioni
+    successive nella stessa analisi (la scadenza corrente), per al più window
+    secondi. Fuori da un'analisi, e in modalità refresh, vengono unite solo le
+    chiamate contemporanee.
+    """
+
+    def __init__(self, window: float = 0):
+        self.window = window
+        self.shared = 0  # Chiamate evitate perché unite a un'altra
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+        # key -> (scadenza, analisi, risultato)
+        self._done: Dict[Hashable, tuple] = {}
+
+    def _memo_scope(self) -> Optional[Deadline]:
+        """Analisi a cui sono legati i risultati memorizzati, o None se la memoria non si applica"""
+        deadline = current_deadline()
+        if self.window <= 0 or deadline is None or response_cache_bypassed():
+            return None
+        return deadline.root
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Esegue fn una sola volta per tutte le chiamate contemporanee con la stessa chiave"""
+        scope = self._memo_scope()
+        with self._lock:
+            done = self._done.get(key)
+            if scope is not None and done and done[1] is scope and done[0] > time.monotonic():
+                self.shared += 1
+                return done[2]
+
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                if scope is not None and call.error is None and _shareable(call.result):
+                    now = time.monotonic()
+                    # Le voci di analisi concluse (scadenza annullata o esaurita) non servono più
+                    self._done = {k: v for k, v in self._done.items() if v[0] > now and not v[1].expired}
+                    self._done[key] = (now + self.window, scope, call.result)
+            call.event.set()
+
+        return call.result
+
+
+def request_key(method: str, url: str, **kwargs) -> str:
+    """Chiave che identifica una richiesta HTTP (metodo, URL, parametri, body e header)"""
+    raw = json.dumps(
+        [method.upper(), url, kwargs.get("params"), kwargs.get("json"), kwargs.get("data"),
+         kwargs.get("headers")],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class HTTPTransport:
+    """Trasporto HTTP condiviso con connection pool keep-alive e circuit breaker per host.
+
+    Con hedge_policy le richieste marcate come hedgeable vengono duplicate
+    quando superano il percentile di latenza del loro endpoint.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 16,
+                 coalesce_window: float = 0,
+                 breakers: Optional[CircuitBreakers] = None, default_timeout: float = 30,
+                 hedge_policy: Optional[HedgePolicy] = None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.default_timeout = default_timeout
+        self.single_flight = SingleFlight(coalesce_window)
+        self.breakers = breakers or CircuitBreakers()
+        self.hedge_policy = hedge_policy
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+
+        # Un pool per host (fino a pool_connections host), pool_maxsize connessioni ciascuno
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, coalesce: bool = False, hedge: Optional[str] = None,
+                hedge_budget: Optional[Callable[[], bool]] = None, **kwargs) -> requests.Response:
+        """Effettua una richiesta riutilizzando le connessioni aperte.
+
+        Con coalesce=True le richieste identiche in corso (o ripetute nella stessa
+        analisi, entro la finestra di coalescing) condividono un'unica chiamata di
+        rete; le risposte di errore (4xx/5xx) non vengono riusate dalle ripetizioni.
+        Se il circuito dell'host è aperto solleva CircuitOpenError senza inviare nulla.
+        Il timeout (default_timeout se assente) è limitato dalla scadenza dell'analisi
+        corrente, e nessuna richiesta parte a scadenza esaurita o analisi annullata.
+
+        hedge marca la richiesta come idempotente e indica la chiave delle sue
+        latenze (es. "serper:search"): se il trasporto ha una hedge_policy, una
+        richiesta lenta viene duplicata e vince la prima risposta. hedge_budget
+        preleva un token di rate limit senza attendere (False: niente duplicato).
+        """
+        kwargs["timeout"] = deadline_timeout(kwargs.get("timeout") or self.default_timeout)
+        breaker = self.breakers.for_url(url)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Host {urlparse(url).netloc} temporaneamente escluso dopo errori ripetuti")
+
+        def send() -> requests.Response:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if is_server_failure(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                raise
+            if is_server_failure(response=response):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+
+        if hedge and self.hedge_policy is not None:
+            send = functools.partial(self._hedged, send, hedge, hedge_budget)
+
+        if not coalesce:
+            return send()
+
+        return self.single_flight.do(request_key(method, url, **kwargs), send)
+
+    def _hedged(self, send: Callable[[], requests.Response], key: str,
+                budget: Optional[Callable[[], bool]]) -> requests.Response:
+        """Invia la richiesta e, se supera il ritardo di hedging, un duplicato: vince la prima risposta valida"""
+        policy = self.hedge_policy
+        policy.start()
+
+        def timed_send() -> requests.Response:
+            started = time.monotonic()
+            response = send()
+            if not is_server_failure(response=response):
+                policy.latencies.record(key, time.monotonic() - started)
+            return response
+
+        delay = policy.delay(key)
+        if delay is None:
+            return timed_send()
+
+        executor = self._get_hedge_executor()
+        primary = executor.submit(bind_deadline(timed_send))
+        done, _ = wait([primary], timeout=delay)
+        if done or not policy.reserve():
+            return primary.result()
+        if budget is not None and not budget():
+            policy.release()
+            return primary.result()
+
+        hedge = executor.submit(bind_deadline(timed_send))
+        pending = {primary, hedge}
+        outcome = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None and not is_server_failure(response=future.result()):
+                    if future is hedge:
+                        policy.record_win()
+                    for loser in pending:
+                        loser.add_done_callback(_close_response)
+                    return future.result()
+                outcome = future
+
+        return outcome.result()
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        if self._hedge_executor is None:
+            with _lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=self.pool_maxsize, thread_name_prefix="hedge"
+                    )
+        return self._hedge_executor
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Richiesta GET sul trasporto condiviso"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Richiesta POST sul trasporto condiviso"""
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """Chiude tutte le connessioni del pool"""
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        self.session.close()
+
+
+def _close_response(future):
+    """Rilascia la connessione della risposta scartata di una richiesta hedged"""
+    if future.exception() is None:
+        future.result().close()
+
+
+_lock = threading.RLock()
+_transport: Optional[HTTPTransport] = None
+_openai_clients: Dict[str, "OpenAI"] = {}
+# I client asincroni sono legati all'event loop in cui aprono le connessioni
+_async_openai_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_transport(app_config: Optional[AppConfig] = None) -> HTTPTransport:
+    """Restituisce il trasporto HTTP di processo.
+
+    La configurazione dei pool viene letta alla prima chiamata; usare
+    configure_transport per cambiarla in seguito.
+    """
+    global _transport
+    if _transport is None:
+        with _lock:
+            if _transport is None:
+                _transport = _build_transport(app_config or AppConfig())
+    return _transport
+
+
+def configure_transport(app_config: AppConfig) -> HTTPTransport:
+    """Ricrea il trasporto di processo con le dimensioni dei pool indicate"""
+    global _transport
+    with _lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = _build_transport(app_config)
+    return _transport
+
+
+def _build_transport(config: AppConfig) -> HTTPTransport:
+    return HTTPTransport(
+        config.http_pool_connections, config.http_pool_maxsize, config.coalesce_window,
+        breakers=CircuitBreakers(config.breaker_failure_threshold, config.breaker_reset_timeout),
+        default_timeout=config.timeout,
+        hedge_policy=HedgePolicy(
+            config.hedge_percentile, config.hedge_min_samples, config.hedge_min_delay,
+            config.hedge_max_ratio
+        ) if config.hedge_enabled else None
+    )
+
+
+def get_openai_client(api_key: str) -> "OpenAI":
+    """Client OpenAI condiviso da agenti e app per la stessa API key"""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(api_key)
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=api_key)
+                _openai_clients[api_key] = client
+    return client
+
+
+def get_async_openai_client(api_key: str) -> "AsyncOpenAI":
+    """Client OpenAI asincrono condiviso all'interno dell'event loop corrente"""
+    loop = asyncio.get_running_loop()
+    clients = _async_openai_clients.get(loop)
+    if clients is None:
+        clients = {}
+        _async_openai_clients[loop] = clients
+
+    client = clients.get(api_key)
+    if client is None:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=api_key)
+        clients[api_key] = client
+    return client
@@ -0,0 +1,136 @@
+import json
+from typing import Any, Callable, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JSONStreamAssembler:
+    """Ricompone un JSON ricevuto a pezzi (streaming) e ne espone versioni parziali.
+
+    Lo stato della scansione (contenitori aperti, stringa in corso) viene
+    aggiornato a ogni chunk, così partial() chiude il testo ricevuto finora
+    senza riscandirlo. Il testo prima della prima { o [ (es. ```json) è ignorato.
+    """
+
+    # Punti di taglio conservati per ripiegare su un prefisso valido
+    MAX_CUTS = 8
+
+    def __init__(self):
+        self.text = ""
+        self._start = -1  # Indice della prima { o [
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._done = False
+        # (indice, contenitori aperti): prefissi che terminano a un confine di valore
+        self._cuts: List[Tuple[int, Tuple[str, ...]]] = []
+
+    def feed(self, chunk: str) -> "JSONStreamAssembler":
+        """Aggiunge un pezzo di testo ricevuto"""
+        self.text += chunk
+        self._scan()
+        return self
+
+    def _scan(self):
+        text = self.text
+        while self._pos < len(text) and not self._done:
+            char = text[self._pos]
+
+            if self._start < 0:
+                if char in _CLOSERS:
+                    self._start = self._pos
+                    self._stack.append(char)
+                    self._add_cut(self._pos + 1)
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(char)
+                self._add_cut(self._pos + 1)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if not self._stack:
+                    self._done = True  # Fine del documento JSON
+            elif char == ",":
+                self._add_cut(self._pos)
+
+            self._pos += 1
+
+    def _add_cut(self, index: int):
+        self._cuts.append((index, tuple(self._stack)))
+        if len(self._cuts) > self.MAX_CUTS:
+            del self._cuts[0]
+
+    @property
+    def complete(self) -> bool:
+        """True quando il documento JSON è stato chiuso"""
+        return self._done
+
+    def partial(self) -> Optional[Any]:
+        """Valore del JSON ricevuto finora, chiudendo stringhe e contenitori aperti"""
+        if self._start < 0:
+            return None
+        if self._done:
+            try:
+                return self.result()
+            except ValueError:
+                return None
+
+        body = self.text[self._start:self._pos]
+        if self._escape:
+            body = body[:-1]
+        candidate = body + ('"' if self._in_string else "") + self._closing(self._stack)
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+
+        # Valore troncato (numero, letterale, chiave senza valore): ripiega sull'ultimo confine valido
+        for index, stack in reversed(self._cuts):
+            try:
+                return json.loads(self.text[self._start:index] + self._closing(stack))
+            except ValueError:
+                continue
+        return None
+
+    def document(self) -> str:
+        """Testo del documento JSON, senza il testo che lo precede o lo segue"""
+        if self._start < 0:
+            return ""
+        end = self._pos if self._done else len(self.text)
+        return self.text[self._start:end]
+
+    def result(self) -> Any:
+        """Valore finale; solleva ValueError se il JSON non è valido"""
+        if self._start < 0:
+            raise ValueError("Nessun JSON nel testo ricevuto")
+        return json.loads(self.document())
+
+    @staticmethod
+    def _closing(stack) -> str:
+        return "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def partial_json_callback(on_partial: Callable[[Any], None]) -> Callable[[str], None]:
+    """Adatta un callback sui valori JSON parziali a un callback sui token dello streaming"""
+    assembler = JSONStreamAssembler()
+    last = [None]
+
+    def on_token(delta: str):
+        value = assembler.feed(delta).partial()
+        if value is not None and value != last[0]:
+            last[0] = value
+            on_partial(value)
+
+    return on_token
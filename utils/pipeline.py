@@ -0,0 +1,189 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.deadline import Deadline, use_deadline
+
+
+@dataclass
+class Stage:
+    """Stage della pipeline: func riceve i risultati degli stage da cui dipende"""
+    name: str
+    func: Callable[[Dict[str, Any]], Any]
+    depends_on: Tuple[str, ...] = ()
+    label: str = ""
+    allow_partial: bool = False  # Esegue lo stage anche se qualche dipendenza è fallita
+
+
+@dataclass
+class StageResult:
+    """Esito e tempi di esecuzione di uno stage"""
+    name: str
+    value: Any = None
+    error: Optional[str] = None
+    skipped: bool = False
+    started_at: float = 0.0
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.skipped
+
+
+@dataclass
+class PipelineRun:
+    """Risultati di tutti gli stage di un'esecuzione"""
+    results: Dict[str, StageResult] = field(default_factory=dict)
+    total_duration: float = 0.0
+
+    def value(self, name: str, default: Any = None) -> Any:
+        """Valore prodotto dallo stage, o default se non è andato a buon fine"""
+        result = self.results.get(name)
+        return result.value if result and result.ok else default
+
+    def timings(self) -> Dict[str, float]:
+        """Durata in secondi di ogni stage eseguito"""
+        return {name: round(r.duration, 2) for name, r in self.results.items() if not r.skipped}
+
+
+class StagePipeline:
+    """Esegue un grafo di stage: ogni stage parte appena le sue dipendenze sono pronte.
+
+    Gli stage indipendenti girano in parallelo su un pool di thread; le callback
+    di avanzamento vengono invocate dal thread chiamante (necessario per Streamlit).
+    Se una dipendenza fallisce, gli stage che ne dipendono vengono saltati
+    (salvo allow_partial, in cui ricevono None al posto del valore mancante).
+
+    Con una deadline ogni stage gira con un sotto-budget (stage_budgets, per nome
+    o "default") impostato come scadenza corrente; uno stage che lo supera viene
+    abbandonato come fallito, e a scadenza esaurita (o annullata) run restituisce
+    subito i risultati parziali senza attendere i thread ancora in corso.
+    """
+
+    # Intervallo con cui il ciclo di attesa controlla scadenze e cancellazione
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, stages: List[Stage], max_workers: Optional[int] = None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers or max(1, len(stages))
+        self._validate()
+
+    def _validate(self):
+        """Verifica che le dipendenze esistano e che il grafo non abbia cicli"""
+        for stage in self.stages.values():
+            for dep in stage.depends_on:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' dipende da '{dep}' che non esiste")
+
+        visiting, visited = set(), set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Ciclo nelle dipendenze che coinvolge lo stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def run(self, on_stage_start: Optional[Callable[[Stage], None]] = None,
+            on_stage_done: Optional[Callable[[Stage, StageResult], None]] = None,
+            deadline: Optional[Deadline] = None,
+            stage_budgets: Optional[Dict[str, float]] = None) -> PipelineRun:
+        """Esegue tutti gli stage rispettando le dipendenze"""
+        run = PipelineRun()
+        pending = dict(self.stages)
+        running: Dict[Future, Stage] = {}
+        stage_deadlines: Dict[Future, Tuple[Deadline, float]] = {}
+        stage_budgets = stage_budgets or {}
+        start = time.time()
+
+        def execute(stage: Stage, inputs: Dict[str, Any], stage_deadline: Optional[Deadline]) -> StageResult:
+            result = StageResult(stage.name, started_at=time.time())
+            try:
+                with use_deadline(stage_deadline):
+                    result.value = stage.func(inputs)
+            except Exception as e:
+                result.error = str(e)
+            result.duration = time.time() - result.started_at
+            return result
+
+        def abandon(future: Future, error: str):
+            stage = running.pop(future)
+            started_at = stage_deadlines.pop(future)[1]
+            result = StageResult(stage.name, error=error, started_at=started_at,
+                                 duration=time.time() - started_at)
+            run.results[stage.name] = result
+            if on_stage_done:
+                on_stage_done(stage, result)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or running:
+                if deadline is not None and deadline.expired:
+                    # Budget esaurito o analisi annullata: si chiude con i risultati disponibili
+                    error = deadline.root_reason() if deadline.cancelled else "Tempo a disposizione esaurito"
+                    for future in list(running):
+                        abandon(future, error)
+                    for name, stage in pending.items():
+                        result = StageResult(name, skipped=True, error=error)
+                        run.results[name] = result
+                        if on_stage_done:
+                            on_stage_done(stage, result)
+                    pending.clear()
+                    break
+
+                # Avvia (o salta) gli stage le cui dipendenze sono concluse
+                for name, stage in list(pending.items()):
+                    if not all(dep in run.results for dep in stage.depends_on):
+                        continue
+                    del pending[name]
+
+                    failed = [dep for dep in stage.depends_on if not run.results[dep].ok]
+                    if failed and not stage.allow_partial:
+                        result = StageResult(name, skipped=True,
+                                             error=f"Dipendenze non disponibili: {', '.join(failed)}")
+                        run.results[name] = result
+                        if on_stage_done:
+                            on_stage_done(stage, result)
+                        continue
+
+                    inputs = {dep: run.value(dep) for dep in stage.depends_on}
+                    stage_deadline = None
+                    if deadline is not None:
+                        stage_deadline = deadline.child(stage_budgets.get(name, stage_budgets.get("default")), name)
+                    if on_stage_start:
+                        on_stage_start(stage)
+                    future = executor.submit(execute, stage, inputs, stage_deadline)
+                    running[future] = stage
+                    stage_deadlines[future] = (stage_deadline, time.time())
+
+                if not running:
+                    continue
+
+                timeout = self.POLL_INTERVAL if deadline is not None else None
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    stage_deadlines.pop(future)
+                    result = future.result()
+                    run.results[stage.name] = result
+                    if on_stage_done:
+                        on_stage_done(stage, result)
+
+                # Stage oltre il proprio sotto-budget: il thread si fermerà al prossimo controllo
+                for future, (stage_deadline, _) in list(stage_deadlines.items()):
+                    if stage_deadline is not None and stage_deadline.expired and not deadline.expired:
+                        abandon(future, f"Tempo a disposizione esaurito ({running[future].name})")
+        finally:
+            # Senza attendere i thread abbandonati, che escono al prossimo controllo della scadenza
+            executor.shutdown(wait=deadline is None, cancel_futures=True)
+
+        run.total_duration = time.time() - start
+        return run
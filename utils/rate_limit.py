@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import AppConfig
+from utils.deadline import current_deadline, deadline_sleep
+
+
+class RateLimiter:
+    """Token bucket per provider e API key, condivisi tra thread e processi.
+
+    Lo stato dei bucket è su SQLite e ogni prelievo avviene in una transazione
+    IMMEDIATE, così più processi che usano lo stesso file rispettano lo stesso
+    limite. Un limite "provider:endpoint" ha un bucket dedicato; gli altri
+    endpoint del provider condividono il bucket del provider.
+    """
+
+    def __init__(self, path: str, limits: Dict[str, Dict[str, float]]):
+        self.path = path
+        self.limits = limits
+        self.waited = 0.0  # Secondi di attesa complessivi imposti dai limiti
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Transazioni gestite a mano (isolation_level=None) per usare BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    bucket TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def limit_for(self, provider: str, endpoint: str = "") -> Optional[Tuple[str, float, float]]:
+        """Restituisce (scope, rate, burst) del limite applicabile, o None se non limitato"""
+        for scope in (f"{provider}:{endpoint}", provider):
+            limit = self.limits.get(scope)
+            if limit:
+                rate = float(limit["rate"])
+                return scope, rate, float(limit.get("burst", rate))
+        return None
+
+    @staticmethod
+    def bucket_key(scope: str, api_key: str) -> str:
+        """Identificativo del bucket; la API key non viene salvata in chiaro"""
+        key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        return f"{scope}:{key_hash}"
+
+    def try_acquire(self, provider: str, api_key: str, endpoint: str = "") -> float:
+        """Preleva un token se disponibile, altrimenti restituisce i secondi da attendere"""
+        limit = self.limit_for(provider, endpoint)
+        if limit is None:
+            return 0.0
+
+        scope, rate, burst = limit
+        bucket = self.bucket_key(scope, api_key)
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM rate_buckets WHERE bucket = ?", (bucket,)
+                ).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+
+                if tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = (1 - tokens) / rate
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (bucket, tokens, updated_at) VALUES (?, ?, ?)",
+                    (bucket, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return wait
+
+    def acquire(self, provider: str, api_key: str, endpoint: str = ""):
+        """Attende (solo se necessario) finché il bucket non concede un token"""
+        while True:
+            wait = self.try_acquire(provider, api_key, endpoint)
+            if wait <= 0:
+                return
+            self.waited += wait
+            deadline_sleep(wait)
+
+    async def acquire_async(self, provider: str, api_key: str, endpoint: str = ""):
+        """Versione awaitable di acquire, che non blocca l'event loop durante l'attesa"""
+        while True:
+            # BEGIN IMMEDIATE può attendere il lock di SQLite: la transazione gira fuori dal loop
+            wait = await asyncio.to_thread(self.try_acquire, provider, api_key, endpoint)
+            if wait <= 0:
+                return
+            deadline = current_deadline()
+            if deadline is not None and wait > deadline.remaining():
+                deadline.sleep(wait)  # Solleva subito: l'attesa supererebbe la scadenza
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+
+_limiter_lock = threading.Lock()
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter(app_config: Optional[AppConfig] = None) -> RateLimiter:
+    """Rate limiter di processo, con lo stato condiviso nella directory della cache"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _limiter_lock:
+            if _rate_limiter is None:
+                config = app_config or AppConfig()
+                _rate_limiter = RateLimiter(
+                    os.path.join(config.cache_dir, "rate_limits.sqlite3"), config.rate_limits
+                )
+    return _rate_limiter
@@ -0,0 +1,179 @@
+"""
+Politica di retry per le richieste HTTP: classificazione degli errori, backoff
+con jitter, rispetto di Retry-After e circuit breaker per host.
+
+Solo timeout, errori di connessione, 408, 429 e 5xx vengono ritentati; gli
+altri errori (es. 404 di un profilo social inesistente) falliscono subito.
+Un host che accumula errori lato server viene saltato per reset_timeout
+secondi invece di rallentare l'intera analisi.
+"""
+
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from utils.deadline import check_deadline, deadline_sleep
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Richiesta non inviata: il circuit breaker dell'host è aperto"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Secondi indicati dall'header Retry-After (numero di secondi o data HTTP)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def classify(error: Exception) -> Tuple[bool, Optional[float]]:
+    """(ritentabile, attesa suggerita dal server) per un errore di requests"""
+    if isinstance(error, CircuitOpenError):
+        return False, None
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True, None
+
+    response = getattr(error, "response", None)
+    if isinstance(error, requests.exceptions.HTTPError) and response is not None:
+        if response.status_code in RETRYABLE_STATUS:
+            return True, parse_retry_after(response.headers.get("Retry-After"))
+        return False, None
+
+    return False, None
+
+
+def is_server_failure(error: Optional[Exception] = None,
+                      response: Optional[requests.Response] = None) -> bool:
+    """True se l'esito indica un problema dell'host (conta per il circuit breaker)"""
+    if response is not None:
+        return response.status_code >= 500
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+
+class RetryPolicy:
+    """Backoff esponenziale con full jitter, limitato a max_delay"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Attesa prima del tentativo successivo ad attempt (contato da 0)"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Circuit breaker di un host: closed -> open dopo failure_threshold errori consecutivi.
+
+    Trascorso reset_timeout lascia passare una richiesta di prova (half-open):
+    se va a buon fine il circuito si richiude, altrimenti resta aperto.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """True se la richiesta può partire"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class CircuitBreakers:
+    """Circuit breaker per host, creati al primo utilizzo"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def for_url(self, url: str) -> CircuitBreaker:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._breakers[host] = breaker
+            return breaker
+
+    def states(self) -> Dict[str, str]:
+        """Stato dei circuiti per host (diagnostica)"""
+        with self._lock:
+            return {host: breaker.state for host, breaker in self._breakers.items()}
+
+
+def call_with_retry(send: Callable[[], requests.Response], policy: RetryPolicy,
+                    before_attempt: Optional[Callable[[], None]] = None,
+                    logger: Optional[logging.Logger] = None) -> requests.Response:
+    """Esegue send() ritentando solo gli errori ritentabili; before_attempt precede ogni tentativo (rate limit).
+
+    Le attese rispettano la scadenza dell'analisi corrente: un backoff che la
+    supererebbe solleva DeadlineExceeded invece di dormire.
+    """
+    for attempt in range(policy.max_attempts):
+        check_deadline()
+        if before_attempt:
+            before_attempt()
+        try:
+            response = send()
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            retryable, retry_after = classify(e)
+            if not retryable or attempt == policy.max_attempts - 1:
+                raise
+            delay = policy.delay(attempt, retry_after)
+            if logger:
+                logger.warning(f"Attempt {attempt + 1} failed: {e} (nuovo tentativo tra {delay:.1f}s)")
+            deadline_sleep(delay)
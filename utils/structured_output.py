@@ -0,0 +1,214 @@
+"""
+Output JSON strutturato per i prompt di estrazione.
+
+Ogni chiamata dichiara lo schema atteso (sottoinsieme di JSON Schema: type,
+properties, required, items). La risposta viene riparata localmente se quasi
+valida (code fence, virgole finali, letterali Python, JSON troncato) e
+validata; solo se resta non conforme parte una seconda richiesta mirata che
+chiede al modello di correggere la propria risposta, non di ripetere l'analisi.
+"""
+
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.deadline import DeadlineExceeded
+from utils.json_stream import JSONStreamAssembler
+
+# Modelli che accettano response_format={"type": "json_object"}
+JSON_MODE_MODELS = ("gpt-4o", "gpt-4-turbo", "gpt-4-1106", "gpt-4-0125", "gpt-4.1",
+                    "gpt-3.5-turbo-1106", "gpt-3.5-turbo-0125")
+
+_PYTHON_LITERALS = re.compile(r'("(?:[^"\\]|\\.)*")|\b(True|False|None)\b')
+_TRAILING_COMMA = re.compile(r'("(?:[^"\\]|\\.)*")|,(\s*[}\]])')
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"'})
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None)
+}
+
+# Tipo dei campi testuali estratti: il modello può lasciarli vuoti o restituire numeri
+TEXT_FIELD = {"type": ["string", "number", "null"]}
+
+
+class StructuredOutputError(ValueError):
+    """Risposta non conforme allo schema anche dopo riparazione e correzione"""
+
+    def __init__(self, message: str, errors: List[str] = None, raw: str = ""):
+        super().__init__(message)
+        self.errors = errors or []
+        self.raw = raw
+
+
+def supports_json_mode(model: str) -> bool:
+    """True se il modello accetta la modalità JSON delle chat completion"""
+    return model.startswith(JSON_MODE_MODELS)
+
+
+def text_fields(*names: str) -> Dict[str, Dict[str, Any]]:
+    """Proprietà di schema per campi testuali facoltativi"""
+    return {name: TEXT_FIELD for name in names}
+
+
+def with_schema(system_prompt: Optional[str], schema: Dict[str, Any]) -> str:
+    """Aggiunge al system prompt l'istruzione di rispondere con JSON conforme allo schema"""
+    instruction = ("Rispondi solo con un oggetto JSON valido, senza testo aggiuntivo, "
+                   f"conforme a questo JSON Schema: {json.dumps(schema, ensure_ascii=False)}")
+    return f"{system_prompt.rstrip()}\n\n{instruction}" if system_prompt else instruction
+
+
+def repair_json(text: str) -> Any:
+    """Riparazione locale di JSON quasi valido; solleva ValueError se non recuperabile"""
+    if not text:
+        raise ValueError("Risposta vuota")
+
+    assembler = JSONStreamAssembler().feed(text)
+    try:
+        return assembler.result()
+    except ValueError:
+        pass
+
+    body = assembler.document().translate(_SMART_QUOTES)
+    if not body:
+        raise ValueError("Nessun JSON nella risposta")
+    body = _PYTHON_LITERALS.sub(lambda m: m.group(1) or {"True": "true", "False": "false", "None": "null"}[m.group(2)], body)
+    body = _TRAILING_COMMA.sub(lambda m: m.group(1) or m.group(2), body)
+
+    repaired = JSONStreamAssembler().feed(body)
+    if repaired.complete:
+        return repaired.result()
+
+    # JSON troncato (es. max_tokens): chiude stringhe e contenitori aperti
+    value = repaired.partial()
+    if value is None:
+        raise ValueError("JSON non recuperabile")
+    return value
+
+
+def _type_names(schema: Dict[str, Any]) -> List[str]:
+    types = schema.get("type")
+    if types is None:
+        return []
+    return [types] if isinstance(types, str) else list(types)
+
+
+def _matches(value: Any, type_name: str) -> bool:
+    if isinstance(value, bool) and type_name in ("integer", "number"):
+        return False
+    return isinstance(value, _JSON_TYPES[type_name])
+
+
+def coerce(value: Any, schema: Dict[str, Any]) -> Any:
+    """Corregge localmente le differenze di tipo innocue (scalare al posto di lista, numero al posto di testo)"""
+    types = _type_names(schema)
+
+    if types and not any(_matches(value, t) for t in types):
+        if "array" in types and value is not None and not isinstance(value, dict):
+            value = [value]
+        elif "string" in types and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        elif "null" in types and value in ("", [], {}):
+            value = None
+
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        return {k: coerce(v, properties[k]) if k in properties else v for k, v in value.items()}
+    if isinstance(value, list) and "items" in schema:
+        return [coerce(item, schema["items"]) for item in value]
+    return value
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """Errori di conformità allo schema (lista vuota se il valore è valido)"""
+    types = _type_names(schema)
+    if types and not any(_matches(value, t) for t in types):
+        return [f"{path}: atteso {'/'.join(types)}, trovato {type(value).__name__}"]
+
+    errors = []
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}: manca la chiave obbligatoria '{key}'")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(validate(value[key], subschema, f"{path}.{key}"))
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Tuple[Any, List[str]]:
+    """Ripara, adatta e valida una risposta: (valore, errori)"""
+    try:
+        value = coerce(repair_json(text), schema)
+    except ValueError as e:
+        return None, [str(e)]
+    return value, validate(value, schema)
+
+
+def fix_up_request(text: str, errors: List[str], schema: Dict[str, Any]) -> Tuple[str, str]:
+    """Prompt mirato per correggere una risposta non conforme: (prompt, system_prompt)"""
+    system_prompt = with_schema(
+        "Correggi la risposta JSON fornita in modo che sia valida e conforme allo schema. "
+        "Non aggiungere informazioni che non sono già presenti nella risposta.",
+        schema
+    )
+    prompt = "Errori riscontrati:\n" + "\n".join(f"- {error}" for error in errors[:10])
+    prompt += f"\n\nRisposta da correggere:\n{text}"
+    return prompt, system_prompt
+
+
+def query_structured(complete: Callable[[str, str], str], prompt: str, system_prompt: Optional[str],
+                     schema: Dict[str, Any], retries: int = 1, response: Optional[str] = None) -> Any:
+    """Valore conforme allo schema ottenuto con complete(prompt, system_prompt).
+
+    Con response si parte da una risposta già ricevuta (es. in streaming).
+    Solleva StructuredOutputError se la risposta resta non conforme dopo retries correzioni.
+    """
+    try:
+        text = response if response is not None else complete(prompt, with_schema(system_prompt, schema))
+        value, errors = parse_structured(text, schema)
+
+        for _ in range(retries):
+            if not errors:
+                break
+            text = complete(*fix_up_request(text, errors, schema))
+            value, errors = parse_structured(text, schema)
+    except DeadlineExceeded:
+        raise  # Non è un problema di formato: il chiamante deve sapere che il tempo è finito
+    except Exception as e:
+        raise StructuredOutputError(f"Errore nella richiesta: {str(e)}") from e
+
+    if errors:
+        raise StructuredOutputError("Risposta non conforme allo schema", errors, text)
+    return value
+
+
+async def query_structured_async(complete: Callable[[str, str], Awaitable[str]], prompt: str,
+                                 system_prompt: Optional[str], schema: Dict[str, Any],
+                                 retries: int = 1) -> Any:
+    """Versione awaitable di query_structured"""
+    try:
+        text = await complete(prompt, with_schema(system_prompt, schema))
+        value, errors = parse_structured(text, schema)
+
+        for _ in range(retries):
+            if not errors:
+                break
+            text = await complete(*fix_up_request(text, errors, schema))
+            value, errors = parse_structured(text, schema)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        raise StructuredOutputError(f"Errore nella richiesta: {str(e)}") from e
+
+    if errors:
+        raise StructuredOutputError("Risposta non conforme allo schema", errors, text)
+    return value